@@ -0,0 +1,278 @@
+"""
+Suspicious-expense alerts, scored as bills are stored.
+
+Each user has one spending_stats document with running count/mean/M2
+(Welford) per category, per store and per item name, plus fingerprints of the
+most recent bills. New bills are scored against it in O(1) per item and then
+folded in, so scoring never rescans the user's history. Alert kinds:
+
+    outlier     an item costs far more than the user usually spends in its category
+    unit_price  an item's unit price is far above what the user usually pays for it
+    spike       a bill total is far above the user's usual bill at that store
+    duplicate   same store, date and total as a recently stored bill
+
+The statistics describe what was stored; edits and deletes do not change
+them. The rebuild command recomputes them from the bills:
+
+    python alerts.py rebuild [--user someone@example.com]
+"""
+import os
+import math
+import argparse
+import asyncio
+import datetime
+from collections import defaultdict
+from pymongo.errors import DuplicateKeyError
+from database import bills_collection, alert_collection, stats_collection, ensure_indexes
+from metrics import counter
+from structured_log import get_logger
+
+# A value is flagged when it is this many standard deviations above the mean...
+ALERT_Z_THRESHOLD = float(os.environ.get("ALERT_Z_THRESHOLD", 3.5))
+# ...and at least this many times the mean, so small absolute differences are ignored
+ALERT_MIN_RATIO = float(os.environ.get("ALERT_MIN_RATIO", 2.0))
+# Observations needed before a category/store/item is scored at all
+ALERT_MIN_HISTORY = int(os.environ.get("ALERT_MIN_HISTORY", 5))
+# Bill fingerprints kept for duplicate detection
+ALERT_RECENT_BILLS = int(os.environ.get("ALERT_RECENT_BILLS", 50))
+# Stores and item names tracked per user; the least seen are dropped beyond this
+ALERT_MAX_TRACKED = int(os.environ.get("ALERT_MAX_TRACKED", 500))
+# Spread never taken as less than this fraction of the mean (identical past values would make any change infinite)
+MIN_STD_FRACTION = 0.1
+# Optimistic-concurrency retries when two batches of one user are scored at once
+STATS_WRITE_ATTEMPTS = 3
+
+expense_alerts = counter("expense_alerts", "Suspicious-expense alerts raised, by kind")
+log = get_logger("alerts")
+
+
+def _number(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def _key(name):
+    # Stats are keyed by name inside one document: normalize, and keep "." and "$" out of field names
+    return " ".join(str(name or "").lower().replace(".", " ").replace("$", " ").split()) or "-"
+
+
+def empty_stats(user_id):
+    return {"_id": user_id, "version": 0, "category": {}, "store": {}, "item": {}, "recent": []}
+
+
+# --- Running statistics ---
+def observe(stats, value):
+    """Welford update of [count, mean, M2] with one value; returns the new triple."""
+    count, mean, m2 = stats or (0, 0.0, 0.0)
+    count += 1
+    delta = value - mean
+    mean += delta / count
+    m2 += delta * (value - mean)
+    return [count, mean, m2]
+
+
+def z_score(stats, value):
+    """How unusual a value is for these stats, or None without enough history."""
+    if not stats or stats[0] < ALERT_MIN_HISTORY:
+        return None
+    count, mean, m2 = stats
+    std = max(math.sqrt(m2 / (count - 1)), MIN_STD_FRACTION * mean, 1.0)
+    return (value - mean) / std
+
+
+def is_suspicious(stats, value, z):
+    return z is not None and z >= ALERT_Z_THRESHOLD and value >= ALERT_MIN_RATIO * stats[1]
+
+
+def _trim(table):
+    if len(table) > ALERT_MAX_TRACKED:
+        for name in sorted(table, key=lambda name: table[name][0])[:len(table) - ALERT_MAX_TRACKED]:
+            del table[name]
+
+
+def bill_total(bill):
+    if bill.get("total_amount") is not None:
+        return _number(bill["total_amount"])
+    return sum(_number(item.get("quantity")) * _number(item.get("unit_price")) for item in bill.get("items", []))
+
+
+def fingerprint(bill):
+    return f"{_key(bill.get('store_name'))}|{bill.get('bill_date')}|{bill_total(bill):.2f}"
+
+
+def fold_bill(stats, bill):
+    """Adds a stored bill to the user's statistics (in place)."""
+    for item in bill.get("items", []):
+        if item.get("unit_price") is None:
+            continue
+        unit_price = _number(item.get("unit_price"))
+        quantity = _number(item.get("quantity")) or 1.0
+        category = _key(item.get("category"))
+        stats["category"][category] = observe(stats["category"].get(category), unit_price * quantity)
+        name = _key(item.get("item_name"))
+        stats["item"][name] = observe(stats["item"].get(name), unit_price)
+    store = _key(bill.get("store_name"))
+    stats["store"][store] = observe(stats["store"].get(store), bill_total(bill))
+    stats["recent"] = (stats["recent"] + [{"fingerprint": fingerprint(bill), "bill_id": bill["_id"]}])[-ALERT_RECENT_BILLS:]
+    _trim(stats["item"])
+    _trim(stats["store"])
+
+
+def _alert(bill, kind, score, message, item=None, amount=None, expected=None):
+    return {
+        "user_id": bill["user_id"],
+        "bill_id": bill["_id"],
+        "item_id": item["_id"] if item else None,
+        "kind": kind,
+        "severity": "high" if score >= 2 * ALERT_Z_THRESHOLD else "medium",
+        "score": round(score, 2),
+        "message": message,
+        "store_name": bill.get("store_name"),
+        "bill_date": bill.get("bill_date"),
+        "category": item.get("category") if item else None,
+        "item_name": item.get("item_name") if item else None,
+        "amount": round(amount, 2) if amount is not None else None,
+        "expected": round(expected, 2) if expected is not None else None,
+        "created_at": datetime.datetime.utcnow(),
+        "dismissed": False,
+    }
+
+
+def score_bill(stats, bill):
+    """Alerts for one bill against the statistics of everything stored before it."""
+    alerts = []
+    store = bill.get("store_name") or "an unknown store"
+
+    total = bill_total(bill)
+    key = fingerprint(bill)
+    if total > 0 and any(entry["fingerprint"] == key for entry in stats["recent"]):
+        alerts.append(_alert(
+            bill, "duplicate", 2 * ALERT_Z_THRESHOLD,
+            f"{total:.2f} at {store} on {bill.get('bill_date')} was already recorded; possibly charged twice",
+            amount=total,
+        ))
+
+    for item in bill.get("items", []):
+        if item.get("unit_price") is None:
+            continue
+        unit_price = _number(item.get("unit_price"))
+        amount = unit_price * (_number(item.get("quantity")) or 1.0)
+        category_stats = stats["category"].get(_key(item.get("category")))
+        z = z_score(category_stats, amount)
+        if is_suspicious(category_stats, amount, z):
+            alerts.append(_alert(
+                bill, "outlier", z,
+                f"{item.get('item_name')} for {amount:.2f} is unusually high for {item.get('category')} "
+                f"(usually {category_stats[1]:.2f})",
+                item=item, amount=amount, expected=category_stats[1],
+            ))
+            continue
+        item_stats = stats["item"].get(_key(item.get("item_name")))
+        z = z_score(item_stats, unit_price)
+        if is_suspicious(item_stats, unit_price, z):
+            alerts.append(_alert(
+                bill, "unit_price", z,
+                f"{item.get('item_name')} cost {unit_price:.2f} each, usually {item_stats[1]:.2f}",
+                item=item, amount=unit_price, expected=item_stats[1],
+            ))
+
+    store_stats = stats["store"].get(_key(bill.get("store_name")))
+    z = z_score(store_stats, total)
+    if is_suspicious(store_stats, total, z):
+        alerts.append(_alert(
+            bill, "spike", z, f"Bill of {total:.2f} at {store} is far above the usual {store_stats[1]:.2f}",
+            amount=total, expected=store_stats[1],
+        ))
+    return alerts
+
+
+def score_and_fold(stats, bills):
+    """Scores bills in order, each against the history including the ones before it."""
+    alerts = []
+    for bill in bills:
+        alerts += score_bill(stats, bill)
+        fold_bill(stats, bill)
+    return alerts
+
+
+# --- Storage ---
+async def _score_user(user_id, bills):
+    for _ in range(STATS_WRITE_ATTEMPTS):
+        stats = await stats_collection.find_one({"_id": user_id}) or empty_stats(user_id)
+        version = stats["version"]
+        alerts = score_and_fold(stats, bills)
+        stats["version"] = version + 1
+        try:
+            if version == 0:
+                await stats_collection.insert_one(stats)
+            elif (await stats_collection.replace_one({"_id": user_id, "version": version}, stats)).matched_count == 0:
+                continue
+        except DuplicateKeyError:
+            continue
+        if alerts:
+            await alert_collection.insert_many(alerts)
+            for alert in alerts:
+                expense_alerts.labels(kind=alert["kind"]).inc()
+        return alerts
+    raise RuntimeError("spending stats changed concurrently on every attempt")
+
+
+async def score_new_bills(bills):
+    """Scores freshly stored bills and records their alerts; returns the alerts raised."""
+    by_user = defaultdict(list)
+    for bill in bills:
+        by_user[bill["user_id"]].append(bill)
+    raised = []
+    for user_id, user_bills in by_user.items():
+        try:
+            raised += await _score_user(user_id, user_bills)
+        except Exception as e:
+            # The bills are stored either way; `python alerts.py rebuild` resets the stats
+            log.warning("scoring expense alerts failed", extra={"user_id": user_id, "error": str(e)})
+    return raised
+
+
+async def get_alerts(user_id, include_dismissed=False, limit=50):
+    query = {"user_id": user_id}
+    if not include_dismissed:
+        query["dismissed"] = False
+    return await alert_collection.find(query).sort([("created_at", -1), ("_id", -1)]).to_list(length=limit)
+
+
+async def dismiss_alert(user_id, alert_id):
+    """Marks an alert as seen; returns False if it does not exist for this user."""
+    result = await alert_collection.update_one({"_id": alert_id, "user_id": user_id}, {"$set": {"dismissed": True}})
+    return result.matched_count > 0
+
+
+# --- Rebuild ---
+async def rebuild_stats(user=None):
+    """Recomputes the statistics from the stored bills (no alerts are raised). Returns the users rebuilt."""
+    users = [user] if user else await bills_collection.distinct("user_id")
+    for user_id in users:
+        stats = empty_stats(user_id)
+        async for bill in bills_collection.find({"user_id": user_id}).sort([("created_at", 1), ("_id", 1)]):
+            fold_bill(stats, bill)
+        stats["version"] = 1
+        await stats_collection.replace_one({"_id": user_id}, stats, upsert=True)
+    return users
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=["rebuild"])
+    parser.add_argument("--user", help="Only rebuild this user's statistics")
+    args = parser.parse_args()
+
+    async def run():
+        await ensure_indexes()
+        return await rebuild_stats(args.user)
+
+    users = asyncio.run(run())
+    print(f"spending statistics rebuilt for {len(users)} users")
+
+
+if __name__ == "__main__":
+    main()
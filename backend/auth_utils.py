@@ -1,15 +1,49 @@
+import os
+import copy
+import time
+import asyncio
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from cachetools import TTLCache
 from fastapi import Depends, HTTPException
 from fastapi.security import OAuth2PasswordBearer
 from passlib.context import CryptContext
 from jose import jwt, JWTError
 from datetime import datetime, timedelta
 from database import users_collection
+from metrics import gauge, histogram, counter
 
 SECRET_KEY = "ENCODE"
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="signin")
 
+# Authenticated user lookups are cached per token (sub, exp) so the several
+# calls a dashboard page makes do not each hit MongoDB. The cache is per
+# process: /updateUserData drops the entries of the worker that served it, and
+# other workers keep the old financialGoals/financialDetails until their entries
+# expire, so the TTL is kept short (a page load, not a session).
+USER_CACHE_TTL_SECONDS = int(os.environ.get("USER_CACHE_TTL_SECONDS", 10))
+USER_CACHE_MAX_SIZE = int(os.environ.get("USER_CACHE_MAX_SIZE", 1024))
+USER_PROJECTION = {"password": 0}
+_user_cache = TTLCache(maxsize=USER_CACHE_MAX_SIZE, ttl=USER_CACHE_TTL_SECONDS)
+
+# bcrypt is deliberately slow, so hashing runs on a bounded worker pool instead
+# of the event loop. At most PASSWORD_HASH_WORKERS hashes run at once; callers
+# beyond PASSWORD_HASH_MAX_PENDING waiting for a slot are turned away with a 503.
+PASSWORD_HASH_EXECUTOR = os.environ.get("PASSWORD_HASH_EXECUTOR", "thread")  # "thread" or "process"
+PASSWORD_HASH_WORKERS = int(os.environ.get("PASSWORD_HASH_WORKERS", min(4, os.cpu_count() or 1)))
+PASSWORD_HASH_MAX_PENDING = int(os.environ.get("PASSWORD_HASH_MAX_PENDING", 64))
+
+password_hash_queue_depth = gauge("password_hash_queue_depth", "Password hash jobs waiting for a worker")
+password_hash_in_flight = gauge("password_hash_in_flight", "Password hash jobs running on the pool")
+password_hash_wait_seconds = histogram("password_hash_wait_seconds", "Time spent waiting for a hash worker")
+password_hash_seconds = histogram("password_hash_seconds", "Time spent hashing or verifying a password")
+auth_seconds = histogram("auth_seconds", "Time spent authenticating a request, by step")
+user_cache_lookups = counter("user_cache_lookups", "Authenticated user lookups by cache result")
+
+_hash_executor = None
+_hash_slots = None
+
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
 def hash_password(password: str):
@@ -18,6 +52,48 @@ def hash_password(password: str):
 def verify_password(plain_password, hashed_password):
     return pwd_context.verify(plain_password, hashed_password)
 
+def _get_hash_pool():
+    global _hash_executor, _hash_slots
+    if _hash_executor is None:
+        executor_cls = ProcessPoolExecutor if PASSWORD_HASH_EXECUTOR == "process" else ThreadPoolExecutor
+        _hash_executor = executor_cls(max_workers=PASSWORD_HASH_WORKERS)
+        _hash_slots = asyncio.Semaphore(PASSWORD_HASH_WORKERS)
+    return _hash_executor, _hash_slots
+
+def shutdown_password_pool():
+    global _hash_executor, _hash_slots
+    if _hash_executor is not None:
+        _hash_executor.shutdown(wait=False, cancel_futures=True)
+        _hash_executor = _hash_slots = None
+
+async def _run_password_job(func, *args):
+    executor, slots = _get_hash_pool()
+    if password_hash_queue_depth.labels().value >= PASSWORD_HASH_MAX_PENDING:
+        raise HTTPException(status_code=503, detail="Too many sign-in requests right now, please try again shortly.")
+
+    queued_at = time.perf_counter()
+    password_hash_queue_depth.inc()
+    try:
+        await slots.acquire()
+    finally:
+        password_hash_queue_depth.dec()
+
+    started = time.perf_counter()
+    password_hash_wait_seconds.observe(started - queued_at)
+    password_hash_in_flight.inc()
+    try:
+        return await asyncio.get_running_loop().run_in_executor(executor, func, *args)
+    finally:
+        password_hash_in_flight.dec()
+        password_hash_seconds.observe(time.perf_counter() - started)
+        slots.release()
+
+async def hash_password_async(password: str):
+    return await _run_password_job(hash_password, password)
+
+async def verify_password_async(plain_password, hashed_password):
+    return await _run_password_job(verify_password, plain_password, hashed_password)
+
 def create_jwt_token(data: dict):
     to_encode = data.copy()
     expire = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
@@ -32,14 +108,30 @@ def decode_jwt_token(token: str):
         return None
     
     
+def invalidate_cached_user(email: str):
+    """Drops every cached lookup for this user, whichever token it came from."""
+    for key in [key for key in list(_user_cache.keys()) if key[0] == email]:
+        _user_cache.pop(key, None)
+
+
 async def get_current_user(token: str = Depends(oauth2_scheme)):
+    started = time.perf_counter()
     payload = decode_jwt_token(token)
+    auth_seconds.labels(step="jwt_decode").observe(time.perf_counter() - started)
     if not payload:
         raise HTTPException(status_code=401, detail="Invalid or expired token")
 
     email = payload.get("sub")
-    user = await users_collection.find_one({"email": email})
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
+    cache_key = (email, payload.get("exp"))
+    user = _user_cache.get(cache_key)
+    user_cache_lookups.labels(result="miss" if user is None else "hit").inc()
+    if user is None:
+        started = time.perf_counter()
+        user = await users_collection.find_one({"email": email}, USER_PROJECTION)
+        auth_seconds.labels(step="user_lookup").observe(time.perf_counter() - started)
+        if not user:
+            raise HTTPException(status_code=404, detail="User not found")
+        _user_cache[cache_key] = user
 
-    return user
\ No newline at end of file
+    # Hand out a deep copy so request handlers cannot alter the cached document or its nested fields
+    return copy.deepcopy(user)
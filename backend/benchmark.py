@@ -0,0 +1,584 @@
+"""
+Load benchmarks for the backend services.
+
+Run against locally started services, e.g.
+
+    uvicorn user:app --port 8050
+    python benchmark.py signin-storm --base-url http://localhost:8050
+
+Offline benchmarks (no services needed):
+
+    python benchmark.py preprocess check_image.jpg check_image_2.png
+    python benchmark.py alerts --items 100000
+    python benchmark.py forecast --users 1 --items 100000
+    python benchmark.py serialize --items 1000 10000
+
+End-to-end load test of the hot endpoints, against a local mongod and the
+stub model backend:
+
+    export MONGO_URL=mongodb://localhost:27017
+    python benchmark.py seed --users 4 --items 10000
+    MODEL_BACKEND=stub uvicorn main:app --port 8000 --workers 4
+    python benchmark.py load --save-baseline baseline.json
+    python benchmark.py load --compare baseline.json   # exits 1 on a p95 regression
+    python benchmark.py family --dependents 1 5 10 20  # needs seed --users 20
+    python benchmark.py migrate --format parquet       # export bench0, import it into a scratch user
+"""
+import argparse
+import asyncio
+import datetime
+import json
+import os
+import random
+import statistics
+import sys
+import time
+
+import httpx
+
+BENCH_USER = {
+    "firstName": "Bench",
+    "lastName": "User",
+    "email": "bench@example.com",
+    "password": "bench-password",
+    "address": "1 Benchmark Road",
+    "phone": "0000000000",
+    "financialDetails": {
+        "additionalDetails": None,
+        "income": "30000",
+        "getsPension": True,
+        "pensionAmount": "15000",
+        "investsInStocks": False,
+        "yearlyStockInvestment": None,
+    },
+    "financialGoals": "Save 5000 this month",
+}
+
+
+# --- Helpers ---
+def percentile(samples, q):
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def summarize(samples, elapsed):
+    return {
+        "requests": len(samples),
+        "throughput": len(samples) / elapsed if elapsed else 0.0,
+        "mean_ms": statistics.fmean(samples) * 1000 if samples else 0.0,
+        "p50_ms": percentile(samples, 0.50) * 1000,
+        "p95_ms": percentile(samples, 0.95) * 1000,
+        "p99_ms": percentile(samples, 0.99) * 1000,
+    }
+
+
+def print_summary(name, summary):
+    print(
+        f"{name:<28} n={summary['requests']:<6} {summary['throughput']:8.1f} req/s  "
+        f"p50={summary['p50_ms']:7.1f}ms  p95={summary['p95_ms']:7.1f}ms  p99={summary['p99_ms']:7.1f}ms"
+    )
+
+
+async def hammer(client, method, url, deadline, samples, make_request=None, **kwargs):
+    """
+    Issues requests back to back until the deadline, recording each latency.
+    make_request, if given, returns extra request kwargs for each call.
+    Returns the number of error responses (e.g. 503s from load shedding).
+    """
+    errors = 0
+    while time.perf_counter() < deadline:
+        extra = make_request() if make_request else {}
+        started = time.perf_counter()
+        response = await client.request(method, url, **kwargs, **extra)
+        samples.append(time.perf_counter() - started)
+        errors += response.status_code >= 400
+    return errors
+
+
+async def get_token(client, user):
+    await client.post("/auth/signup", json=user)  # 400 if it already exists
+    response = await client.post("/auth/signin", json={"email": user["email"], "password": user["password"]})
+    response.raise_for_status()
+    return response.json()["access_token"]
+
+
+def bench_user(index):
+    return dict(BENCH_USER, email=f"bench{index}@example.com", firstName=f"Bench{index}")
+
+
+# --- Benchmarks ---
+async def signin_storm(args):
+    """
+    Measures /getUserData latency on its own and then while a storm of
+    concurrent /auth/signin calls (bcrypt verifications) hits the same worker.
+    """
+    async with httpx.AsyncClient(base_url=args.base_url, timeout=60) as client:
+        token = await get_token(client, BENCH_USER)
+        headers = {"Authorization": f"Bearer {token}"}
+        credentials = {"email": BENCH_USER["email"], "password": BENCH_USER["password"]}
+
+        async def phase(storm):
+            reads, signins = [], []
+            deadline = time.perf_counter() + args.duration
+            tasks = [hammer(client, "GET", "/getUserData", deadline, reads, headers=headers)
+                     for _ in range(args.readers)]
+            tasks += [hammer(client, "POST", "/auth/signin", deadline, signins, json=credentials)
+                      for _ in range(storm)]
+            started = time.perf_counter()
+            errors = await asyncio.gather(*tasks)
+            elapsed = time.perf_counter() - started
+            return summarize(reads, elapsed), summarize(signins, elapsed), sum(errors)
+
+        quiet, _, _ = await phase(0)
+        loaded, storm, errors = await phase(args.storm)
+
+    print_summary("/getUserData (idle)", quiet)
+    print_summary("/getUserData (signin storm)", loaded)
+    print_summary("/auth/signin", storm)
+    print(f"error responses during storm: {errors}")
+
+
+async def preprocess(args):
+    """Reports the size and time savings of the receipt preprocessing stage."""
+    from image_preprocessing import preprocess_receipt
+
+    for path in args.images:
+        with open(path, "rb") as f:
+            image_bytes = f.read()
+        timings = []
+        for _ in range(args.iterations):
+            result = preprocess_receipt(image_bytes, max_edge=args.max_edge)
+            timings.append(result.seconds)
+        saved = 1 - result.processed_bytes / result.original_bytes
+        print(
+            f"{os.path.basename(path):<20} {result.original_size} {result.original_bytes / 1024:8.1f} KiB -> "
+            f"{result.processed_size} {result.processed_bytes / 1024:8.1f} KiB ({saved:.0%} smaller)  "
+            f"p50={percentile(timings, 0.5) * 1000:.1f}ms  p99={percentile(timings, 0.99) * 1000:.1f}ms"
+        )
+
+
+async def alerts(args):
+    """Items per second through the alert scoring engine (score, then fold into the stats)."""
+    from alerts import empty_stats, score_and_fold
+
+    rng = random.Random(args.seed)
+    # Every 100th bill gets a price spike, every 250th is stored twice, so the alert paths run too
+    bills = []
+    for index, bill in enumerate(synthetic_bills(rng, "bench@example.com", args.items)):
+        if index % 100 == 99:
+            bill["items"][0]["unit_price"] *= 20
+        bills += [bill, bill] if index % 250 == 249 else [bill]
+    item_count = sum(len(bill["items"]) for bill in bills)
+
+    for _ in range(args.iterations):
+        stats = empty_stats("bench@example.com")
+        started = time.perf_counter()
+        raised = score_and_fold(stats, bills)
+        elapsed = time.perf_counter() - started
+        kinds = {}
+        for alert in raised:
+            kinds[alert["kind"]] = kinds.get(alert["kind"], 0) + 1
+        print(
+            f"{item_count} items in {len(bills)} bills: {elapsed * 1000:8.1f}ms  "
+            f"{item_count / elapsed:10.0f} items/s  alerts {dict(sorted(kinds.items()))}"
+        )
+
+
+async def forecast(args):
+    """
+    Time to project spending from raw item rows (one row per item, the worst
+    case: MongoDB normally hands over one row per user, day and category).
+    """
+    from forecast import history_window, to_columns, project, build_forecasts
+
+    rng = random.Random(args.seed)
+    today = datetime.date.today()
+    start, _ = history_window(today)
+    columns = ([], [], [], [])
+    for index in range(args.users):
+        for bill in synthetic_bills(rng, f"bench{index}@example.com", args.items, days=(today - start).days + 1):
+            for item in bill["items"]:
+                columns[0].append(bill["user_id"])
+                columns[1].append(bill["bill_date"])
+                columns[2].append(item["category"])
+                columns[3].append(item["quantity"] * item["unit_price"])
+    budgets = {user_id: 45000.0 for user_id in set(columns[0])}
+
+    timings = []
+    for _ in range(args.iterations):
+        started = time.perf_counter()
+        users, categories, *arrays = to_columns(*columns, start)
+        projected = project(*arrays, len(users), len(categories), start, today)
+        build_forecasts(users, categories, *projected, budgets, today)
+        timings.append(time.perf_counter() - started)
+    print(
+        f"{args.users} users x {args.items} items: p50={percentile(timings, 0.5) * 1000:.1f}ms  "
+        f"p99={percentile(timings, 0.99) * 1000:.1f}ms  "
+        f"{len(columns[0]) / percentile(timings, 0.5):,.0f} rows/s"
+    )
+
+
+async def serialize(args):
+    """
+    Response bodies for /process (ProcessedItemInDB) and /expenses (ExpenseItem)
+    items: per-item Pydantic validation plus stdlib json, as FastAPI does with a
+    response_model, vs. the FAST_JSON path (plain dicts encoded by orjson).
+    """
+    from fastapi.responses import JSONResponse
+    from pydantic import TypeAdapter
+    from bills import flatten_bill
+    from models import ProcessedItemInDB, ExpenseItem
+    from fast_json import FastJSONResponse, processed_item, expense_item
+    from image_text_processor import fix_object_id
+    from insights import to_expense
+
+    processed_adapter = TypeAdapter(list[ProcessedItemInDB])
+    expense_adapter = TypeAdapter(list[ExpenseItem])
+
+    def pydantic_process(rows):
+        items = [ProcessedItemInDB(**fix_object_id(dict(row))) for row in rows]
+        return JSONResponse(processed_adapter.dump_python(items, mode="json", by_alias=True)).body
+
+    def pydantic_expenses(rows):
+        items = expense_adapter.validate_python([to_expense(row) for row in rows])
+        return JSONResponse(expense_adapter.dump_python(items, mode="json")).body
+
+    def fast_process(rows):
+        return FastJSONResponse([processed_item(row) for row in rows]).body
+
+    def fast_expenses(rows):
+        return FastJSONResponse([expense_item(row) for row in rows]).body
+
+    rng = random.Random(args.seed)
+    for count in args.items:
+        rows = [row for bill in synthetic_bills(rng, "bench@example.com", count) for row in flatten_bill(bill)]
+        for endpoint, baseline, fast in (
+            ("/process", pydantic_process, fast_process),
+            ("/expenses", pydantic_expenses, fast_expenses),
+        ):
+            if json.loads(baseline(rows)) != json.loads(fast(rows)):
+                print(f"{endpoint}: the two paths produce different documents")
+                sys.exit(1)
+            timings = {}
+            for name, render in (("pydantic", baseline), ("orjson", fast)):
+                samples = []
+                for _ in range(args.iterations):
+                    started = time.perf_counter()
+                    render(rows)
+                    samples.append(time.perf_counter() - started)
+                timings[name] = percentile(samples, 0.5)
+            print(
+                f"{endpoint:<10} {count:>6} items: pydantic+json p50={timings['pydantic'] * 1000:7.2f}ms  "
+                f"orjson p50={timings['orjson'] * 1000:7.2f}ms  ({timings['pydantic'] / timings['orjson']:.1f}x)"
+            )
+
+
+# --- Seeding ---
+STORES = ["Fresh Mart", "City Pharmacy", "Corner Grocer", "Metro Bazaar", "Green Leaf Store"]
+CATALOG = {
+    "Food": ["Rice 1kg", "Milk 1L", "Bread", "Eggs 12", "Lentils 500g", "Tea 250g", "Apples 1kg"],
+    "Health": ["Paracetamol", "Vitamin D", "BP Tablets", "Bandages"],
+    "Retail": ["Bath Soap", "Toothpaste", "Detergent", "Light Bulb"],
+    "Utilities": ["Electricity Bill", "Water Bill", "Phone Recharge"],
+    "Transport": ["Bus Pass", "Taxi Fare"],
+}
+
+
+def synthetic_bills(rng, user_id, item_count, days=365):
+    """Bills of 1-8 items spread over the last `days` days, item_count items in total."""
+    from bills import make_bill
+
+    today = datetime.date.today()
+    created_at = datetime.datetime.utcnow() - datetime.timedelta(days=days)
+    bills = []
+    while item_count > 0:
+        size = min(item_count, rng.randint(1, 8))
+        item_count -= size
+        created_at += datetime.timedelta(seconds=rng.randint(60, 3600))
+        items = []
+        for _ in range(size):
+            category = rng.choice(list(CATALOG))
+            items.append({
+                "item_name": rng.choice(CATALOG[category]),
+                "quantity": rng.randint(1, 4),
+                "unit_price": round(rng.uniform(10, 500), 2),
+                "category": category,
+            })
+        header = {
+            "user_id": user_id,
+            "store_name": rng.choice(STORES),
+            "bill_date": (today - datetime.timedelta(days=rng.randrange(days))).isoformat(),
+            "total_amount": round(sum(item["quantity"] * item["unit_price"] for item in items), 2),
+            "input_type": "text",
+            "created_at": created_at,
+        }
+        bills.append(make_bill(header, items))
+    return bills
+
+
+async def seed(args):
+    """
+    Writes benchmark users with synthetic bill histories straight into MongoDB
+    (MONGO_URL). Re-running replaces the same users' data, and the same --seed
+    gives the same data.
+    """
+    from database import users_collection, bills_collection, insight_collection, alert_collection, ensure_indexes
+    from auth_utils import hash_password
+    from rollups import rebuild
+    from alerts import rebuild_stats
+
+    rng = random.Random(args.seed)
+    await ensure_indexes()
+    password = hash_password(BENCH_USER["password"])
+    for index in range(args.users):
+        user = dict(bench_user(index), password=password)
+        email = user["email"]
+        await users_collection.replace_one({"email": email}, user, upsert=True)
+        await bills_collection.delete_many({"user_id": email})
+        await insight_collection.delete_one({"_id": email})
+        await alert_collection.delete_many({"user_id": email})
+
+        started = time.perf_counter()
+        bills = synthetic_bills(rng, email, args.items)
+        for start in range(0, len(bills), 1000):
+            await bills_collection.insert_many(bills[start:start + 1000], ordered=False)
+        await rebuild(email)
+        await rebuild_stats(email)
+        print(f"{email}: {args.items} items in {len(bills)} bills ({time.perf_counter() - started:.1f}s)")
+
+
+async def family(args):
+    """
+    /family/overview data for 1-20 seeded dependents: fetched together (one
+    query per source, as the endpoint does) vs. one dependent at a time.
+    """
+    from database import users_collection
+    from family import build_overview, DEPENDENT_PROJECTION
+
+    emails = [bench_user(index)["email"] for index in range(max(args.dependents))]
+    users = await users_collection.find({"email": {"$in": emails}}, DEPENDENT_PROJECTION).to_list(length=None)
+    users.sort(key=lambda user: emails.index(user["email"]))
+    if len(users) < max(args.dependents):
+        sys.exit(f"only {len(users)} benchmark users found; run `python benchmark.py seed --users {max(args.dependents)}` first")
+
+    for count in args.dependents:
+        dependents = users[:count]
+        timings = {"fan-in": [], "sequential": []}
+        for _ in range(args.iterations):
+            started = time.perf_counter()
+            await build_overview(dependents)
+            timings["fan-in"].append(time.perf_counter() - started)
+            started = time.perf_counter()
+            for dependent in dependents:
+                await build_overview([dependent])
+            timings["sequential"].append(time.perf_counter() - started)
+        print(f"{count:>3} dependents  " + "  ".join(
+            f"{name} p50={percentile(samples, 0.5) * 1000:7.1f}ms p95={percentile(samples, 0.95) * 1000:7.1f}ms"
+            for name, samples in timings.items()
+        ))
+
+
+async def migrate(args):
+    """Export of a seeded user's history and its import into a scratch user, per format (MongoDB)."""
+    import io
+    from database import bills_collection, rollup_collection
+    from expense_io import export_chunks, import_file
+
+    source, target = bench_user(0)["email"], "bench-import@example.com"
+    for fmt in args.format:
+        await bills_collection.delete_many({"user_id": target})
+        await rollup_collection.delete_many({"user_id": target})
+
+        started = time.perf_counter()
+        exported = io.BytesIO()
+        async for chunk in export_chunks(source, fmt):
+            exported.write(chunk)
+        export_seconds = time.perf_counter() - started
+
+        exported.seek(0)
+        started = time.perf_counter()
+        result = await import_file(target, exported, fmt)
+        import_seconds = time.perf_counter() - started
+        items = result["imported_items"]
+        print(
+            f"{fmt:<8} {items} items, {exported.getbuffer().nbytes / 1024 / 1024:6.1f} MiB  "
+            f"export {export_seconds:6.2f}s ({items / export_seconds:,.0f} rows/s)  "
+            f"import {import_seconds:6.2f}s ({items / import_seconds:,.0f} rows/s)  errors {result['error_count']}"
+        )
+
+
+# --- Load test ---
+def process_request():
+    # A new explanation each time, so the extraction cache does not answer it. Two amounts keep the
+    # local rule extractor from parsing it, so the request still reaches the model backend.
+    return {"data": {"user_explanation": (
+        f"bought {random.randint(1, 9)} kg rice for {random.randint(10, 999)} rupees and "
+        f"{random.randint(1, 9)} litres of milk for {random.randint(10, 999)} rupees"
+    )}}
+
+
+def process_rules_request():
+    # One amount and a known category: answered by the local rule extractor without a model call
+    return {"data": {"user_explanation": f"bought {random.randint(1, 9)} kg rice for {random.randint(10, 999)} rupees"}}
+
+
+SCENARIOS = {
+    # name: (method, path, extra request kwargs, make_request)
+    "signin": ("POST", "/auth/signin", {"json": {"email": bench_user(0)["email"], "password": BENCH_USER["password"]}}, None),
+    "user-data": ("GET", "/getUserData", {}, None),
+    "expenses": ("GET", "/expenses", {"params": {"limit": 100}}, None),
+    "expenses-summary": ("GET", "/expenses/summary", {}, None),
+    "insights": ("GET", "/insights", {}, None),
+    "process": ("POST", "/process", {}, process_request),
+    "process-rules": ("POST", "/process", {}, process_rules_request),
+}
+
+
+def compare_to_baseline(results, baseline, max_regression):
+    """Prints p95 changes against a saved baseline; returns the regressed scenario names."""
+    regressed = []
+    for name, summary in results.items():
+        before = baseline["results"].get(name)
+        if not before or not before["p95_ms"]:
+            continue
+        change = summary["p95_ms"] / before["p95_ms"] - 1
+        flag = ""
+        if change > max_regression:
+            regressed.append(name)
+            flag = "  REGRESSION"
+        print(f"{name:<28} p95 {before['p95_ms']:7.1f}ms -> {summary['p95_ms']:7.1f}ms ({change:+.0%}){flag}")
+    return regressed
+
+
+async def load(args):
+    """
+    Runs each scenario for --duration seconds at --concurrency callers (after
+    --warmup seconds whose samples are dropped), spread over the seeded users.
+    """
+    limits = httpx.Limits(max_connections=args.concurrency * 2)
+    async with httpx.AsyncClient(base_url=args.base_url, timeout=120, limits=limits) as client:
+        tokens = []
+        for index in range(args.users):
+            response = await client.post("/auth/signin", json={
+                "email": bench_user(index)["email"], "password": BENCH_USER["password"],
+            })
+            response.raise_for_status()
+            tokens.append(response.json()["access_token"])
+
+        results = {}
+        for name in args.scenarios:
+            method, path, kwargs, make_request = SCENARIOS[name]
+
+            async def run(seconds):
+                samples = []
+                deadline = time.perf_counter() + seconds
+                tasks = [
+                    hammer(client, method, path, deadline, samples, make_request,
+                           headers={"Authorization": f"Bearer {tokens[worker % len(tokens)]}"}, **kwargs)
+                    for worker in range(args.concurrency)
+                ]
+                started = time.perf_counter()
+                errors = await asyncio.gather(*tasks)
+                return samples, time.perf_counter() - started, sum(errors)
+
+            if args.warmup:
+                await run(args.warmup)
+            samples, elapsed, errors = await run(args.duration)
+            results[name] = dict(summarize(samples, elapsed), errors=errors)
+            print_summary(name, results[name])
+            if errors:
+                print(f"{'':<28} {errors} error responses")
+
+    run_info = {
+        "base_url": args.base_url,
+        "concurrency": args.concurrency,
+        "duration": args.duration,
+        "users": args.users,
+        "recorded_at": datetime.datetime.utcnow().isoformat(),
+    }
+    if args.save_baseline:
+        with open(args.save_baseline, "w", encoding="utf-8") as f:
+            json.dump({"run": run_info, "results": results}, f, indent=2)
+        print(f"baseline saved to {args.save_baseline}")
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        if baseline["run"].get("concurrency") != args.concurrency:
+            print(f"note: baseline ran at concurrency {baseline['run'].get('concurrency')}")
+        regressed = compare_to_baseline(results, baseline, args.max_regression)
+        if regressed:
+            print(f"p95 regressed by more than {args.max_regression:.0%}: {', '.join(regressed)}")
+            sys.exit(1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    storm = commands.add_parser("signin-storm", help="p99 of /getUserData during a burst of sign-ins")
+    storm.add_argument("--base-url", default="http://localhost:8050")
+    storm.add_argument("--duration", type=float, default=10.0, help="Seconds per phase")
+    storm.add_argument("--readers", type=int, default=4, help="Concurrent /getUserData callers")
+    storm.add_argument("--storm", type=int, default=32, help="Concurrent /auth/signin callers")
+    storm.set_defaults(func=signin_storm)
+
+    prep = commands.add_parser("preprocess", help="Size/time savings of receipt image preprocessing")
+    prep.add_argument("images", nargs="*", default=["check_image.jpg", "check_image_2.png"])
+    prep.add_argument("--iterations", type=int, default=10)
+    prep.add_argument("--max-edge", type=int, default=1600)
+    prep.set_defaults(func=preprocess)
+
+    scorer = commands.add_parser("alerts", help="Throughput of the suspicious-expense scoring engine")
+    scorer.add_argument("--items", type=int, default=100000)
+    scorer.add_argument("--iterations", type=int, default=3)
+    scorer.add_argument("--seed", type=int, default=0)
+    scorer.set_defaults(func=alerts)
+
+    forecaster = commands.add_parser("forecast", help="Time to project month-end spending from raw item rows")
+    forecaster.add_argument("--users", type=int, default=1)
+    forecaster.add_argument("--items", type=int, default=100000, help="Items per user")
+    forecaster.add_argument("--iterations", type=int, default=10)
+    forecaster.add_argument("--seed", type=int, default=0)
+    forecaster.set_defaults(func=forecast)
+
+    serializer = commands.add_parser("serialize", help="Item response encoding: Pydantic + json vs. the orjson fast path")
+    serializer.add_argument("--items", type=int, nargs="+", default=[1000, 10000])
+    serializer.add_argument("--iterations", type=int, default=20)
+    serializer.add_argument("--seed", type=int, default=0)
+    serializer.set_defaults(func=serialize)
+
+    seeder = commands.add_parser("seed", help="Write benchmark users with synthetic bills into MongoDB")
+    seeder.add_argument("--users", type=int, default=4)
+    seeder.add_argument("--items", type=int, default=1000, help="Bill items per user (1k-100k)")
+    seeder.add_argument("--seed", type=int, default=0)
+    seeder.set_defaults(func=seed)
+
+    fam = commands.add_parser("family", help="Family overview fan-in vs. per-dependent queries (MongoDB)")
+    fam.add_argument("--dependents", type=int, nargs="+", default=[1, 2, 5, 10, 20])
+    fam.add_argument("--iterations", type=int, default=20)
+    fam.set_defaults(func=family)
+
+    migrator = commands.add_parser("migrate", help="Export/import throughput of a seeded history (MongoDB)")
+    migrator.add_argument("--format", nargs="+", choices=["csv", "parquet", "arrow"], default=["csv", "parquet", "arrow"])
+    migrator.set_defaults(func=migrate)
+
+    loader = commands.add_parser("load", help="Throughput and p50/p95/p99 of the hot endpoints")
+    loader.add_argument("--base-url", default="http://localhost:8000")
+    loader.add_argument("--scenarios", nargs="+", choices=list(SCENARIOS), default=list(SCENARIOS))
+    loader.add_argument("--users", type=int, default=4, help="Seeded users to spread the load over")
+    loader.add_argument("--concurrency", type=int, default=16)
+    loader.add_argument("--duration", type=float, default=10.0, help="Seconds per scenario")
+    loader.add_argument("--warmup", type=float, default=2.0, help="Unrecorded seconds before each scenario")
+    loader.add_argument("--save-baseline", metavar="PATH", help="Write the results as a JSON baseline")
+    loader.add_argument("--compare", metavar="PATH", help="Compare against a saved baseline")
+    loader.add_argument("--max-regression", type=float, default=0.2, help="Allowed p95 increase, as a fraction")
+    loader.set_defaults(func=load)
+
+    args = parser.parse_args()
+    asyncio.run(args.func(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+from bson import ObjectId
+from pymongo import ReturnDocument, UpdateOne, UpdateMany, DeleteMany
+from database import bills_collection
+
+# A bill document holds the receipt header once plus a compact array of items:
+#   {_id, user_id, store_name, bill_date, total_amount, input_type, bill_hash,
+#    created_at, items: [{_id, item_name, quantity, unit_price, category}]}
+# Item-shaped responses (ProcessedItemInDB, ExpenseItem) are projections of it.
+HEADER_FIELDS = ("user_id", "store_name", "bill_date", "total_amount", "input_type", "bill_hash", "created_at")
+ITEM_FIELDS = ("item_name", "quantity", "unit_price", "category")
+# Fields an expense edit may change; store and date belong to the whole bill
+EDITABLE_ITEM_FIELDS = ITEM_FIELDS
+EDITABLE_BILL_FIELDS = ("store_name", "bill_date")
+
+
+def make_bill(header: dict, items: list) -> dict:
+    """Builds a bill document, giving every item its own ObjectId."""
+    bill = {field: header.get(field) for field in HEADER_FIELDS if field in header}
+    bill["_id"] = header.get("_id") or ObjectId()
+    bill["items"] = [
+        {"_id": item.get("_id") or ObjectId(), **{field: item.get(field) for field in ITEM_FIELDS}}
+        for item in items
+    ]
+    return bill
+
+
+def flatten_bill(bill: dict, item_id=None) -> list:
+    """Expands a bill into item rows (optionally just one item), in array order."""
+    header = {field: bill.get(field) for field in HEADER_FIELDS}
+    return [
+        {**header, **{field: item.get(field) for field in ITEM_FIELDS}, "_id": item["_id"], "bill_id": bill["_id"]}
+        for item in bill.get("items", [])
+        if item_id is None or item["_id"] == item_id
+    ]
+
+
+def item_row_stages() -> list:
+    """Aggregation stages that turn matched bills into one document per item."""
+    row = {field: f"${field}" for field in HEADER_FIELDS}
+    row.update({field: f"$items.{field}" for field in ITEM_FIELDS})
+    row.update({"_id": "$items._id", "bill_id": "$_id"})
+    return [{"$unwind": "$items"}, {"$project": row}]
+
+
+def split_item_update(update_data: dict):
+    """Splits an expense edit into $set paths for the bill header and the matched item."""
+    header = {field: update_data[field] for field in EDITABLE_BILL_FIELDS if field in update_data}
+    item = {f"items.$.{field}": update_data[field] for field in EDITABLE_ITEM_FIELDS if field in update_data}
+    return {**header, **item}
+
+
+async def update_item(user_id: str, item_id: ObjectId, update_data: dict):
+    """
+    Applies an expense edit in one round trip. Returns (bill before, bill after),
+    or (None, None) if the item does not exist for this user.
+    """
+    fields = split_item_update(update_data)
+    query = {"user_id": user_id, "items._id": item_id}
+    if not fields:
+        bill = await bills_collection.find_one(query)
+        return bill, bill
+    before = await bills_collection.find_one_and_update(
+        query, {"$set": fields}, return_document=ReturnDocument.BEFORE
+    )
+    if before is None:
+        return None, None
+    return before, apply_item_update(before, item_id, fields)
+
+
+def apply_item_update(bill: dict, item_id: ObjectId, fields: dict) -> dict:
+    """The bill as it is after `$set: fields` matched item_id, computed locally."""
+    after = dict(bill, **{key: value for key, value in fields.items() if not key.startswith("items.")})
+    after["items"] = [
+        dict(item, **{key[len("items.$."):]: value for key, value in fields.items() if key.startswith("items.")})
+        if item["_id"] == item_id else item
+        for item in bill["items"]
+    ]
+    return after
+
+
+async def delete_item(user_id: str, item_id: ObjectId):
+    """
+    Removes one item from its bill, dropping the bill once it is empty.
+    Returns the bill as it was before the delete, or None if the item was not found.
+    """
+    before = await bills_collection.find_one_and_update(
+        {"user_id": user_id, "items._id": item_id},
+        {"$pull": {"items": {"_id": item_id}}},
+        return_document=ReturnDocument.BEFORE,
+    )
+    if before is not None and len(before["items"]) <= 1:
+        await bills_collection.delete_one({"_id": before["_id"], "items": {"$size": 0}})
+    return before
+
+
+async def bulk_edit_items(user_id: str, updates: dict, deletes: list):
+    """
+    Applies many expense edits ({item_id: update_data}) and deletes in one
+    ordered bulk_write scoped to the user; an item both edited and deleted is
+    deleted, and edits with no editable field are skipped. Bills left empty are
+    dropped. The touched bills are read back in one query after the write.
+
+    Returns (changes, updated, deleted, not_found): {bill_id: (before, after)}
+    for every bill written, with after None for dropped bills, then the item
+    ids that were updated, deleted and not found for this user.
+    """
+    requested = list(dict.fromkeys([*updates, *deletes]))
+    bills = await bills_collection.find({"user_id": user_id, "items._id": {"$in": requested}}).to_list(length=None)
+    bill_of = {item["_id"]: bill["_id"] for bill in bills for item in bill["items"]}
+    not_found = [item_id for item_id in requested if item_id not in bill_of]
+    deletes = [item_id for item_id in dict.fromkeys(deletes) if item_id in bill_of]
+
+    operations, updated = [], []
+    for item_id, update_data in updates.items():
+        fields = split_item_update(update_data)
+        if item_id not in bill_of or item_id in deletes or not fields:
+            continue
+        operations.append(UpdateOne({"_id": bill_of[item_id], "user_id": user_id, "items._id": item_id}, {"$set": fields}))
+        updated.append(item_id)
+    touched = list(dict.fromkeys(bill_of[item_id] for item_id in updated + deletes))
+    if deletes:
+        operations.append(UpdateMany(
+            {"_id": {"$in": touched}, "user_id": user_id, "items._id": {"$in": deletes}},
+            {"$pull": {"items": {"_id": {"$in": deletes}}}},
+        ))
+        operations.append(DeleteMany({"_id": {"$in": touched}, "user_id": user_id, "items": {"$size": 0}}))
+    if not operations:
+        return {}, [], [], not_found
+
+    await bills_collection.bulk_write(operations, ordered=True)
+    afters = {bill["_id"]: bill for bill in await bills_collection.find({"_id": {"$in": touched}}).to_list(length=None)}
+    befores = {bill["_id"]: bill for bill in bills}
+    # An item edited or deleted by another request in the meantime is reported as it ended up
+    remaining = {item["_id"] for bill in afters.values() for item in bill["items"]}
+    return (
+        {bill_id: (befores[bill_id], afters.get(bill_id)) for bill_id in touched},
+        [item_id for item_id in updated if item_id in remaining],
+        [item_id for item_id in deletes if item_id not in remaining],
+        not_found,
+    )
@@ -1,5 +1,10 @@
 import os
+import asyncio
+import datetime
 from motor.motor_asyncio import AsyncIOMotorClient
+from bson import ObjectId
+from pymongo import ASCENDING, DESCENDING, IndexModel, monitoring
+from metrics import histogram
 # main.py
 from dotenv import load_dotenv
 load_dotenv()
@@ -7,18 +12,164 @@ load_dotenv()
 MONGO_USERNAME = os.environ.get("MONGO_USERNAME", "MONGO_USERNAME")
 MONGO_PASSWORD = os.environ.get("MONGO_PASSWORD", "MONGO_PASSWORD")
 CLUSTER_NAME = os.environ.get("CLUSTER_NAME", "CLUSTER_NAME")
-DB_NAME = "Billing-Db"
+# The test suite points this at a scratch database
+DB_NAME = os.environ.get("MONGO_DB_NAME", "Billing-Db")
 
 
-MONGO_URL = (
+# MONGO_URL overrides the Atlas cluster, e.g. mongodb://localhost:27017 for a local mongod
+MONGO_URL = os.environ.get("MONGO_URL") or (
     f"mongodb+srv://{MONGO_USERNAME}:{MONGO_PASSWORD}"
     f"@billing-data.rgnagne.mongodb.net/?retryWrites=true&w=majority&appName=Billing-Data"
 )
 
-client = AsyncIOMotorClient(MONGO_URL)
-DB_NAME = "Billing-Db"
+# One client (and so one connection pool) per process, shared by every service in it.
+# With N workers a host opens at most N * MONGO_MAX_POOL_SIZE connections.
+MONGO_MAX_POOL_SIZE = int(os.environ.get("MONGO_MAX_POOL_SIZE", 50))
+MONGO_MIN_POOL_SIZE = int(os.environ.get("MONGO_MIN_POOL_SIZE", 0))
+MONGO_MAX_IDLE_TIME_MS = int(os.environ.get("MONGO_MAX_IDLE_TIME_MS", 60000))
+
+mongo_command_seconds = histogram("mongo_command_seconds", "MongoDB command latency by command name")
+
+
+class CommandTimer(monitoring.CommandListener):
+    """Times every command the driver sends; runs on the driver's threads."""
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        mongo_command_seconds.labels(command=event.command_name, outcome="ok").observe(event.duration_micros / 1e6)
+
+    def failed(self, event):
+        mongo_command_seconds.labels(command=event.command_name, outcome="error").observe(event.duration_micros / 1e6)
+
+
+client = AsyncIOMotorClient(
+    MONGO_URL,
+    event_listeners=[CommandTimer()],
+    maxPoolSize=MONGO_MAX_POOL_SIZE,
+    minPoolSize=MONGO_MIN_POOL_SIZE,
+    maxIdleTimeMS=MONGO_MAX_IDLE_TIME_MS,
+)
 auth_db = client[DB_NAME]
 users_collection = auth_db["users"]
 database = client[DB_NAME]
+# Legacy one-document-per-item collection; migrate_bills.py moves it into bills
 item_collection = database["bill_items"]
-goal_collection = database["goals"]
\ No newline at end of file
+bills_collection = database["bills"]
+rollup_collection = database["spending_rollups"]
+goal_collection = database["goals"]
+job_collection = database["process_jobs"]
+insight_collection = database["insight_cache"]
+alert_collection = database["expense_alerts"]
+# One document per user (_id = user_id) with the running statistics alerts are scored against
+stats_collection = database["spending_stats"]
+
+
+# --- Indexes ---
+INDEXES = {
+    users_collection: [
+        IndexModel([("email", ASCENDING)], name="email_unique", unique=True),
+        # Family sharing: the users who granted a caregiver access
+        IndexModel([("familyGrants.email", ASCENDING)], name="family_grants_email"),
+    ],
+    bills_collection: [
+        IndexModel([("user_id", ASCENDING), ("bill_date", ASCENDING)], name="user_date"),
+        # The nightly forecast reads every user's recent bills by date alone
+        IndexModel([("bill_date", ASCENDING)], name="bill_date"),
+        IndexModel([("user_id", ASCENDING), ("created_at", ASCENDING), ("_id", ASCENDING)],
+                   name="user_created_at"),
+        IndexModel([("user_id", ASCENDING), ("items._id", ASCENDING)], name="user_item_id"),
+        IndexModel([("user_id", ASCENDING), ("bill_hash", ASCENDING)], name="user_bill_hash",
+                   partialFilterExpression={"bill_hash": {"$exists": True}}),
+    ],
+    rollup_collection: [
+        IndexModel([("user_id", ASCENDING), ("month", ASCENDING), ("category", ASCENDING)],
+                   name="user_month_category", unique=True),
+    ],
+    item_collection: [
+        # Only the bills migration still reads this collection, in this order
+        IndexModel([("user_id", ASCENDING), ("created_at", ASCENDING), ("_id", ASCENDING)],
+                   name="user_created_at"),
+    ],
+    job_collection: [
+        IndexModel([("status", ASCENDING), ("run_at", ASCENDING)], name="status_run_at"),
+        # Finished jobs are kept a week for polling, then dropped by MongoDB
+        IndexModel([("finished_at", ASCENDING)], name="finished_at_ttl", expireAfterSeconds=7 * 24 * 3600),
+    ],
+    insight_collection: [
+        # Users who stop opening the dashboard do not keep their cached insights forever
+        IndexModel([("generated_at", ASCENDING)], name="generated_at_ttl", expireAfterSeconds=30 * 24 * 3600),
+    ],
+    alert_collection: [
+        IndexModel([("user_id", ASCENDING), ("dismissed", ASCENDING), ("created_at", DESCENDING)],
+                   name="user_dismissed_created_at"),
+    ],
+}
+
+
+def close_client():
+    client.close()
+
+
+async def ensure_indexes():
+    """
+    Creates the indexes the hot queries rely on. create_indexes is a no-op for
+    indexes that already exist with the same spec, so this is safe on every startup.
+    """
+    for collection, indexes in INDEXES.items():
+        await collection.create_indexes(indexes)
+
+
+def _plan_stages(plan):
+    """Yields every stage name found anywhere in an explain() plan."""
+    if isinstance(plan, dict):
+        if "stage" in plan:
+            yield plan["stage"]
+        for value in plan.values():
+            yield from _plan_stages(value)
+    elif isinstance(plan, list):
+        for value in plan:
+            yield from _plan_stages(value)
+
+
+async def check_query_plans(user_id="explain@example.com"):
+    """
+    Explains the hot queries and raises AssertionError if any of them falls back
+    to a collection scan. Returns the stages seen per query for inspection.
+    """
+    # Imported here to avoid a circular import (insights imports this module)
+    from insights import build_summary_pipeline, build_expenses_pipeline
+    from forecast import history_pipeline, history_window
+
+    start, end = history_window(datetime.date.today())
+
+    def explain_aggregate(collection, pipeline):
+        return database.command("explain", {"aggregate": collection.name, "pipeline": pipeline, "cursor": {}})
+
+    explains = {
+        "users.email": await users_collection.find({"email": user_id}).limit(1).explain(),
+        "bills.expenses": await explain_aggregate(bills_collection, build_expenses_pipeline(user_id, limit=100)),
+        "bills.expenses_after": await explain_aggregate(
+            bills_collection, build_expenses_pipeline(user_id, (datetime.datetime.utcnow(), ObjectId(), ObjectId()), limit=100)),
+        "bills.summary": await explain_aggregate(bills_collection, build_summary_pipeline(user_id)),
+        "bills.item_id": await bills_collection.find({"user_id": user_id, "items._id": ObjectId()}).explain(),
+        "bills.forecast": await explain_aggregate(bills_collection, history_pipeline(start, end, [user_id])),
+        # The nightly run reads every user's bills
+        "bills.forecast_all": await explain_aggregate(bills_collection, history_pipeline(start, end)),
+    }
+
+    stages = {name: sorted(set(_plan_stages(plan))) for name, plan in explains.items()}
+    scans = [name for name, seen in stages.items() if "COLLSCAN" in seen]
+    assert not scans, f"Queries fell back to COLLSCAN: {scans} ({stages})"
+    return stages
+
+
+if __name__ == "__main__":
+    # python database.py  -> create indexes and verify the hot query plans
+    async def main():
+        await ensure_indexes()
+        for name, seen in (await check_query_plans()).items():
+            print(f"{name}: {', '.join(seen)}")
+
+    asyncio.run(main())
@@ -0,0 +1,357 @@
+"""
+Bulk export and import of a user's expense history as CSV, Parquet or Arrow.
+
+Exports walk the same sorted aggregation as /expenses and write
+EXPORT_BATCH_ROWS rows at a time (a CSV chunk, a Parquet row group or an Arrow
+record batch), so memory stays flat however long the history is. Parquet and
+Arrow need the optional `pyarrow` package.
+
+Imports read the file in batches, validate each batch in one pass, group the
+rows into bills and insert_many them in chunks. Each bill gets a bill_hash
+derived from its source, so importing the same file twice stores it once, and
+rows of the user's own export whose bill still exists are skipped.
+"""
+import io
+import os
+import csv
+import asyncio
+import hashlib
+import datetime
+from itertools import groupby
+from bson import ObjectId
+from pydantic import TypeAdapter, ValidationError
+from database import bills_collection
+from bills import make_bill
+from rollups import record_new_bills
+from alerts import rebuild_stats
+from models import ExpenseImportRow
+from structured_log import get_logger
+
+EXPORT_FORMATS = ("csv", "parquet", "arrow")
+EXPORT_COLUMNS = (
+    "id", "bill_id", "bill_date", "store_name", "total_amount", "item_name", "quantity", "unit_price", "category",
+    "input_type", "created_at",
+)
+EXPORT_BATCH_ROWS = int(os.environ.get("EXPORT_BATCH_ROWS", 5000))
+IMPORT_BATCH_ROWS = int(os.environ.get("IMPORT_BATCH_ROWS", 5000))
+IMPORT_MAX_ROWS = int(os.environ.get("IMPORT_MAX_ROWS", 500000))
+# Row errors reported back; the count covers all of them
+IMPORT_MAX_ERRORS = 100
+# Arrow files are in the IPC stream format
+EXTENSIONS = {".csv": "csv", ".parquet": "parquet", ".pq": "parquet", ".arrow": "arrow", ".arrows": "arrow"}
+MEDIA_TYPES = {
+    "csv": "text/csv",
+    "parquet": "application/vnd.apache.parquet",
+    "arrow": "application/vnd.apache.arrow.stream",
+}
+
+_rows_adapter = TypeAdapter(list[ExpenseImportRow])
+log = get_logger("expense_io")
+
+
+class ExpenseFormatError(Exception):
+    """The format is unknown, needs pyarrow, or the file cannot be read in it."""
+
+
+def pyarrow_available() -> bool:
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def check_format(fmt):
+    if fmt not in EXPORT_FORMATS:
+        raise ExpenseFormatError(f"Unknown format '{fmt}', expected one of {', '.join(EXPORT_FORMATS)}")
+    if fmt != "csv" and not pyarrow_available():
+        raise ExpenseFormatError(
+            f"{fmt} files need the optional pyarrow package, which is not installed on this server; use csv instead"
+        )
+
+
+def format_from_filename(filename, default="csv"):
+    return EXTENSIONS.get(os.path.splitext(filename or "")[1].lower(), default)
+
+
+# --- Export ---
+def _export_row(doc):
+    return {
+        "id": str(doc["_id"]),
+        "bill_id": str(doc["bill_id"]),
+        "bill_date": doc.get("bill_date"),
+        "store_name": doc.get("store_name"),
+        "total_amount": _float(doc.get("total_amount")),
+        "item_name": doc.get("item_name"),
+        "quantity": _float(doc.get("quantity")),
+        "unit_price": _float(doc.get("unit_price")),
+        "category": doc.get("category"),
+        "input_type": doc.get("input_type"),
+        "created_at": doc.get("created_at"),
+    }
+
+
+def _float(value):
+    # Edited rows may hold numbers as strings; unparsable ones export as empty
+    try:
+        return float(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+async def _row_batches(user_id, after=None):
+    # Imported here to avoid a circular import (insights imports this module)
+    from insights import build_expenses_pipeline
+
+    batch = []
+    pipeline = build_expenses_pipeline(user_id, after)
+    async for doc in bills_collection.aggregate(pipeline, batchSize=EXPORT_BATCH_ROWS, allowDiskUse=True):
+        batch.append(_export_row(doc))
+        if len(batch) >= EXPORT_BATCH_ROWS:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+class _ChunkSink:
+    """Write-only file object that hands out what was written since the last take()."""
+
+    def __init__(self):
+        self.buffer = bytearray()
+        self.position = 0
+        self.closed = False
+
+    def write(self, data):
+        self.buffer += data
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def take(self) -> bytes:
+        data = bytes(self.buffer)
+        self.buffer.clear()
+        return data
+
+
+def _arrow_schema():
+    import pyarrow as pa
+
+    return pa.schema([
+        *[(name, pa.string()) for name in ("id", "bill_id", "bill_date", "store_name")],
+        ("total_amount", pa.float64()),
+        ("item_name", pa.string()),
+        ("quantity", pa.float64()),
+        ("unit_price", pa.float64()),
+        ("category", pa.string()),
+        ("input_type", pa.string()),
+        ("created_at", pa.timestamp("ms")),
+    ])
+
+
+def _arrow_batch(rows, schema):
+    import pyarrow as pa
+
+    return pa.RecordBatch.from_pydict({name: [row[name] for row in rows] for name in schema.names}, schema=schema)
+
+
+async def export_chunks(user_id: str, fmt: str = "csv"):
+    """
+    Yields the user's full expense history, oldest first, as bytes of the given
+    format. Call check_format first: errors here surface mid-response.
+    """
+    check_format(fmt)
+
+    if fmt == "csv":
+        text = io.StringIO()
+        writer = csv.DictWriter(text, fieldnames=EXPORT_COLUMNS, extrasaction="ignore")
+        writer.writeheader()
+        async for rows in _row_batches(user_id):
+            writer.writerows(rows)
+            yield text.getvalue().encode("utf-8")
+            text.seek(0)
+            text.truncate()
+        if text.tell():
+            yield text.getvalue().encode("utf-8")
+        return
+
+    import pyarrow.ipc
+    import pyarrow.parquet
+
+    schema = _arrow_schema()
+    sink = _ChunkSink()
+    if fmt == "parquet":
+        writer = pyarrow.parquet.ParquetWriter(sink, schema, compression="zstd")
+    else:
+        writer = pyarrow.ipc.new_stream(sink, schema)
+    try:
+        async for rows in _row_batches(user_id):
+            # One row group / record batch per chunk of rows
+            writer.write_batch(_arrow_batch(rows, schema))
+            yield sink.take()
+    finally:
+        writer.close()
+    yield sink.take()
+
+
+# --- Import ---
+def _read_batches(file, fmt):
+    """Yields lists of row dicts from an open binary file, IMPORT_BATCH_ROWS at a time."""
+    if fmt == "csv":
+        text = io.TextIOWrapper(file, encoding="utf-8-sig", newline="")
+        reader = csv.DictReader(text)
+        try:
+            while True:
+                batch = [
+                    {key: (value if value != "" else None) for key, value in row.items() if key is not None}
+                    for _, row in zip(range(IMPORT_BATCH_ROWS), reader)
+                ]
+                if not batch:
+                    return
+                yield batch
+        finally:
+            # The caller owns the file; do not let the wrapper close it
+            text.detach()
+    elif fmt == "parquet":
+        import pyarrow.parquet
+
+        for batch in pyarrow.parquet.ParquetFile(file).iter_batches(batch_size=IMPORT_BATCH_ROWS):
+            yield batch.to_pylist()
+    else:
+        import pyarrow.ipc
+
+        for batch in pyarrow.ipc.open_stream(file):
+            rows = batch.to_pylist()
+            for start in range(0, len(rows), IMPORT_BATCH_ROWS):
+                yield rows[start:start + IMPORT_BATCH_ROWS]
+
+
+def validate_rows(rows, offset):
+    """Validates a batch in one pass. Returns (valid rows, [(row number, error)])."""
+    try:
+        return _rows_adapter.validate_python(rows), []
+    except ValidationError as e:
+        bad = {}
+        for error in e.errors():
+            index = error["loc"][0]
+            bad.setdefault(index, f"{'.'.join(str(part) for part in error['loc'][1:])}: {error['msg']}")
+        valid = _rows_adapter.validate_python([row for index, row in enumerate(rows) if index not in bad])
+        # Row numbers count data rows from 1, as a spreadsheet shows them below the header
+        return valid, [(offset + index + 1, message) for index, message in sorted(bad.items())]
+
+
+def _bill_key(row: ExpenseImportRow):
+    # Exported rows carry their bill id; other files group consecutive rows by store and date
+    return row.bill_id or (row.store_name, row.bill_date)
+
+
+def _exported_id(bill_id):
+    # The id of the bill a row was exported from, when it is one of ours
+    return ObjectId(bill_id) if bill_id and ObjectId.is_valid(bill_id) else None
+
+
+def rows_to_bills(user_id, rows):
+    """
+    Groups consecutive validated rows into bill documents with a source-derived
+    bill_hash. Returns (exported bill id or None, bill) pairs.
+    """
+    bills = []
+    for key, group in groupby(rows, key=_bill_key):
+        items = list(group)
+        first = items[0]
+        source = repr((key, [(item.item_name, item.quantity, item.unit_price, item.category) for item in items]))
+        bills.append((_exported_id(first.bill_id), make_bill({
+            "user_id": user_id,
+            "store_name": first.store_name,
+            "bill_date": first.bill_date,
+            "total_amount": first.total_amount if first.total_amount is not None
+            else round(sum(item.quantity * item.unit_price for item in items), 2),
+            "input_type": first.input_type or "import",
+            "bill_hash": "import:" + hashlib.sha256(source.encode("utf-8")).hexdigest(),
+            "created_at": first.created_at or datetime.datetime.utcnow(),
+        }, [
+            {"item_name": item.item_name, "quantity": item.quantity, "unit_price": item.unit_price, "category": item.category}
+            for item in items
+        ])))
+    return bills
+
+
+async def _insert_new(user_id, sourced_bills, result):
+    """
+    Inserts the bills not already in the user's history and counts them into
+    result. A bill is already there when it was imported before (same
+    bill_hash) or when the file is the user's own export (its bill id exists).
+    """
+    if not sourced_bills:
+        return
+    bills = [bill for _, bill in sourced_bills]
+    hashes = [bill["bill_hash"] for bill in bills]
+    existing = set(await bills_collection.distinct("bill_hash", {"user_id": user_id, "bill_hash": {"$in": hashes}}))
+    exported_ids = [source_id for source_id, _ in sourced_bills if source_id is not None]
+    own = set(await bills_collection.distinct("_id", {"user_id": user_id, "_id": {"$in": exported_ids}})) if exported_ids else set()
+    seen = set()
+    fresh = []
+    for source_id, bill in sourced_bills:
+        if bill["bill_hash"] not in existing and bill["bill_hash"] not in seen and source_id not in own:
+            seen.add(bill["bill_hash"])
+            fresh.append(bill)
+    if fresh:
+        await bills_collection.insert_many(fresh, ordered=False)
+        await record_new_bills(fresh)
+    result["imported_bills"] += len(fresh)
+    result["imported_items"] += sum(len(bill["items"]) for bill in fresh)
+    result["skipped_bills"] += len(bills) - len(fresh)
+
+
+async def import_file(user_id: str, file, fmt: str = "csv") -> dict:
+    """
+    Imports an exported (or hand-made) expense file into the user's history.
+    Invalid rows are skipped and reported; bills already imported are skipped.
+    """
+    check_format(fmt)
+
+    result = {"imported_items": 0, "imported_bills": 0, "skipped_bills": 0, "error_count": 0, "errors": []}
+    batches = _read_batches(file, fmt)
+    offset = 0
+    pending = []
+    while True:
+        try:
+            # File parsing is blocking work; keep it off the event loop
+            rows = await asyncio.to_thread(next, batches, None)
+        except (ValueError, OSError, csv.Error) as e:
+            raise ExpenseFormatError(f"Could not read the file as {fmt}: {e}")
+        if rows is None:
+            break
+        if offset + len(rows) > IMPORT_MAX_ROWS:
+            raise ExpenseFormatError(f"At most {IMPORT_MAX_ROWS} rows can be imported at once")
+
+        valid, errors = validate_rows(rows, offset)
+        offset += len(rows)
+        result["error_count"] += len(errors)
+        room = IMPORT_MAX_ERRORS - len(result["errors"])
+        result["errors"] += [{"row": row, "error": message} for row, message in errors[:max(room, 0)]]
+
+        # The last bill of a batch may continue in the next one, so its rows wait
+        rows = pending + valid
+        split = len(rows)
+        while split and _bill_key(rows[split - 1]) == _bill_key(rows[-1]):
+            split -= 1
+        pending = rows[split:]
+        await _insert_new(user_id, rows_to_bills(user_id, rows[:split]), result)
+    await _insert_new(user_id, rows_to_bills(user_id, pending), result)
+
+    if result["imported_bills"]:
+        # Imported history feeds the alert statistics without raising alerts for it
+        await rebuild_stats(user_id)
+    log.info("expenses imported", extra={"user_id": user_id, "format": fmt, **{
+        key: value for key, value in result.items() if key != "errors"
+    }})
+    return result
@@ -0,0 +1,74 @@
+import os
+import json
+import asyncio
+import hashlib
+from typing import Optional
+from cachetools import LRUCache
+from structured_log import get_logger
+
+# Parsed bill JSON from the model, keyed by a hash of the input. Re-uploads of
+# the same receipt photo (or a frontend retry) then skip the model call.
+EXTRACTION_CACHE_SIZE = int(os.environ.get("EXTRACTION_CACHE_SIZE", 256))
+EXTRACTION_CACHE_DIR = os.environ.get("EXTRACTION_CACHE_DIR")  # unset = memory only
+
+_memory_cache = LRUCache(maxsize=EXTRACTION_CACHE_SIZE)
+log = get_logger("extraction_cache")
+
+
+def normalize_explanation(text: Optional[str]) -> str:
+    return " ".join((text or "").split()).lower()
+
+
+def content_key(image_bytes: Optional[bytes], user_explanation: Optional[str], day: Optional[str] = None) -> str:
+    """
+    SHA-256 over the decoded image bytes and the whitespace/case-normalized text.
+    Text-only inputs pass the current day, since phrases like "yesterday" are
+    resolved by the model relative to when they were said.
+    """
+    digest = hashlib.sha256()
+    digest.update(b"image:")
+    digest.update(image_bytes or b"")
+    digest.update(b"\0text:")
+    digest.update(normalize_explanation(user_explanation).encode("utf-8"))
+    if day:
+        digest.update(b"\0day:")
+        digest.update(day.encode("utf-8"))
+    return digest.hexdigest()
+
+
+def _disk_path(key: str) -> str:
+    return os.path.join(EXTRACTION_CACHE_DIR, f"{key}.json")
+
+
+def _read_disk(key: str):
+    try:
+        with open(_disk_path(key), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_disk(key: str, value: dict):
+    os.makedirs(EXTRACTION_CACHE_DIR, exist_ok=True)
+    tmp_path = f"{_disk_path(key)}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(value, f)
+    os.replace(tmp_path, _disk_path(key))
+
+
+async def get(key: str) -> Optional[dict]:
+    value = _memory_cache.get(key)
+    if value is None and EXTRACTION_CACHE_DIR:
+        value = await asyncio.to_thread(_read_disk, key)
+        if value is not None:
+            _memory_cache[key] = value
+    return value
+
+
+async def put(key: str, value: dict):
+    _memory_cache[key] = value
+    if EXTRACTION_CACHE_DIR:
+        try:
+            await asyncio.to_thread(_write_disk, key, value)
+        except OSError as e:
+            log.warning("extraction cache write failed", extra={"key": key, "error": str(e)})
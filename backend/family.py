@@ -0,0 +1,118 @@
+"""
+Family sharing: a user grants trusted family members (caregivers) read access
+to their spending. Grants live on the dependent's user document,
+
+    familyGrants: [{"email": caregiver, "granted_at": datetime}]
+
+so only the dependent decides who sees their data, and a caregiver's
+dependents are one indexed query on familyGrants.email.
+
+The overview fans in every dependent with one query per data source ($in over
+their ids) instead of one set of queries per dependent, and is cached per
+caregiver and set of dependents for FAMILY_OVERVIEW_TTL_SECONDS. The grants are
+read on every request, so a revoked grant takes effect immediately.
+"""
+import os
+import asyncio
+import datetime
+from cachetools import TTLCache
+from database import users_collection, alert_collection
+from forecast import forecast_users
+
+FAMILY_MAX_DEPENDENTS = int(os.environ.get("FAMILY_MAX_DEPENDENTS", 20))
+FAMILY_OVERVIEW_TTL_SECONDS = int(os.environ.get("FAMILY_OVERVIEW_TTL_SECONDS", 60))
+FAMILY_OVERVIEW_CACHE_SIZE = int(os.environ.get("FAMILY_OVERVIEW_CACHE_SIZE", 1024))
+DEPENDENT_PROJECTION = {"_id": 0, "email": 1, "firstName": 1, "lastName": 1, "financialDetails": 1}
+
+_overview_cache = TTLCache(maxsize=FAMILY_OVERVIEW_CACHE_SIZE, ttl=FAMILY_OVERVIEW_TTL_SECONDS)
+
+
+class FamilyGrantError(Exception):
+    """A grant that cannot be made; the message is safe to show the user."""
+
+
+# --- Grants ---
+async def grant_access(user_email: str, caregiver_email: str) -> bool:
+    """
+    Lets caregiver_email read user_email's spending. Returns False if it already could.
+    Whether the caregiver has an account is not checked, so the response does not
+    reveal it; a grant to an email that registers later applies from then on.
+    """
+    if caregiver_email == user_email:
+        raise FamilyGrantError("You cannot share your data with yourself.")
+    if await users_collection.count_documents({"familyGrants.email": caregiver_email}) >= FAMILY_MAX_DEPENDENTS:
+        raise FamilyGrantError(f"That user already follows {FAMILY_MAX_DEPENDENTS} family members.")
+
+    result = await users_collection.update_one(
+        {"email": user_email, "familyGrants.email": {"$ne": caregiver_email}},
+        {"$push": {"familyGrants": {"email": caregiver_email, "granted_at": datetime.datetime.utcnow()}}},
+    )
+    return result.modified_count > 0
+
+
+async def revoke_access(user_email: str, caregiver_email: str) -> bool:
+    result = await users_collection.update_one(
+        {"email": user_email}, {"$pull": {"familyGrants": {"email": caregiver_email}}}
+    )
+    return result.modified_count > 0
+
+
+async def list_dependents(caregiver_email: str) -> list:
+    """The users who granted caregiver_email access, oldest email first."""
+    cursor = users_collection.find({"familyGrants.email": caregiver_email}, DEPENDENT_PROJECTION)
+    return await cursor.sort("email", 1).to_list(length=FAMILY_MAX_DEPENDENTS)
+
+
+# --- Overview ---
+def alert_counts_pipeline(user_ids):
+    return [
+        {"$match": {"user_id": {"$in": user_ids}, "dismissed": False}},
+        {"$sort": {"created_at": -1}},
+        {"$group": {
+            "_id": "$user_id",
+            "open": {"$sum": 1},
+            "high": {"$sum": {"$cond": [{"$eq": ["$severity", "high"]}, 1, 0]}},
+            "latest": {"$first": "$message"},
+        }},
+    ]
+
+
+async def build_overview(dependents: list, today=None) -> list:
+    """
+    Spending forecast and open alerts for every dependent: one forecast
+    aggregation and one alerts aggregation however many dependents there are.
+    """
+    if not dependents:
+        return []
+    user_ids = [user["email"] for user in dependents]
+    forecasts, alert_rows = await asyncio.gather(
+        forecast_users(dependents, today),
+        alert_collection.aggregate(alert_counts_pipeline(user_ids)).to_list(length=None),
+    )
+    alerts = {row["_id"]: row for row in alert_rows}
+    return [
+        {
+            "email": user["email"],
+            "firstName": user.get("firstName"),
+            "lastName": user.get("lastName"),
+            "forecast": forecasts[user["email"]],
+            "open_alerts": alerts.get(user["email"], {}).get("open", 0),
+            "high_alerts": alerts.get(user["email"], {}).get("high", 0),
+            "latest_alert": alerts.get(user["email"], {}).get("latest"),
+        }
+        for user in dependents
+    ]
+
+
+async def get_overview(caregiver_email: str) -> dict:
+    dependents = await list_dependents(caregiver_email)
+    key = (caregiver_email, tuple(user["email"] for user in dependents))
+    overview = _overview_cache.get(key)
+    if overview is None:
+        overview = {
+            "caregiver": caregiver_email,
+            "generated_at": datetime.datetime.utcnow(),
+            "dependents": await build_overview(dependents),
+        }
+        _overview_cache[key] = overview
+    return overview
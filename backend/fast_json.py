@@ -0,0 +1,74 @@
+"""
+Opt-in fast path for the item-list responses (FAST_JSON=1).
+
+/process and /expenses normally build a Pydantic model per item, or let
+FastAPI validate the raw rows against the response_model, and then encode the
+result with the stdlib json module. The rows come straight from our own bill
+documents, so with the fast path they are shaped into the response dicts
+directly and encoded once by orjson: ObjectIds become strings and datetimes
+ISO 8601 strings, as the models produce them. Numeric fields are still
+coerced to floats, since edited rows may hold numbers as strings.
+
+    python benchmark.py serialize --items 1000 10000
+"""
+import os
+import orjson
+from bson import ObjectId
+from fastapi.responses import Response
+from models import ProcessedItemInDB, ExpenseItem
+
+FAST_JSON_ENABLED = os.environ.get("FAST_JSON", "0").lower() in ("1", "true", "yes")
+
+NUMERIC_FIELDS = ("total_amount", "quantity", "unit_price")
+# Response keys in model order (by alias), so both paths send the same document
+PROCESSED_ITEM_FIELDS = tuple(field.alias or name for name, field in ProcessedItemInDB.model_fields.items())
+EXPENSE_ITEM_FIELDS = tuple(ExpenseItem.model_fields)
+
+
+def _default(value):
+    if isinstance(value, ObjectId):
+        return str(value)
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+
+def dumps(content) -> bytes:
+    return orjson.dumps(content, default=_default)
+
+
+def _float(value):
+    # Unparsable numbers are sent as null rather than failing the whole response
+    if value is None or type(value) is float:
+        return value
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def processed_item(row: dict) -> dict:
+    """A flattened bill row (bills.flatten_bill) in the ProcessedItemInDB shape, by alias."""
+    item = {field: row.get(field) for field in PROCESSED_ITEM_FIELDS}
+    item["_id"] = str(row["_id"])
+    item["bill_id"] = str(row["bill_id"]) if row.get("bill_id") else None
+    for field in NUMERIC_FIELDS:
+        item[field] = _float(item[field])
+    return item
+
+
+def expense_item(doc: dict) -> dict:
+    """An item row from the /expenses pipeline in the ExpenseItem shape."""
+    item = {field: doc.get(field) for field in EXPENSE_ITEM_FIELDS}
+    item["quantity"] = _float(item["quantity"])
+    item["unit_price"] = _float(item["unit_price"])
+    item["id"] = str(doc["_id"])
+    item["bill_id"] = str(doc["bill_id"]) if doc.get("bill_id") else None
+    return item
+
+
+class FastJSONResponse(Response):
+    """A JSON response encoded by orjson, for content that needs no validation."""
+
+    media_type = "application/json"
+
+    def render(self, content) -> bytes:
+        return dumps(content)
@@ -0,0 +1,274 @@
+"""
+Month-end spending projections against the user's income and pension.
+
+A user's recent spending (FORECAST_HISTORY_DAYS, grouped per day and category
+by MongoDB) is loaded into parallel NumPy columns. Per-category run-rates,
+month-end projections and the remaining daily budget are then computed for
+all users at once, so one user and every user go through the same code:
+
+    python forecast.py nightly [--today 2026-10-18]
+
+scores every user in one pass and raises an "overshoot" alert for each user
+projected to spend more than their monthly income this month.
+"""
+import os
+import re
+import time
+import calendar
+import argparse
+import asyncio
+import datetime
+import numpy as np
+from database import bills_collection, users_collection, alert_collection, ensure_indexes
+from metrics import histogram
+from structured_log import get_logger
+
+# Days of history behind the run-rate; the current month is always included
+FORECAST_HISTORY_DAYS = int(os.environ.get("FORECAST_HISTORY_DAYS", 90))
+
+forecast_seconds = histogram("forecast_seconds", "Time to load and project spending, per request or nightly run")
+log = get_logger("forecast")
+
+
+def parse_amount(value):
+    """Income fields are free text ("30000", "Rs 15,000"); returns a float or None."""
+    match = re.search(r"\d+(?:\.\d+)?", str(value or "").replace(",", ""))
+    return float(match.group()) if match else None
+
+
+def monthly_budget(financial_details):
+    """Monthly income plus pension, or None when neither is known."""
+    details = financial_details or {}
+    parts = [parse_amount(details.get("income"))]
+    if details.get("getsPension"):
+        parts.append(parse_amount(details.get("pensionAmount")))
+    known = [part for part in parts if part is not None]
+    return sum(known) if known else None
+
+
+def history_window(today):
+    month_start = today.replace(day=1)
+    start = min(month_start, today - datetime.timedelta(days=FORECAST_HISTORY_DAYS))
+    end = month_start.replace(day=calendar.monthrange(today.year, today.month)[1])
+    return start, end
+
+
+def history_pipeline(start, end, user_ids=None):
+    match = {"bill_date": {"$gte": start.isoformat(), "$lte": end.isoformat()}}
+    if user_ids is not None:
+        match = {"user_id": {"$in": list(user_ids)}, **match}
+    return [
+        {"$match": match},
+        {"$unwind": "$items"},
+        {"$match": {"items.unit_price": {"$ne": None}}},
+        {"$group": {
+            "_id": {"user_id": "$user_id", "day": "$bill_date", "category": {"$ifNull": ["$items.category", "Other"]}},
+            "amount": {"$sum": {"$multiply": [
+                {"$convert": {"input": "$items.quantity", "to": "double", "onError": 0, "onNull": 0}},
+                {"$convert": {"input": "$items.unit_price", "to": "double", "onError": 0, "onNull": 0}},
+            ]}},
+        }},
+    ]
+
+
+def _factorize(values):
+    """Distinct values in first-seen order plus each value's code (a dict beats np.unique on strings)."""
+    codes = {}
+    index = np.fromiter((codes.setdefault(value, len(codes)) for value in values), dtype=np.int64, count=len(values))
+    return list(codes), index
+
+
+def to_columns(user_ids, days, categories, amounts, start):
+    """
+    Turns parallel lists of spending rows into (users, categories, user index,
+    category index, day offset from start, amount) NumPy columns. Rows with an
+    unparsable date are dropped.
+    """
+    users, user_idx = _factorize(user_ids)
+    category_names, category_idx = _factorize(categories)
+    unique_days, day_idx = _factorize(days)
+
+    def offset(day):
+        try:
+            return (datetime.date.fromisoformat(day) - start).days
+        except (TypeError, ValueError):
+            return -1
+
+    day_offsets = np.array([offset(day) for day in unique_days], dtype=np.int64)[day_idx]
+    valid = day_offsets >= 0
+    return (
+        users, category_names, user_idx[valid], category_idx[valid],
+        day_offsets[valid], np.asarray(amounts, dtype=np.float64)[valid],
+    )
+
+
+def project(user_idx, category_idx, day_offsets, amounts, n_users, n_categories, start, today):
+    """
+    Per (user, category): month-to-date spend, daily run-rate and projected
+    month-end spend, as (n_users, n_categories) arrays.
+
+    The run-rate blends this month's pace with the user's history, weighting
+    this month more as it goes on: early in the month a single large bill
+    should not dominate the projection.
+    """
+    days_in_month = calendar.monthrange(today.year, today.month)[1]
+    elapsed = today.day
+    month_offset = (today.replace(day=1) - start).days
+    cells = n_users * n_categories
+    flat = user_idx * n_categories + category_idx
+
+    in_month = day_offsets >= month_offset
+    month_to_date = np.bincount(flat[in_month], amounts[in_month], minlength=cells).reshape(n_users, n_categories)
+    history = np.bincount(flat[~in_month], amounts[~in_month], minlength=cells).reshape(n_users, n_categories)
+
+    # History is counted from each user's first bill in the window, not the window start
+    first_day = np.full(n_users, month_offset, dtype=np.int64)
+    np.minimum.at(first_day, user_idx, day_offsets)
+    history_days = (month_offset - first_day)[:, None].astype(np.float64)
+
+    history_rate = np.divide(history, history_days, out=np.zeros(history.shape), where=history_days > 0)
+    current_rate = month_to_date / elapsed
+    weight = elapsed / days_in_month
+    rate = np.where(history_days > 0, weight * current_rate + (1 - weight) * history_rate, current_rate)
+    projected = month_to_date + rate * (days_in_month - elapsed)
+    return month_to_date, rate, projected
+
+
+def build_forecasts(users, categories, month_to_date, rate, projected, budgets, today):
+    """Response documents (SpendingForecast shape) from the projected arrays; budgets is {user_id: amount or None}."""
+    days_in_month = calendar.monthrange(today.year, today.month)[1]
+    days_left = days_in_month - today.day + 1
+    income = np.array([budgets.get(user) if budgets.get(user) is not None else np.nan for user in users], dtype=np.float64)
+    spent = month_to_date.sum(axis=1)
+    projected_total = projected.sum(axis=1)
+    remaining = income - spent
+
+    forecasts = []
+    for index, user in enumerate(users):
+        known = not np.isnan(income[index])
+        forecasts.append({
+            "user_id": user,
+            "month": today.strftime("%Y-%m"),
+            "days_elapsed": today.day,
+            "days_in_month": days_in_month,
+            "month_to_date": round(float(spent[index]), 2),
+            "projected_total": round(float(projected_total[index]), 2),
+            "monthly_budget": float(income[index]) if known else None,
+            "remaining_budget": round(float(remaining[index]), 2) if known else None,
+            "daily_budget": round(max(float(remaining[index]), 0.0) / days_left, 2) if known else None,
+            "projected_overshoot": round(float(projected_total[index] - income[index]), 2) if known else None,
+            "on_track": bool(projected_total[index] <= income[index]) if known else None,
+            "by_category": sorted(
+                (
+                    {
+                        "category": category,
+                        "month_to_date": round(float(month_to_date[index, column]), 2),
+                        "daily_rate": round(float(rate[index, column]), 2),
+                        "projected": round(float(projected[index, column]), 2),
+                    }
+                    for column, category in enumerate(categories)
+                    if projected[index, column] > 0 or month_to_date[index, column] > 0
+                ),
+                key=lambda row: row["projected"], reverse=True,
+            ),
+        })
+    return forecasts
+
+
+async def load_rows(start, end, only_users=None):
+    user_ids, days, categories, amounts = [], [], [], []
+    async for row in bills_collection.aggregate(history_pipeline(start, end, only_users), allowDiskUse=True):
+        user_ids.append(row["_id"]["user_id"])
+        days.append(row["_id"]["day"])
+        categories.append(row["_id"]["category"])
+        amounts.append(row["amount"])
+    return user_ids, days, categories, amounts
+
+
+async def forecast(budgets, today=None, user_ids=None):
+    """
+    Projects this month's spending for the given users (one aggregation for
+    all of them) or, without user_ids, every user with bills in the window.
+    budgets maps user ids to their monthly income.
+    """
+    today = today or datetime.date.today()
+    started = time.perf_counter()
+    start, end = history_window(today)
+    rows = await load_rows(start, end, user_ids)
+    # Users without spending in the window still get a forecast with their full budget
+    for user_id in set(user_ids or ()) - set(rows[0]):
+        for column, value in zip(rows, (user_id, today.isoformat(), "Other", 0.0)):
+            column.append(value)
+
+    users, category_names, *columns = to_columns(*rows, start)
+    arrays = project(*columns, len(users), len(category_names), start, today)
+    forecasts = build_forecasts(users, category_names, *arrays, budgets, today)
+    forecast_seconds.labels(mode="users" if user_ids is not None else "all").observe(time.perf_counter() - started)
+    return forecasts
+
+
+async def forecast_users(users, today=None):
+    """Forecasts for user documents, keyed by email."""
+    budgets = {user["email"]: monthly_budget(user.get("financialDetails")) for user in users}
+    return {entry["user_id"]: entry for entry in await forecast(budgets, today, list(budgets))}
+
+
+async def forecast_user(user, today=None):
+    return (await forecast_users([user], today))[user["email"]]
+
+
+async def forecast_all(today=None):
+    """Every user in one aggregation and one vectorized pass."""
+    budgets = {}
+    async for user in users_collection.find({}, {"email": 1, "financialDetails": 1}):
+        budgets[user["email"]] = monthly_budget(user.get("financialDetails"))
+    return await forecast(budgets, today)
+
+
+# --- Nightly alerts ---
+async def record_overshoot_alerts(forecasts):
+    """One "overshoot" alert per user and month, refreshed by every run while the projection stays over budget."""
+    raised = 0
+    for entry in forecasts:
+        budget = entry["monthly_budget"]
+        if not budget or entry["on_track"]:
+            continue
+        ratio = entry["projected_total"] / budget
+        await alert_collection.update_one(
+            {"user_id": entry["user_id"], "kind": "overshoot", "month": entry["month"]},
+            {
+                "$set": {
+                    "bill_id": None,
+                    "item_id": None,
+                    "severity": "high" if ratio >= 1.2 else "medium",
+                    "score": round(ratio, 2),
+                    "message": f"Spending is on track for {entry['projected_total']:.2f} this month, "
+                               f"above the monthly budget of {budget:.2f}",
+                    "amount": entry["projected_total"],
+                    "expected": budget,
+                },
+                "$setOnInsert": {"created_at": datetime.datetime.utcnow(), "dismissed": False},
+            },
+            upsert=True,
+        )
+        raised += 1
+    return raised
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=["nightly"])
+    parser.add_argument("--today", type=datetime.date.fromisoformat, help="Project as of this date (YYYY-MM-DD)")
+    args = parser.parse_args()
+
+    async def run():
+        await ensure_indexes()
+        forecasts = await forecast_all(args.today)
+        return forecasts, await record_overshoot_alerts(forecasts)
+
+    forecasts, raised = asyncio.run(run())
+    print(f"{len(forecasts)} users projected, {raised} over budget")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+import io
+import os
+import time
+import asyncio
+from dataclasses import dataclass
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image, ImageFilter, ImageOps
+from metrics import histogram
+from structured_log import get_logger
+
+# Receipts only need to be legible to the model; phone photos are 4-12 MP, so
+# shrinking and re-encoding them before upload cuts both transfer and token cost.
+RECEIPT_MAX_EDGE = int(os.environ.get("RECEIPT_MAX_EDGE", 1600))
+RECEIPT_FORMAT = os.environ.get("RECEIPT_FORMAT", "JPEG").upper()  # "JPEG" or "WEBP"
+RECEIPT_QUALITY = int(os.environ.get("RECEIPT_QUALITY", 80))
+PREPROCESS_WORKERS = int(os.environ.get("PREPROCESS_WORKERS", 2))
+
+# Paper is brighter than the table it lies on; anything above this (after
+# autocontrast) counts as receipt when looking for the crop box.
+_PAPER_THRESHOLD = 160
+_MIN_CROP_FRACTION = 0.2
+
+_BYTE_BUCKETS = (10_000, 50_000, 100_000, 250_000, 500_000, 1_000_000, 2_500_000, 5_000_000, 10_000_000)
+receipt_image_bytes = histogram("receipt_image_bytes", "Receipt image size before/after preprocessing", _BYTE_BUCKETS)
+receipt_preprocess_seconds = histogram("receipt_preprocess_seconds", "Time spent preprocessing a receipt image")
+receipt_decode_seconds = histogram("receipt_decode_seconds", "Time spent decoding the uploaded receipt image")
+
+log = get_logger("preprocess")
+
+_executor = None
+
+
+@dataclass
+class PreprocessedImage:
+    data: bytes
+    mime_type: str
+    original_bytes: int
+    processed_bytes: int
+    original_size: tuple
+    processed_size: tuple
+    seconds: float
+    decode_seconds: float = 0.0
+
+
+def crop_to_receipt(gray):
+    """Crops a grayscale photo to the bright paper region, or returns it unchanged."""
+    # Search on a small copy; the median filter drops specks of glare
+    probe = gray.copy()
+    probe.thumbnail((400, 400))
+    mask = ImageOps.autocontrast(probe).filter(ImageFilter.MedianFilter(5))
+    mask = mask.point(lambda p: 255 if p > _PAPER_THRESHOLD else 0)
+    bbox = mask.getbbox()
+    if not bbox:
+        return gray
+
+    scale_x = gray.width / probe.width
+    scale_y = gray.height / probe.height
+    left, top, right, bottom = bbox
+    crop = (
+        max(0, int(left * scale_x) - 8),
+        max(0, int(top * scale_y) - 8),
+        min(gray.width, int(right * scale_x) + 8),
+        min(gray.height, int(bottom * scale_y) + 8),
+    )
+    area = (crop[2] - crop[0]) * (crop[3] - crop[1])
+    if area < _MIN_CROP_FRACTION * gray.width * gray.height:
+        # Too small to be the whole receipt; more likely a highlight
+        return gray
+    return gray.crop(crop)
+
+
+def preprocess_receipt(image_bytes: bytes, max_edge: int = RECEIPT_MAX_EDGE) -> PreprocessedImage:
+    """Auto-orients, crops, downsamples, grayscales and re-encodes a receipt photo."""
+    started = time.perf_counter()
+    image = Image.open(io.BytesIO(image_bytes))
+    original_size = image.size
+    # Let the JPEG decoder skip detail we are about to throw away anyway
+    image.draft("L", (max_edge, max_edge))
+
+    image = ImageOps.exif_transpose(image)
+    gray = image.convert("L")
+    decode_seconds = time.perf_counter() - started
+    gray = crop_to_receipt(gray)
+    gray.thumbnail((max_edge, max_edge), Image.LANCZOS)
+
+    out = io.BytesIO()
+    if RECEIPT_FORMAT == "WEBP":
+        gray.save(out, format="WEBP", quality=RECEIPT_QUALITY, method=4)
+        mime_type = "image/webp"
+    else:
+        gray.save(out, format="JPEG", quality=RECEIPT_QUALITY, optimize=True)
+        mime_type = "image/jpeg"
+    data = out.getvalue()
+
+    return PreprocessedImage(
+        data=data,
+        mime_type=mime_type,
+        original_bytes=len(image_bytes),
+        processed_bytes=len(data),
+        original_size=original_size,
+        processed_size=gray.size,
+        seconds=time.perf_counter() - started,
+        decode_seconds=decode_seconds,
+    )
+
+
+async def preprocess_receipt_async(image_bytes: bytes) -> PreprocessedImage:
+    """Runs preprocess_receipt on the worker pool and records the size savings."""
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=PREPROCESS_WORKERS, thread_name_prefix="receipt-preprocess")
+
+    result = await asyncio.get_running_loop().run_in_executor(_executor, preprocess_receipt, image_bytes)
+
+    receipt_image_bytes.labels(stage="original").observe(result.original_bytes)
+    receipt_image_bytes.labels(stage="processed").observe(result.processed_bytes)
+    receipt_preprocess_seconds.observe(result.seconds)
+    receipt_decode_seconds.observe(result.decode_seconds)
+    log.info("receipt preprocessed", extra={
+        "original_size": result.original_size,
+        "original_bytes": result.original_bytes,
+        "processed_size": result.processed_size,
+        "processed_bytes": result.processed_bytes,
+        "ms": round(result.seconds * 1000, 1),
+    })
+    return result
+
+
+def shutdown_preprocess_pool():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
@@ -3,71 +3,67 @@ import base64
 from dotenv import load_dotenv
 load_dotenv()
 import os
-import io
+import asyncio
 import datetime
 import json
-from fastapi import FastAPI, File, UploadFile, Form, HTTPException, Depends
-from fastapi.middleware.cors import CORSMiddleware
+import tempfile
+from contextlib import aclosing
+from fastapi import APIRouter, File, UploadFile, Form, HTTPException, Depends, Query
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, StreamingResponse
+from starlette.background import BackgroundTask
 from typing import Optional, List, Union
 from auth_utils import get_current_user
-from models import ProcessedItemInDB
-from database import item_collection
+from models import ProcessedItemInDB, ProcessJobStatus, BatchProcessResponse
+from database import bills_collection, job_collection
+from service import create_app, create_indexes
+from bills import make_bill, flatten_bill
+from rollups import record_new_bills
+from alerts import score_new_bills
+import extraction_cache
+from rule_extractor import parse_expense, RULE_EXTRACTOR_ENABLED
+from fast_json import FAST_JSON_ENABLED, FastJSONResponse, processed_item
+from metrics import counter
+from image_preprocessing import preprocess_receipt_async, shutdown_preprocess_pool
+from model_backends import get_extraction_backend, ModelTimeoutError
+from jobs import JobQueue
+from speech_to_text import transcribe, get_engine as get_speech_engine, shutdown_speech_pool, SpeechToTextError
+from structured_log import get_logger
 
-import google.generativeai as genai
-from PIL import Image
+# Jobs keep the upload in their document, which MongoDB caps at 16 MB
+MAX_ASYNC_IMAGE_BYTES = 15 * 1024 * 1024
+BATCH_MAX_INPUTS = int(os.environ.get("BATCH_MAX_INPUTS", 50))
+BATCH_MAX_CONCURRENCY = int(os.environ.get("BATCH_MAX_CONCURRENCY", 4))
+MAX_AUDIO_BYTES = int(os.environ.get("MAX_AUDIO_BYTES", 50 * 1024 * 1024))
+AUDIO_EXTRACT_CONCURRENCY = int(os.environ.get("AUDIO_EXTRACT_CONCURRENCY", 2))
+# The engine ends a segment at every pause; shorter ones are joined to the next before extraction
+AUDIO_MIN_SEGMENT_WORDS = int(os.environ.get("AUDIO_MIN_SEGMENT_WORDS", 4))
 
-# --- Configuration ---
-GOOGLE_API_KEY = os.environ.get("GOOGLE_API_KEY", "GOOGLE_API_KEY")
+log = get_logger("processing")
+rule_extractions = counter("rule_extractions", "Text inputs parsed by the local rules vs. sent to the model")
 
 
-# --- Initialize FastAPI App ---
-app = FastAPI(
-    title="Data Processing Service",
-    description="Accepts text and/or an image, extracts item data with categories, and stores each item individually.",
-    version="1.4.2" # Updated version
-)
-
-# --- CORS (Cross-Origin Resource Sharing) ---
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
+# --- Router ---
+router = APIRouter()
 
 
-# --- Configure Gemini API ---
-try:
-    genai.configure(api_key=GOOGLE_API_KEY)
-except Exception as e:
-    print(f"Error configuring Gemini API: {e}. Please ensure GOOGLE_API_KEY is set correctly.")
-
 # --- Helper Function ---
 def fix_object_id(doc):
     """Converts ObjectId to string for JSON serialization."""
     if doc and "_id" in doc:
         doc["_id"] = str(doc["_id"])
+    if doc and "bill_id" in doc:
+        doc["bill_id"] = str(doc["bill_id"])
     return doc
 
-# --- API Endpoint ---
-
-@app.post("/process", response_model=Union[List[ProcessedItemInDB], dict], status_code=201)
-async def process_data_and_store(
-    current_user: dict = Depends(get_current_user),
-    image: Optional[UploadFile] = File(None),
-    image_base64: Optional[str] = Form(None),
-    user_explanation: Optional[str] = Form(None)
-):
-    user_id = current_user["email"]
-
-    if not image and not user_explanation:
-        raise HTTPException(
-            status_code=400,
-            detail="Please provide either an image or a text explanation to process."
-        )
+def stored_items(bill):
+    """A stored bill's items as returned to the client (plain dicts on the FAST_JSON path)."""
+    if FAST_JSON_ENABLED:
+        return [processed_item(row) for row in flatten_bill(bill)]
+    return [ProcessedItemInDB(**fix_object_id(row)) for row in flatten_bill(bill)]
 
-    base_prompt = """
+# --- Extraction Flow ---
+BASE_PROMPT = """
     Analyze the provided information (text and/or image). Your primary task is to extract bill information and present it as a valid JSON object.
 
     The JSON object must follow this structure:
@@ -85,72 +81,397 @@ async def process_data_and_store(
     If no bill information is present or cannot be extracted, behave like a regular chatbot and respond conversationally.
     """
 
-    final_prompt = base_prompt
+
+async def read_process_input(image, image_base64, user_explanation):
+    """Returns the decoded image bytes (or None) and the input_type recorded on each item."""
+    if image:
+        if not image.content_type.startswith("image/"):
+            raise HTTPException(status_code=400, detail="Uploaded file is not a valid image type.")
+        image_bytes = await image.read()
+        return image_bytes, "image" if user_explanation else "image_only"
+
+    if image_base64:
+        header, encoded = image_base64.split(",", 1)
+        image_bytes = base64.b64decode(encoded)
+        return image_bytes, "image_base64" if user_explanation else "image_only_base64"
+
+    return None, "text"
+
+
+async def extract_bill(user_id, image_bytes=None, user_explanation=None, input_type="text"):
+    """
+    Runs the model (or the extraction cache) for one bill and builds the bill
+    document to store.
+
+    Returns (bill, None), or (None, response) with the message dict to hand
+    back when nothing should be stored. Model failures propagate as
+    ModelBackendError so callers can decide whether to retry.
+    """
+    final_prompt = BASE_PROMPT
     if user_explanation:
         final_prompt += f"\n\nHere is some additional context from the user: '{user_explanation}'"
 
-    gemini_payload = [final_prompt]
-    input_type = "text"
+    # Same photo (and note) as before -> same key, so retries and re-uploads
+    # reuse the earlier extraction and are not stored a second time.
+    day = None if image_bytes is not None else datetime.date.today().isoformat()
+    bill_hash = extraction_cache.content_key(image_bytes, user_explanation, day)
+    if image_bytes is not None:
+        existing = await bills_collection.find_one({"user_id": user_id, "bill_hash": bill_hash})
+        if existing:
+            return None, {
+                "message": "This bill has already been added.",
+                "duplicate": True,
+                "items": jsonable_encoder(stored_items(existing), by_alias=True),
+            }
 
-    try:
-        if image:
-            if not image.content_type.startswith("image/"):
-                raise HTTPException(status_code=400, detail="Uploaded file is not a valid image type.")
-            contents = await image.read()
-            pil_image = Image.open(io.BytesIO(contents))
-            gemini_payload.append(pil_image)
-            input_type = "image" if user_explanation else "image_only"
-
-        elif image_base64:
-            header, encoded = image_base64.split(",", 1)
-            image_bytes = base64.b64decode(encoded)
-            pil_image = Image.open(io.BytesIO(image_bytes))
-            gemini_payload.append(pil_image)
-            input_type = "image_base64" if user_explanation else "image_only_base64"
-
-        model = genai.GenerativeModel("gemini-1.5-flash")
-        response = await model.generate_content_async(gemini_payload)
-        cleaned_text = response.text.replace("```json", "").replace("```", "").strip()
-
-        print("[Gemini Response]:", cleaned_text)
+    # Simple one-line text expenses are parsed locally; anything the rules are
+    # not confident about goes to the model as before.
+    generated_json = None
+    if image_bytes is None and RULE_EXTRACTOR_ENABLED:
+        generated_json = parse_expense(user_explanation)
+        rule_extractions.labels(input_type=input_type, result="parsed" if generated_json else "fallback").inc()
+    if generated_json is None:
+        generated_json = await extraction_cache.get(bill_hash)
+    if generated_json is not None:
+        cleaned_text = json.dumps(generated_json)
+    else:
+        image_blob = None
+        if image_bytes is not None:
+            receipt = await preprocess_receipt_async(image_bytes)
+            image_blob = {"mime_type": receipt.mime_type, "data": receipt.data}
+
+        response_text = await get_extraction_backend().extract(final_prompt, image_blob)
+        cleaned_text = response_text.replace("```json", "").replace("```", "").strip()
+
+        log.debug("extraction response", extra={"user_id": user_id, "input_type": input_type, "response": cleaned_text})
 
         try:
             generated_json = json.loads(cleaned_text)
         except json.JSONDecodeError:
-            return {"message": cleaned_text}
-
-        bill_items = generated_json.get("items")
-        if not bill_items or not isinstance(bill_items, list):
-            return {"message": cleaned_text}
-
-        items_to_store = []
-        for item in bill_items:
-            if not all(k in item and item[k] is not None for k in ['unit_price', 'quantity', 'category']):
-                continue
-            new_doc = {
-                "user_id": user_id,
-                "store_name": generated_json.get("store_name"),
-                "bill_date": generated_json.get("bill_date") or datetime.date.today().isoformat(),
-                "total_amount": generated_json.get("total_amount"),
-                "input_type": input_type,
-                "created_at": datetime.datetime.utcnow(),
-                **item,
-            }
-            items_to_store.append(new_doc)
+            return None, {"message": cleaned_text}
 
-        if not items_to_store:
-            return {
-                "message": "No valid expense data found. Here’s the AI response:",
-                "ai_response": cleaned_text
-            }
+        if isinstance(generated_json, dict) and isinstance(generated_json.get("items"), list):
+            await extraction_cache.put(bill_hash, generated_json)
+
+    bill_items = generated_json.get("items") if isinstance(generated_json, dict) else None
+    if not bill_items or not isinstance(bill_items, list):
+        return None, {"message": cleaned_text}
+
+    items_to_store = [
+        item for item in bill_items
+        if isinstance(item, dict) and all(item.get(k) is not None for k in ['unit_price', 'quantity', 'category'])
+    ]
+    if not items_to_store:
+        return None, {
+            "message": "No valid expense data found. Here’s the AI response:",
+            "ai_response": cleaned_text
+        }
+
+    bill = make_bill({
+        "user_id": user_id,
+        "store_name": generated_json.get("store_name"),
+        "bill_date": generated_json.get("bill_date") or datetime.date.today().isoformat(),
+        "total_amount": generated_json.get("total_amount"),
+        "input_type": input_type,
+        "bill_hash": bill_hash,
+        "created_at": datetime.datetime.utcnow(),
+    }, items_to_store)
+    return bill, None
+
+
+async def _store_bills(bills):
+    await bills_collection.insert_many(bills)
+    await record_new_bills(bills)
+    await score_new_bills(bills)
+    return [stored_items(bill) for bill in bills]
+
+
+async def store_bills(bills):
+    """
+    Inserts bill documents in one write and returns each bill's items as stored.
+    Shielded: a caller cancelled midway (e.g. its client went away) never
+    leaves bills stored without their rollup and alert updates.
+    """
+    return await asyncio.shield(_store_bills(bills))
+
+
+async def extract_and_store(user_id, image_bytes=None, user_explanation=None, input_type="text"):
+    """
+    Extracts the bill from an image and/or text and stores each valid item.
+    Returns the created items, or a message dict when nothing could be stored.
+    """
+    bill, response = await extract_bill(user_id, image_bytes, user_explanation, input_type)
+    if bill is None:
+        return response
+    created, = await store_bills([bill])
+    return created
+
+
+async def run_process_job(job):
+    result = await extract_and_store(job["user_id"], job.get("image"), job.get("user_explanation"), job["input_type"])
+    return jsonable_encoder(result, by_alias=True)
+
+
+process_jobs = JobQueue(job_collection, run_process_job)
+
+
+# --- API Endpoint ---
 
-        result = await item_collection.insert_many(items_to_store)
-        created_records = await item_collection.find({"_id": {"$in": result.inserted_ids}}).to_list(length=None)
-        return [ProcessedItemInDB(**fix_object_id(rec)) for rec in created_records]
+@router.post("/process", response_model=Union[List[ProcessedItemInDB], dict], status_code=201)
+async def process_data_and_store(
+    current_user: dict = Depends(get_current_user),
+    image: Optional[UploadFile] = File(None),
+    image_base64: Optional[str] = Form(None),
+    user_explanation: Optional[str] = Form(None),
+    async_job: bool = Query(False, description="Queue the work and return a job id to poll instead of waiting")
+):
+    user_id = current_user["email"]
 
+    if not image and not user_explanation:
+        raise HTTPException(
+            status_code=400,
+            detail="Please provide either an image or a text explanation to process."
+        )
+
+    try:
+        image_bytes, input_type = await read_process_input(image, image_base64, user_explanation)
+
+        if async_job:
+            if image_bytes is not None and len(image_bytes) > MAX_ASYNC_IMAGE_BYTES:
+                raise HTTPException(status_code=413, detail="Image is too large to queue for processing.")
+            job_id = await process_jobs.submit(user_id, {
+                "image": image_bytes,
+                "user_explanation": user_explanation,
+                "input_type": input_type,
+            })
+            return JSONResponse(status_code=202, content={
+                "job_id": job_id,
+                "status": "queued",
+                "status_url": f"/process/jobs/{job_id}",
+            })
+
+        result = await extract_and_store(user_id, image_bytes, user_explanation, input_type)
+        if FAST_JSON_ENABLED and isinstance(result, list):
+            # The items were built from the stored bill; skip re-validating them against the response model
+            return FastJSONResponse(status_code=201, content=result)
+        return result
+
+    except HTTPException:
+        raise
+    except ModelTimeoutError as e:
+        raise HTTPException(status_code=504, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"An unexpected error occurred: {str(e)}")
 
-@app.get("/")
+
+@router.post("/process/batch", response_model=BatchProcessResponse, status_code=201)
+async def process_batch(
+    current_user: dict = Depends(get_current_user),
+    images: Optional[List[UploadFile]] = File(None),
+    explanations: Optional[List[str]] = Form(None)
+):
+    """
+    Processes several receipt images and/or text explanations in one request.
+
+    Extractions run concurrently (at most BATCH_MAX_CONCURRENCY at a time) and
+    every resulting bill is stored with a single insert_many. Each input gets
+    its own entry in the results, in the order images then explanations were sent.
+    """
+    user_id = current_user["email"]
+    images = images or []
+    explanations = [text for text in explanations or [] if text and text.strip()]
+    if not images and not explanations:
+        raise HTTPException(status_code=400, detail="Please provide at least one image or text explanation to process.")
+    if len(images) + len(explanations) > BATCH_MAX_INPUTS:
+        raise HTTPException(status_code=413, detail=f"A batch can contain at most {BATCH_MAX_INPUTS} inputs.")
+
+    inputs = []
+    for image in images:
+        try:
+            inputs.append(await read_process_input(image, None, None) + (None,))
+        except HTTPException as e:
+            inputs.append(e)
+    inputs += [(None, "text", text) for text in explanations]
+
+    slots = asyncio.Semaphore(BATCH_MAX_CONCURRENCY)
+
+    async def run(entry):
+        if isinstance(entry, Exception):
+            raise entry
+        image_bytes, input_type, user_explanation = entry
+        async with slots:
+            return await extract_bill(user_id, image_bytes, user_explanation, input_type)
+
+    outcomes = await asyncio.gather(*(run(entry) for entry in inputs), return_exceptions=True)
+
+    results, bills_to_store, seen_bills = [], [], set()
+    for index, (entry, outcome) in enumerate(zip(inputs, outcomes)):
+        result = {"index": index, "input_type": None if isinstance(entry, Exception) else entry[1]}
+        if isinstance(outcome, BaseException):
+            result.update(status="error", error=str(getattr(outcome, "detail", outcome)))
+        else:
+            bill, response = outcome
+            if bill is not None and entry[0] is not None and bill["bill_hash"] in seen_bills:
+                # The same photo appears twice in this batch
+                result.update(status="duplicate", message="This bill appears more than once in the batch.")
+            elif bill is not None:
+                seen_bills.add(bill["bill_hash"])
+                result.update(status="created", _bill=len(bills_to_store))
+                bills_to_store.append(bill)
+            else:
+                result.update(
+                    status="duplicate" if response.get("duplicate") else "message",
+                    message=response.get("message"),
+                    items=response.get("items", []),
+                )
+        results.append(result)
+
+    created = await store_bills(bills_to_store) if bills_to_store else []
+    for result in results:
+        if "_bill" in result:
+            result["items"] = created[result.pop("_bill")]
+
+    return BatchProcessResponse(
+        results=results,
+        created_count=sum(len(items) for items in created),
+        error_count=sum(result["status"] == "error" for result in results),
+    )
+
+
+def save_upload(upload: UploadFile, max_bytes: int) -> str:
+    """Copies an upload to a temporary file 1 MB at a time, refusing it past max_bytes."""
+    fd, path = tempfile.mkstemp(suffix=os.path.splitext(upload.filename or "")[1])
+    size = 0
+    try:
+        with os.fdopen(fd, "wb") as f:
+            while chunk := upload.file.read(1024 * 1024):
+                size += len(chunk)
+                if size > max_bytes:
+                    raise HTTPException(status_code=413, detail="Recording is too large to process.")
+                f.write(chunk)
+    except BaseException:
+        os.remove(path)
+        raise
+    return path
+
+
+def remove_file(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+async def join_short_segments(segments, min_words):
+    pending = []
+    async for segment in segments:
+        pending.append(segment)
+        if sum(len(text.split()) for text in pending) >= min_words:
+            yield " ".join(pending)
+            pending = []
+    if pending:
+        yield " ".join(pending)
+
+
+@router.post("/process/audio")
+async def process_audio(
+    current_user: dict = Depends(get_current_user),
+    audio: UploadFile = File(...),
+    user_explanation: Optional[str] = Form(None)
+):
+    """
+    Transcribes a voice recording on the server and extracts expenses from it.
+
+    The response is NDJSON with one line per transcript segment, in order:
+    {"segment", "transcript", "items"} once that segment's bill is stored, or
+    "message"/"error" instead of "items". Segments are extracted while the
+    rest of the recording is still being transcribed.
+    """
+    user_id = current_user["email"]
+    if audio.content_type and not audio.content_type.startswith(("audio/", "video/", "application/octet-stream")):
+        raise HTTPException(status_code=400, detail="Uploaded file is not a valid audio type.")
+    if not get_speech_engine().available:
+        raise HTTPException(status_code=503, detail="Speech-to-text is not configured on the server.")
+
+    path = await asyncio.to_thread(save_upload, audio, MAX_AUDIO_BYTES)
+    slots = asyncio.Semaphore(AUDIO_EXTRACT_CONCURRENCY)
+    # Bounded, so a fast transcription waits for extraction instead of queueing without limit
+    queue = asyncio.Queue(maxsize=AUDIO_EXTRACT_CONCURRENCY * 2)
+
+    async def extract_segment(index, transcript):
+        result = {"segment": index, "transcript": transcript}
+        text = f"{transcript}\n{user_explanation}" if user_explanation else transcript
+        try:
+            async with slots:
+                bill, response = await extract_bill(user_id, None, text, "audio")
+                if bill is None:
+                    return dict(result, message=response.get("message"))
+                created, = await store_bills([bill])
+        except Exception as e:
+            return dict(result, error=str(e))
+        return dict(result, items=jsonable_encoder(created, by_alias=True))
+
+    # Every extraction started, so none outlives the response
+    tasks = []
+
+    async def produce():
+        try:
+            index = 0
+            async with aclosing(join_short_segments(transcribe(path), AUDIO_MIN_SEGMENT_WORDS)) as segments:
+                async for transcript in segments:
+                    task = asyncio.create_task(extract_segment(index, transcript))
+                    tasks.append(task)
+                    await queue.put(task)
+                    index += 1
+        except SpeechToTextError as e:
+            await queue.put({"error": str(e)})
+        except Exception as e:
+            await queue.put({"error": f"An unexpected error occurred: {e}"})
+        await queue.put(None)
+
+    async def results():
+        producer = asyncio.create_task(produce())
+        try:
+            while (item := await queue.get()) is not None:
+                result = await item if isinstance(item, asyncio.Task) else item
+                yield json.dumps(result) + "\n"
+        finally:
+            # Client gone or done: stop decoding (kills ffmpeg) and every extraction still running
+            producer.cancel()
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(producer, *tasks, return_exceptions=True)
+            remove_file(path)
+
+    # Also removes the upload when the body is never iterated (e.g. the client left before it started)
+    return StreamingResponse(results(), media_type="application/x-ndjson", background=BackgroundTask(remove_file, path))
+
+
+@router.get("/process/jobs/{job_id}", response_model=ProcessJobStatus)
+async def get_process_job(job_id: str, current_user: dict = Depends(get_current_user)):
+    """
+    Returns the status of an async /process job and, once it has succeeded,
+    the same result the synchronous endpoint would have returned.
+    """
+    job = await process_jobs.get(job_id, current_user["email"])
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found.")
+    return ProcessJobStatus(**fix_object_id(job))
+
+@router.get("/")
 def read_root(current_user: dict = Depends(get_current_user)):
     return {"message": "Data Processing Service is running. Use the /process/ endpoint."}
+
+
+STARTUP_HOOKS = [create_indexes, process_jobs.start]
+SHUTDOWN_HOOKS = [process_jobs.stop, shutdown_preprocess_pool, shutdown_speech_pool]
+
+# --- Standalone app (development); production serves this router from main.py ---
+app = create_app(
+    routers=[router],
+    startup=STARTUP_HOOKS,
+    shutdown=SHUTDOWN_HOOKS,
+    title="Data Processing Service",
+    description="Accepts text and/or an image, extracts item data with categories, and stores each item individually.",
+    version="1.4.2" # Updated version
+)
@@ -0,0 +1,172 @@
+import os
+import json
+import asyncio
+import datetime
+import hashlib
+from contextlib import aclosing
+from typing import Optional
+from cachetools import LRUCache
+from database import insight_collection
+from structured_log import get_logger
+
+# Generated insights per user, stored with a digest of the inputs they were
+# generated from (goal, financial details, spending rollups). An entry whose
+# digest no longer matches is stale: it is still served while a single
+# background refresh per user replaces it.
+INSIGHT_CACHE_SIZE = int(os.environ.get("INSIGHT_CACHE_SIZE", 1024))
+# Even unchanged inputs are re-analysed after this long, so the advice follows the calendar
+INSIGHT_MAX_AGE_SECONDS = int(os.environ.get("INSIGHT_MAX_AGE_SECONDS", 24 * 3600))
+
+_memory_cache = LRUCache(maxsize=INSIGHT_CACHE_SIZE)
+_refreshing = {}
+log = get_logger("insight_cache")
+
+
+def input_digest(*parts) -> str:
+    payload = json.dumps(parts, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def is_fresh(entry: dict, digest: str) -> bool:
+    age = datetime.datetime.utcnow() - entry["generated_at"]
+    return entry["digest"] == digest and age.total_seconds() < INSIGHT_MAX_AGE_SECONDS
+
+
+async def get(user_id: str) -> Optional[dict]:
+    # Memory first; Mongo makes entries shared between workers and restarts
+    entry = _memory_cache.get(user_id)
+    if entry is None:
+        entry = await insight_collection.find_one({"_id": user_id})
+        if entry is not None:
+            _memory_cache[user_id] = entry
+    return entry
+
+
+async def put(user_id: str, entry: dict):
+    _memory_cache[user_id] = entry
+    try:
+        await insight_collection.replace_one({"_id": user_id}, entry, upsert=True)
+    except Exception as e:
+        log.warning("insight cache write failed", extra={"user_id": user_id, "error": str(e)})
+
+
+# The model sometimes wraps its answer in a code fence
+FENCES = ("```json", "```")
+
+
+def clean(text: str) -> str:
+    for fence in FENCES:
+        text = text.replace(fence, "")
+    return text.strip()
+
+
+def visible_text(raw: str, final: bool = False) -> str:
+    """
+    The part of a partly streamed answer that can be shown: fences removed,
+    and a trailing "`", "``", "```js"... held back until the next chunk shows
+    whether it is a fence. Only grows as raw grows.
+    """
+    opening = FENCES[0]
+    for size in range(0 if final else min(len(opening), len(raw)), 0, -1):
+        if opening.startswith(raw[-size:]):
+            raw = raw[:-size]
+            break
+    for fence in FENCES:
+        raw = raw.replace(fence, "")
+    return raw
+
+
+class Refresh:
+    """
+    One regeneration of a user's insights. The model's chunks are collected in
+    `text` as they arrive, so a streaming request can follow a refresh started
+    by another request; `task` resolves to the new cache entry.
+
+    Requests waiting on the refresh follow() it and unfollow() when they end;
+    when the last one leaves early the model call is cancelled, unless the
+    refresh was started in the background to replace a stale entry.
+    """
+
+    def __init__(self):
+        self.text = ""
+        self.task = None
+        self.followers = 0
+        self.background = False
+        self.abandoned = False
+        self._updated = asyncio.Event()
+
+    def follow(self):
+        self.followers += 1
+
+    def unfollow(self):
+        self.followers -= 1
+        if self.followers <= 0 and not self.background and not self.task.done():
+            self.abandoned = True
+            self.task.cancel()
+
+    def _append(self, chunk: str):
+        self.text += chunk
+        self._notify()
+
+    def _notify(self, *_):
+        self._updated.set()
+        self._updated = asyncio.Event()
+
+    async def wait(self, seen: int, timeout: float):
+        """Returns once text is longer than `seen` characters, the refresh ended, or after timeout seconds."""
+        if len(self.text) > seen or self.task.done():
+            return
+        try:
+            await asyncio.wait_for(self._updated.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+
+async def _regenerate(user_id: str, digest: str, generate, refresh: Refresh) -> dict:
+    async with aclosing(generate()) as chunks:
+        async for chunk in chunks:
+            refresh._append(chunk)
+    entry = {
+        "_id": user_id,
+        "digest": digest,
+        "insights": clean(refresh.text),
+        "generated_at": datetime.datetime.utcnow(),
+    }
+    await put(user_id, entry)
+    return entry
+
+
+def refresh(user_id: str, digest: str, generate) -> Refresh:
+    """
+    Starts regenerating a user's insights, or joins the refresh already running
+    for the same inputs, so concurrent requests make one model call. generate()
+    is an async iterator of text chunks.
+    """
+    key = (user_id, digest)
+    current = _refreshing.get(key)
+    if current is None or current.abandoned:
+        current = Refresh()
+        current.task = asyncio.create_task(_regenerate(user_id, digest, generate, current))
+        current.task.add_done_callback(current._notify)
+        current.task.add_done_callback(lambda _, done=current: _forget(key, done))
+        _refreshing[key] = current
+    return current
+
+
+def _forget(key, done: Refresh):
+    # A cancelled refresh may already have been replaced by a new one
+    if _refreshing.get(key) is done:
+        del _refreshing[key]
+
+
+def _log_failure(user_id: str, task: asyncio.Task):
+    if not task.cancelled() and task.exception() is not None:
+        log.warning("insight refresh failed", extra={"user_id": user_id, "error": str(task.exception())})
+
+
+def refresh_in_background(user_id: str, digest: str, generate) -> Refresh:
+    """Like refresh(), but the refresh runs to completion even with nobody following it."""
+    current = refresh(user_id, digest, generate)
+    current.background = True
+    current.task.add_done_callback(lambda t: _log_failure(user_id, t))
+    return current
@@ -1,46 +1,53 @@
 # insights.py
 import os
+import time
+import asyncio
+import base64
 import datetime
 import json
-from fastapi import Depends, FastAPI, APIRouter, HTTPException, Path
-from typing import List
-import google.generativeai as genai
+from fastapi import Depends, APIRouter, HTTPException, Path, Query, Request, Response, UploadFile, File, Form
+from fastapi.responses import StreamingResponse
+from typing import List, Optional
 from dotenv import load_dotenv
-from models import FinancialGoal, GoalInDB, ExpenseItem, InsightResponse
+from models import FinancialGoal, GoalInDB, ExpenseItem, InsightResponse, ExpenseSummary, MonthlyRollup, ExpenseBulkRequest, ExpenseBulkResponse, ExpenseAlert, SpendingForecast, FamilyOverview, ExpenseImportResponse
 from auth_utils import get_current_user
-from database import item_collection, users_collection
-from fastapi.middleware.cors import CORSMiddleware
+from database import bills_collection, users_collection
+from service import create_app, create_indexes
+from bills import item_row_stages, flatten_bill, update_item, delete_item, bulk_edit_items
+from rollups import record_bill_change, record_bill_changes, get_monthly_rollups
+from alerts import get_alerts, dismiss_alert
+from forecast import forecast_user
+import family
+import fast_json
+from fast_json import FAST_JSON_ENABLED, FastJSONResponse
+from expense_io import export_chunks, import_file, check_format, format_from_filename, ExpenseFormatError, EXPORT_FORMATS, MEDIA_TYPES
 from fastapi import APIRouter, HTTPException, Path, Body
 from bson import ObjectId
+from bson.errors import InvalidId
+from model_backends import get_insight_backend, ModelTimeoutError
+import insight_cache
+from metrics import histogram
+from structured_log import get_logger
 
 # Load environment variables from .env file
 load_dotenv()
 
 # --- Configuration ---
-GOOGLE_API_KEY = os.environ.get("GOOGLE_API_KEY")
-
-# --- Initialize FastAPI Router ---
-app = FastAPI()
-
-# ✅ Add CORS middleware here
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],  # or ["*"] for all origins
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
+EXPENSES_PAGE_MAX = 1000
+EXPENSES_BULK_MAX = 1000
+ALERTS_PAGE_MAX = 200
+# How often a streaming insights request that is waiting on the model checks for a disconnected client
+INSIGHT_STREAM_POLL_SECONDS = 1.0
 
+log = get_logger("insights")
 
+# --- Router ---
+router = APIRouter()
 
-# --- Configure Gemini API ---
-if GOOGLE_API_KEY:
-    try:
-        genai.configure(api_key=GOOGLE_API_KEY)
-    except Exception as e:
-        print(f"Error configuring Gemini API: {e}")
-else:
-    print("GOOGLE_API_KEY not found. Insights endpoint will not work.")
+# The /expenses pagination cursor is read by the browser from a response header
+EXPOSE_HEADERS = ["X-Next-Cursor"]
+STARTUP_HOOKS = [create_indexes]
+SHUTDOWN_HOOKS = []
 
 
 # --- Helper Function ---
@@ -49,6 +56,99 @@ def fix_object_id(doc):
         doc["_id"] = str(doc["_id"])
     return doc
 
+def to_expense(doc):
+    """Maps an item row onto the ExpenseItem shape without mutating it."""
+    expense = {key: doc.get(key) for key in ExpenseItem.model_fields if key not in ("id", "bill_id")}
+    expense["id"] = str(doc["_id"])
+    expense["bill_id"] = str(doc["bill_id"]) if doc.get("bill_id") else None
+    return expense
+
+def encode_cursor(doc):
+    """Opaque keyset cursor for the (created_at, bill _id, item _id) row order."""
+    # Bills written before created_at existed sort by the time in their _id
+    created_at = doc.get("created_at") or doc["bill_id"].generation_time.replace(tzinfo=None)
+    raw = f"{created_at.isoformat()}|{doc['bill_id']}|{doc['_id']}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+def decode_cursor(cursor):
+    try:
+        created_at, bill_id, item_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.datetime.fromisoformat(created_at), ObjectId(bill_id), ObjectId(item_id)
+    except (ValueError, InvalidId):
+        raise HTTPException(status_code=400, detail="Invalid pagination cursor.")
+
+def build_expenses_pipeline(user_id, after=None, limit=None):
+    """
+    Builds the pipeline listing a user's items oldest first, in (created_at,
+    bill _id, item _id) order. Rows are sorted and compared on the unwound item
+    _id, so the order of a bill's items array (edits, bulk updates, re-inserted
+    items) never skips or repeats a row between pages. Bills without created_at
+    use the creation time in their _id.
+    """
+    match = {"user_id": user_id}
+    if after:
+        created_at, bill_id, item_id = after
+        # Narrows the bills on the user_created_at index; the exact cut is on the rows below
+        match["$or"] = [{"created_at": {"$gte": created_at}}, {"created_at": None}]
+    pipeline = [{"$match": match}] + item_row_stages() + [
+        {"$set": {"created_at": {"$ifNull": ["$created_at", {"$toDate": "$bill_id"}]}}},
+    ]
+    if after:
+        pipeline.append({"$match": {"$or": [
+            {"created_at": {"$gt": created_at}},
+            {"created_at": created_at, "bill_id": {"$gt": bill_id}},
+            {"created_at": created_at, "bill_id": bill_id, "_id": {"$gt": item_id}},
+        ]}})
+    pipeline.append({"$sort": {"created_at": 1, "bill_id": 1, "_id": 1}})
+    if limit:
+        pipeline.append({"$limit": limit})
+    return pipeline
+
+def _numeric(field):
+    # Edited rows may hold numbers as strings; treat anything unparsable as 0
+    return {"$convert": {"input": f"${field}", "to": "double", "onError": 0, "onNull": 0}}
+
+def build_summary_pipeline(user_id, start_date=None, end_date=None, category=None):
+    """
+    Builds the aggregation pipeline that rolls a user's bill items up into
+    daily, monthly and per-category totals (cost = quantity * unit_price).
+    """
+    match = {"user_id": user_id}
+    if start_date or end_date:
+        match["bill_date"] = {}
+        if start_date:
+            match["bill_date"]["$gte"] = start_date
+        if end_date:
+            match["bill_date"]["$lte"] = end_date
+    item_match = {"items.unit_price": {"$ne": None}}
+    if category:
+        match["items.category"] = category
+        item_match["items.category"] = category
+
+    def totals(key, sort):
+        return [
+            {"$group": {"_id": key, "total": {"$sum": "$cost"}, "count": {"$sum": 1}}},
+            {"$sort": sort},
+        ]
+
+    return [
+        {"$match": match},
+        {"$unwind": "$items"},
+        {"$match": item_match},
+        {"$project": {
+            "_id": 0,
+            "bill_date": 1,
+            "category": "$items.category",
+            "cost": {"$multiply": [_numeric("items.quantity"), _numeric("items.unit_price")]},
+        }},
+        {"$facet": {
+            "daily": totals("$bill_date", {"_id": 1}),
+            "monthly": totals({"$substrBytes": [{"$ifNull": ["$bill_date", ""]}, 0, 7]}, {"_id": 1}),
+            "by_category": totals("$category", {"total": -1}),
+            "overall": totals(None, {"_id": 1}),
+        }},
+    ]
+
 # # --- Endpoint 1: Set Financial Goal ---
 # @app.post("/goals", response_model=GoalInDB, status_code=201)
 # async def set_financial_goal(goal: FinancialGoal, current_user: dict = Depends(get_current_user)):
@@ -72,56 +172,165 @@ def fix_object_id(doc):
 
 
 # --- Endpoint 2: Get User Expenses ---
-@app.get("/expenses", response_model=List[ExpenseItem])
-async def get_user_expenses(current_user: dict = Depends(get_current_user)):
+@router.get("/expenses", response_model=List[ExpenseItem])
+async def get_user_expenses(
+    response: Response,
+    limit: int = Query(EXPENSES_PAGE_MAX, ge=1, le=EXPENSES_PAGE_MAX, description="Page size"),
+    after: Optional[str] = Query(None, description="Cursor from the X-Next-Cursor header of the previous page"),
+    stream: bool = Query(False, description="Stream the full history as NDJSON instead of one page"),
+    current_user: dict = Depends(get_current_user)
+):
     """
-    Fetches all the bill items (expenses) from the database for a specific user.
+    Fetches the bill items (expenses) for a specific user, oldest first.
+
+    Pages are keyed on (created_at, bill, item); when more items remain, the cursor for
+    the next page is returned in the X-Next-Cursor header. With stream=true the
+    whole history (after the optional cursor) is sent as newline-delimited JSON
+    straight from the database cursor.
     """
     user_id = current_user["email"]
-    expenses_cursor = item_collection.find({"user_id": user_id})
-    expenses = await expenses_cursor.to_list(length=1000)
+    pipeline = build_expenses_pipeline(user_id, decode_cursor(after) if after else None)
+
+    if stream:
+        async def ndjson():
+            async for doc in bills_collection.aggregate(pipeline, batchSize=EXPENSES_PAGE_MAX, allowDiskUse=True):
+                # Numbers are coerced the same way with or without FAST_JSON
+                item = fast_json.expense_item(doc)
+                if FAST_JSON_ENABLED:
+                    yield fast_json.dumps(item) + b"\n"
+                else:
+                    yield json.dumps(item) + "\n"
+
+        return StreamingResponse(ndjson(), media_type="application/x-ndjson")
+
+    pipeline.append({"$limit": limit})
+    expenses = await bills_collection.aggregate(pipeline).to_list(length=limit)
+    if len(expenses) == limit:
+        response.headers["X-Next-Cursor"] = encode_cursor(expenses[-1])
+
+    if FAST_JSON_ENABLED:
+        # Rows come from our own pipeline; skip validating them against List[ExpenseItem]
+        return FastJSONResponse([fast_json.expense_item(doc) for doc in expenses], headers=dict(response.headers))
+    return [to_expense(doc) for doc in expenses]
+
+# --- Endpoint 2a: Export / Import the Full History ---
+@router.get("/expenses/export")
+async def export_expenses(
+    format: str = Query("csv", description=f"One of {', '.join(EXPORT_FORMATS)}"),
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Downloads the user's whole expense history, oldest first, as CSV, Parquet
+    or an Arrow stream. Rows are written in chunks straight from the database
+    cursor, so any history size streams in bounded memory.
+    """
+    try:
+        check_format(format)
+    except ExpenseFormatError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    filename = f"expenses-{datetime.date.today().isoformat()}.{format}"
+    return StreamingResponse(
+        export_chunks(current_user["email"], format),
+        media_type=MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
 
-    if not expenses:
-        return []
+@router.post("/expenses/import", response_model=ExpenseImportResponse, status_code=201)
+async def import_expenses(
+    file: UploadFile = File(..., description="A file in the /expenses/export columns"),
+    format: Optional[str] = Form(None, description="csv, parquet or arrow; taken from the file name if omitted"),
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Adds the rows of an exported (or hand-made) file to the user's history.
+    Rows are validated and inserted in batches; invalid rows are skipped and
+    reported, and bills imported before are not stored again.
+    """
+    try:
+        return await import_file(current_user["email"], file.file, format or format_from_filename(file.filename))
+    except ExpenseFormatError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+# --- Endpoint 2b: Get Aggregated Expense Summary ---
+@router.get("/expenses/summary", response_model=ExpenseSummary)
+async def get_expense_summary(
+    start_date: Optional[str] = Query(None, pattern=r"^\d{4}-\d{2}-\d{2}$", description="Inclusive start date (YYYY-MM-DD)"),
+    end_date: Optional[str] = Query(None, pattern=r"^\d{4}-\d{2}-\d{2}$", description="Inclusive end date (YYYY-MM-DD)"),
+    category: Optional[str] = Query(None, description="Only include items of this category"),
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Returns daily, monthly and per-category spending totals for the user,
+    computed in MongoDB instead of shipping every bill item to the client.
+    """
+    user_id = current_user["email"]
+    pipeline = build_summary_pipeline(user_id, start_date, end_date, category)
+    result = await bills_collection.aggregate(pipeline).to_list(length=1)
+    facets = result[0] if result else {}
+    overall = facets.get("overall") or [{"total": 0.0, "count": 0}]
 
-    for expense in expenses:
-        expense["id"] = str(expense["_id"])
-        del expense["_id"]
+    return ExpenseSummary(
+        user_id=user_id,
+        start_date=start_date,
+        end_date=end_date,
+        category=category,
+        total=overall[0]["total"],
+        count=overall[0]["count"],
+        daily=[{"day": row["_id"], "total": row["total"], "count": row["count"]}
+               for row in facets.get("daily", []) if row["_id"]],
+        monthly=[{"month": row["_id"], "total": row["total"], "count": row["count"]}
+                 for row in facets.get("monthly", []) if row["_id"]],
+        by_category=[{"category": row["_id"], "total": row["total"], "count": row["count"]}
+                     for row in facets.get("by_category", [])],
+    )
 
-    return expenses
+# --- Endpoint 2c: Get Monthly Totals ---
+@router.get("/expenses/monthly", response_model=List[MonthlyRollup])
+async def get_monthly_totals(
+    month: Optional[str] = Query(None, pattern=r"^\d{4}-\d{2}$", description="Only this month (YYYY-MM)"),
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Returns per-month totals with a per-category breakdown, read from the
+    pre-aggregated rollups rather than recomputed from the user's bills.
+    """
+    months = {}
+    for row in await get_monthly_rollups(current_user["email"], month):
+        entry = months.setdefault(row["month"], {"month": row["month"], "total": 0.0, "count": 0, "by_category": []})
+        entry["total"] += row["total"]
+        entry["count"] += row["count"]
+        entry["by_category"].append({"category": row.get("category"), "total": row["total"], "count": row["count"]})
+    return list(months.values())
 
 # --- Endpoint 3: Update expenses ---
-@app.put("/expenses/{expense_id}")
+@router.put("/expenses/{expense_id}")
 async def update_expense(
     expense_id: str = Path(..., description="The ID of the expense to update"),
     update_data: dict = Body(...),
     current_user: dict = Depends(get_current_user)
 ):
     """
-    Updates an existing expense in MongoDB based on _id (ObjectId or string fallback).
+    Updates one expense item. Item fields are changed on that item only; store
+    and date belong to the bill and are changed for all of its items.
     """
-    # Sanitize incoming fields
-    update_data.pop('id', None)
-    update_data.pop('_id', None)
-
-    query = {"_id": ObjectId(expense_id)} if ObjectId.is_valid(expense_id) else {"id": expense_id}
-
-    result = await item_collection.update_one(query, {"$set": update_data})
+    if not ObjectId.is_valid(expense_id):
+        raise HTTPException(status_code=404, detail="Expense not found.")
+    item_id = ObjectId(expense_id)
 
-    if result.matched_count == 0:
+    before, updated = await update_item(current_user["email"], item_id, update_data)
+    if updated is None:
         raise HTTPException(status_code=404, detail="Expense not found.")
 
-    updated = await item_collection.find_one(query)
-    if updated:
-        updated["id"] = str(updated["_id"])
-        del updated["_id"]
-        return updated
-    else:
-        raise HTTPException(status_code=404, detail="Updated expense not found.")
+    await record_bill_change(current_user["email"], before, updated)
+
+    row = flatten_bill(updated, item_id)[0]
+    row["id"] = str(row.pop("_id"))
+    row["bill_id"] = str(row["bill_id"])
+    return row
 
 
 # --- Endpoint 4: Delete User Expenses ---
-@app.delete("/expenses/{expense_id}")
+@router.delete("/expenses/{expense_id}")
 async def delete_expense(
     expense_id: str = Path(..., description="The ID of the expense to delete"),
     current_user: dict = Depends(get_current_user)
@@ -129,70 +338,290 @@ async def delete_expense(
     if not ObjectId.is_valid(expense_id):
         raise HTTPException(status_code=400, detail="Invalid expense ID format (must be 24 hex characters).")
 
-    result = await item_collection.delete_one({"_id": ObjectId(expense_id)})
+    item_id = ObjectId(expense_id)
+    deleted_from = await delete_item(current_user["email"], item_id)
 
-    if result.deleted_count == 0:
+    if deleted_from is None:
         raise HTTPException(status_code=404, detail="Expense not found with this ID.")
 
+    remaining = dict(deleted_from, items=[item for item in deleted_from["items"] if item["_id"] != item_id])
+    await record_bill_change(current_user["email"], deleted_from, remaining)
+
     return {"message": "Expense deleted successfully", "id": expense_id}
 
-# --- Endpoint 5: Get Financial Insights ---
-@app.get("/insights", response_model=InsightResponse)
-async def get_financial_insights(current_user: dict = Depends(get_current_user)):
+# --- Endpoint 4b: Bulk Update/Delete Expenses ---
+@router.post("/expenses/bulk", response_model=ExpenseBulkResponse)
+async def bulk_edit_expenses(
+    request: ExpenseBulkRequest,
+    current_user: dict = Depends(get_current_user)
+):
     """
-    Fetches the user's goal and expenses, then uses Gemini to generate insights.
+    Applies many expense updates and deletes in one database write, instead of
+    one PUT/DELETE round trip per row. Returns the rows that were updated
+    (edits without an editable field are left out), the deleted ids and the
+    ids that do not exist for this user.
     """
-    user_id=current_user["email"]
+    if len(request.operations) > EXPENSES_BULK_MAX:
+        raise HTTPException(status_code=413, detail=f"At most {EXPENSES_BULK_MAX} operations per request.")
+
+    updates, deletes, invalid = {}, [], []
+    for operation in request.operations:
+        if not ObjectId.is_valid(operation.id):
+            invalid.append(operation.id)
+        elif operation.op == "delete":
+            deletes.append(ObjectId(operation.id))
+        else:
+            # Several updates of one item merge, later fields winning
+            updates.setdefault(ObjectId(operation.id), {}).update(operation.data)
 
-    if not GOOGLE_API_KEY:
-        raise HTTPException(status_code=503, detail="AI Service is not configured on the server.")
+    user_id = current_user["email"]
+    changes, updated, deleted, not_found = await bulk_edit_items(user_id, updates, deletes)
+    await record_bill_changes(user_id, changes.values())
+
+    after_rows = {
+        row["_id"]: row
+        for _, after in changes.values() if after is not None
+        for row in flatten_bill(after)
+    }
+    return ExpenseBulkResponse(
+        updated=[to_expense(after_rows[item_id]) for item_id in updated],
+        deleted=[str(item_id) for item_id in deleted],
+        not_found=invalid + [str(item_id) for item_id in not_found],
+    )
 
-    # 1. Fetch the user's most recent goal
-    user = await users_collection.find_one({"email": user_id})
-    current_details = user['financialDetails']
-    goal = user['financialGoals']
-    if not goal:
-        raise HTTPException(status_code=404, detail=f"No financial goal found for user {user_id} for the current month. Please set a goal first.")
+# --- Endpoint 4c: Suspicious Expense Alerts ---
+@router.get("/alerts", response_model=List[ExpenseAlert])
+async def list_alerts(
+    include_dismissed: bool = Query(False, description="Also return alerts the user has dismissed"),
+    limit: int = Query(50, ge=1, le=ALERTS_PAGE_MAX),
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Returns the newest suspicious-expense alerts (unusually high amounts or
+    unit prices, bill spikes at a store, possible duplicate charges). They are
+    scored when bills are stored, so this is a single indexed read.
+    """
+    alerts = await get_alerts(current_user["email"], include_dismissed, limit)
+    for alert in alerts:
+        for field in ("_id", "bill_id", "item_id"):
+            if alert.get(field) is not None:
+                alert[field] = str(alert[field])
+    return alerts
+
+@router.post("/alerts/{alert_id}/dismiss")
+async def dismiss_expense_alert(
+    alert_id: str = Path(..., description="The ID of the alert to dismiss"),
+    current_user: dict = Depends(get_current_user)
+):
+    if not ObjectId.is_valid(alert_id) or not await dismiss_alert(current_user["email"], ObjectId(alert_id)):
+        raise HTTPException(status_code=404, detail="Alert not found.")
+    return {"message": "Alert dismissed", "id": alert_id}
 
-    # 2. Fetch all user expenses
-    expenses_cursor = item_collection.find({"user_id": user_id})
-    expenses = await expenses_cursor.to_list(length=1000)
-
-    # 3. Create a prompt for Gemini
-    # Convert expenses to a more readable format for the AI
-    if expenses:
-        expenses_summary = json.dumps([
-            {
-                "item": doc.get("item_name"),
-                "category": doc.get("category"),
-                "cost": doc.get("quantity", 1) * doc.get("unit_price", 0)
-            }
-            for doc in expenses if doc.get("quantity") is not None and doc.get("unit_price") is not None
-        ], indent=2)
-        expenses = expenses_summary
-
-    prompt = f"""
+# --- Endpoint 4d: Month-End Spending Forecast ---
+@router.get("/forecast", response_model=SpendingForecast)
+async def get_spending_forecast(current_user: dict = Depends(get_current_user)):
+    """
+    Projects this month's spending per category from the current pace and the
+    user's recent history, against their monthly income and pension: whether
+    they are on track and how much is left to spend per day.
+    """
+    return await forecast_user(current_user)
+
+# --- Endpoint 4e: Family Overview ---
+@router.get("/family/overview", response_model=FamilyOverview)
+async def get_family_overview(current_user: dict = Depends(get_current_user)):
+    """
+    Spending forecast and open alerts of every family member who granted the
+    caller access (see /family/grants), fetched together rather than one
+    member at a time. Cached briefly per caller.
+    """
+    return await family.get_overview(current_user["email"])
+
+# --- Endpoint 5: Get Financial Insights ---
+INSIGHT_PROMPT_MONTHS = int(os.environ.get("INSIGHT_PROMPT_MONTHS", 3))
+
+
+def summarize_rollups(rollups):
+    """
+    Compact per-month, per-category spending lines for the prompt, built from
+    the pre-aggregated rollups of the most recent INSIGHT_PROMPT_MONTHS months.
+    """
+    months = {}
+    for row in rollups:
+        months.setdefault(row["month"] or "undated", []).append(row)
+    lines = []
+    for month in sorted(months)[-INSIGHT_PROMPT_MONTHS:]:
+        rows = sorted(months[month], key=lambda row: row["total"], reverse=True)
+        categories = ", ".join(f"{row.get('category') or 'Other'} {row['total']:.2f} ({row['count']} items)" for row in rows)
+        lines.append(f"{month}: total {sum(row['total'] for row in rows):.2f}; {categories}")
+    return "\n".join(lines) or "No expenses recorded yet."
+
+
+def build_insight_prompt(goal, current_details, spending):
+    return f"""
     Analyze the following financial data for a user.
 
     User's Goal: "{goal}"
     User's Current Financial Condition: "{current_details}"
 
-    User's Spending History for this month:
-    {expenses}
+    User's Spending by month and category (most recent last):
+    {spending}
 
     Based on their spending and current financial condition, provide actionable, personalized insights and tips on how they can achieve their goal. Structure your response with clear headings. Focus on identifying spending patterns, suggesting specific areas for savings, and offering encouragement. Maximum 5 insights. 30 words max each. In bullet points.
     """
 
-    # 4. Call Gemini
-    try:
-        model = genai.GenerativeModel("gemini-1.5-flash")
-        response = await model.generate_content_async(prompt)
-        cleaned_insights = response.text.replace("```json", "").replace("```", "").strip()
-        print(cleaned_insights)
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"An error occurred while generating insights: {e}")
+
+async def load_insight_inputs(current_user):
+    """Returns (backend, goal, financial details, spending summary, cache digest) for a user."""
+    user_id=current_user["email"]
+
+    insight_backend = get_insight_backend()
+    if not insight_backend.available:
+        raise HTTPException(status_code=503, detail="AI Service is not configured on the server.")
+
+    # The user's goal and details come with the authenticated user document
+    current_details = current_user.get('financialDetails')
+    goal = current_user.get('financialGoals')
+    if not goal:
+        raise HTTPException(status_code=404, detail=f"No financial goal found for user {user_id} for the current month. Please set a goal first.")
+
+    # Spending comes from the monthly rollups: one indexed read, independent of history length
+    spending = summarize_rollups(await get_monthly_rollups(user_id))
+    digest = insight_cache.input_digest(goal, current_details, spending)
+    return insight_backend, goal, current_details, spending, digest
+
+
+@router.get("/insights", response_model=InsightResponse)
+async def get_financial_insights(current_user: dict = Depends(get_current_user)):
+    """
+    Returns cached insights for the user's goal and spending. They are only
+    regenerated when the goal, financial details or expenses change; until
+    the new ones are ready the previous insights are returned marked stale.
+    """
+    user_id=current_user["email"]
+    insight_backend, goal, current_details, spending, digest = await load_insight_inputs(current_user)
+
+    async def generate():
+        yield await insight_backend.generate_insights(build_insight_prompt(goal, current_details, spending))
+
+    # Serve from cache; a stale entry is returned at once while it is refreshed
+    entry = await insight_cache.get(user_id)
+    stale = entry is not None and not insight_cache.is_fresh(entry, digest)
+    if stale:
+        insight_cache.refresh_in_background(user_id, digest, generate)
+    elif entry is None:
+        # Shielded so a client that gives up does not cancel the refresh other requests
+        # share; the last follower to leave cancels it instead
+        refresh = insight_cache.refresh(user_id, digest, generate)
+        refresh.follow()
+        try:
+            entry = await asyncio.shield(refresh.task)
+        except ModelTimeoutError as e:
+            raise HTTPException(status_code=504, detail=str(e))
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"An error occurred while generating insights: {e}")
+        finally:
+            refresh.unfollow()
 
     return InsightResponse(
         user_id=user_id,
-        insights=cleaned_insights
+        insights=entry["insights"],
+        generated_at=entry["generated_at"],
+        stale=stale
     )
+
+# --- Endpoint 5b: Stream Financial Insights ---
+insight_stream_first_byte_seconds = histogram(
+    "insight_stream_first_byte_seconds", "Time from request to the first insight chunk sent over SSE"
+)
+
+
+def sse_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+@router.get("/insights/stream")
+async def stream_financial_insights(request: Request, current_user: dict = Depends(get_current_user)):
+    """
+    Server-Sent Events variant of /insights: "chunk" events carry text as the
+    model produces it, then one "done" (or "error") event ends the stream.
+    Fresh cached insights are sent as a single chunk. Stale ones are sent at
+    once too, followed by a "replace" event with the refreshed insights.
+
+    Every request for the same inputs follows one shared generation, which
+    fills the cache when it completes. When the last client following it goes
+    away, the model call is cancelled.
+    """
+    started = time.perf_counter()
+    user_id=current_user["email"]
+    insight_backend, goal, current_details, spending, digest = await load_insight_inputs(current_user)
+    entry = await insight_cache.get(user_id)
+
+    def generate():
+        return insight_backend.stream_insights(build_insight_prompt(goal, current_details, spending))
+
+    async def events():
+        if entry is not None and insight_cache.is_fresh(entry, digest):
+            insight_stream_first_byte_seconds.labels(source="cache").observe(time.perf_counter() - started)
+            yield sse_event("chunk", {"text": entry["insights"]})
+            yield sse_event("done", {"generated_at": entry["generated_at"], "cached": True})
+            return
+
+        if entry is not None:
+            insight_stream_first_byte_seconds.labels(source="stale").observe(time.perf_counter() - started)
+            yield sse_event("chunk", {"text": entry["insights"]})
+
+        refresh = insight_cache.refresh(user_id, digest, generate)
+        refresh.follow()
+        try:
+            sent = ""
+            while True:
+                finished = refresh.task.done()
+                if entry is None:
+                    # Fences are stripped from the whole text so far, never chunk by chunk
+                    text = insight_cache.visible_text(refresh.text, final=finished)
+                    if len(text) > len(sent):
+                        if not sent:
+                            insight_stream_first_byte_seconds.labels(source="model").observe(time.perf_counter() - started)
+                        yield sse_event("chunk", {"text": text[len(sent):]})
+                        sent = text
+                if finished:
+                    break
+                await refresh.wait(len(refresh.text), INSIGHT_STREAM_POLL_SECONDS)
+                if await request.is_disconnected():
+                    log.info("insight stream closed: client disconnected", extra={"user_id": user_id})
+                    return
+        finally:
+            # Also runs when the response is cancelled; the last follower cancels the model call
+            refresh.unfollow()
+
+        try:
+            fresh = refresh.task.result()
+        except Exception as e:
+            if entry is not None:
+                # The stale insights already sent stay on screen
+                yield sse_event("done", {"generated_at": entry["generated_at"], "cached": True, "stale": True})
+            elif isinstance(e, ModelTimeoutError):
+                yield sse_event("error", {"status": 504, "detail": str(e)})
+            else:
+                yield sse_event("error", {"status": 500, "detail": f"An error occurred while generating insights: {e}"})
+            return
+
+        if entry is not None:
+            yield sse_event("replace", {"text": fresh["insights"]})
+        yield sse_event("done", {"generated_at": fresh["generated_at"], "cached": False})
+
+    # no-transform/X-Accel-Buffering keep proxies from holding chunks back
+    return StreamingResponse(events(), media_type="text/event-stream", headers={
+        "Cache-Control": "no-cache, no-transform",
+        "X-Accel-Buffering": "no",
+    })
+
+
+# --- Standalone app (development); production serves this router from main.py ---
+app = create_app(
+    routers=[router],
+    startup=STARTUP_HOOKS,
+    shutdown=SHUTDOWN_HOOKS,
+    expose_headers=EXPOSE_HEADERS,
+)
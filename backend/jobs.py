@@ -0,0 +1,136 @@
+import os
+import asyncio
+import datetime
+from bson import ObjectId
+from pymongo import ReturnDocument
+from model_backends import ModelBackendError
+from structured_log import get_logger
+
+# --- Configuration ---
+PROCESS_JOB_WORKERS = int(os.environ.get("PROCESS_JOB_WORKERS", 4))
+PROCESS_JOB_MAX_ATTEMPTS = int(os.environ.get("PROCESS_JOB_MAX_ATTEMPTS", 3))
+PROCESS_JOB_BACKOFF_SECONDS = float(os.environ.get("PROCESS_JOB_BACKOFF_SECONDS", 2.0))
+# A job left "running" longer than this (its worker died, or its result could not be
+# written) is claimed again by the next free worker
+PROCESS_JOB_LEASE_SECONDS = float(os.environ.get("PROCESS_JOB_LEASE_SECONDS", 300))
+PROCESS_JOB_POLL_SECONDS = float(os.environ.get("PROCESS_JOB_POLL_SECONDS", 1.0))
+
+log = get_logger("jobs")
+
+
+class JobQueue:
+    """
+    Mongo-backed job queue worked by a fixed number of asyncio tasks.
+
+    Jobs are claimed with an atomic find_one_and_update, so several worker
+    processes can share one collection. Failures listed in retry_on are retried
+    with exponential backoff up to max_attempts; anything else fails the job.
+    """
+
+    def __init__(self, collection, handler, workers=PROCESS_JOB_WORKERS,
+                 max_attempts=PROCESS_JOB_MAX_ATTEMPTS, retry_on=(ModelBackendError,)):
+        self.collection = collection
+        self.handler = handler
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.retry_on = retry_on
+        self._tasks = []
+        self._wakeup = asyncio.Event()
+
+    async def submit(self, user_id: str, payload: dict) -> str:
+        now = datetime.datetime.utcnow()
+        job = {
+            "user_id": user_id,
+            "status": "queued",
+            "attempts": 0,
+            "run_at": now,
+            "created_at": now,
+            "updated_at": now,
+            **payload,
+        }
+        result = await self.collection.insert_one(job)
+        self._wakeup.set()
+        return str(result.inserted_id)
+
+    async def get(self, job_id: str, user_id: str):
+        if not ObjectId.is_valid(job_id):
+            return None
+        # The uploaded image can be large and is of no use to a status poller
+        return await self.collection.find_one({"_id": ObjectId(job_id), "user_id": user_id}, {"image": 0})
+
+    async def start(self):
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _claim(self):
+        now = datetime.datetime.utcnow()
+        stale = now - datetime.timedelta(seconds=PROCESS_JOB_LEASE_SECONDS)
+        return await self.collection.find_one_and_update(
+            # Due jobs, and running jobs whose lease expired
+            {"$or": [
+                {"status": "queued", "run_at": {"$lte": now}},
+                {"status": "running", "locked_at": {"$lt": stale}},
+            ]},
+            {"$set": {"status": "running", "locked_at": now, "updated_at": now}, "$inc": {"attempts": 1}},
+            sort=[("run_at", 1)],
+            return_document=ReturnDocument.AFTER,
+        )
+
+    async def _worker(self):
+        while True:
+            try:
+                # Clear before claiming so a submit() racing with an empty claim still wakes us
+                self._wakeup.clear()
+                job = await self._claim()
+            except Exception as e:
+                log.warning("claiming job failed", extra={"error": str(e)})
+                job = None
+            if job is None:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), PROCESS_JOB_POLL_SECONDS)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            await self._run(job)
+
+    async def _run(self, job):
+        if job["attempts"] > self.max_attempts:
+            # Every attempt so far lost its lease; do not start another
+            await self.collection.update_one({"_id": job["_id"]}, self._finished("failed", error="Job lease expired"))
+            return
+        try:
+            result = await self.handler(job)
+        except self.retry_on as e:
+            if job["attempts"] < self.max_attempts:
+                now = datetime.datetime.utcnow()
+                delay = PROCESS_JOB_BACKOFF_SECONDS * 2 ** (job["attempts"] - 1)
+                update = {"$set": {
+                    "status": "queued",
+                    "run_at": now + datetime.timedelta(seconds=delay),
+                    "error": str(e),
+                    "updated_at": now,
+                }}
+            else:
+                update = self._finished("failed", error=str(e))
+        except Exception as e:
+            update = self._finished("failed", error=str(getattr(e, "detail", e)))
+        else:
+            update = self._finished("succeeded", result=result, error=None)
+        try:
+            await self.collection.update_one({"_id": job["_id"]}, update)
+        except Exception as e:
+            # The lease expires and the job is claimed again
+            log.warning("recording job result failed", extra={"job_id": job["_id"], "error": str(e)})
+
+    @staticmethod
+    def _finished(status, **fields):
+        now = datetime.datetime.utcnow()
+        return {
+            "$set": {"status": status, "finished_at": now, "updated_at": now, **fields},
+            "$unset": {"image": "", "locked_at": ""},
+        }
@@ -0,0 +1,31 @@
+"""
+Production entry point: the user, receipt processing and insights services in
+one ASGI app. Each worker process holds one Motor connection pool (see
+MONGO_MAX_POOL_SIZE), one model backend per role and one set of job workers,
+instead of one of each per service.
+
+    uvicorn main:app --host 0.0.0.0 --port 8000 --workers 4
+
+In-process caches are per worker: after a profile update, other workers can
+serve the previous user document for up to USER_CACHE_TTL_SECONDS.
+
+The modules still expose their own `app` for running a single service with
+--reload during development.
+"""
+from dotenv import load_dotenv
+load_dotenv()
+import user
+import image_text_processor
+import insights
+from service import create_app
+
+SERVICES = (user, image_text_processor, insights)
+
+app = create_app(
+    routers=[service.router for service in SERVICES],
+    startup=[hook for service in SERVICES for hook in service.STARTUP_HOOKS],
+    shutdown=[hook for service in SERVICES for hook in service.SHUTDOWN_HOOKS],
+    expose_headers=insights.EXPOSE_HEADERS,
+    title="Budget Planner API",
+    description="Accounts, receipt processing, expenses and insights for the budget planner.",
+)
@@ -0,0 +1,162 @@
+import bisect
+import threading
+
+# Latency buckets in seconds, from sub-millisecond lookups to multi-second model calls
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+REGISTRY = {}
+_registry_lock = threading.Lock()
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name, description, **kwargs):
+        self.name = name
+        self.description = description
+        self._kwargs = kwargs
+        self._children = {}
+        self._lock = threading.Lock()
+
+    def labels(self, **labels):
+        """Returns the child metric for this label set, creating it on first use."""
+        key = tuple(sorted(labels.items()))
+        child = self._children.get(key)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(key, self._new_child())
+        return child
+
+    def samples(self):
+        """Yields (labels, child) pairs; the unlabelled child has empty labels."""
+        for key, child in list(self._children.items()):
+            yield dict(key), child
+
+
+class _CounterValue:
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, amount=1.0):
+        self.value += amount
+
+
+class _GaugeValue(_CounterValue):
+    def dec(self, amount=1.0):
+        self.value -= amount
+
+    def set(self, value):
+        self.value = value
+
+
+class _HistogramValue:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q):
+        """Estimates a quantile as the upper bound of the bucket it falls into."""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for bound, bucket_count in zip(self.buckets, self.counts):
+            seen += bucket_count
+            if seen >= rank:
+                return bound
+        return float("inf")
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _new_child(self):
+        return _CounterValue()
+
+    def inc(self, amount=1.0):
+        self.labels().inc(amount)
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def _new_child(self):
+        return _GaugeValue()
+
+    def inc(self, amount=1.0):
+        self.labels().inc(amount)
+
+    def dec(self, amount=1.0):
+        self.labels().dec(amount)
+
+    def set(self, value):
+        self.labels().set(value)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def _new_child(self):
+        return _HistogramValue(self._kwargs.get("buckets") or DEFAULT_BUCKETS)
+
+    def observe(self, value):
+        self.labels().observe(value)
+
+
+def _register(cls, name, description, **kwargs):
+    with _registry_lock:
+        metric = REGISTRY.get(name)
+        if metric is None:
+            metric = REGISTRY[name] = cls(name, description, **kwargs)
+        return metric
+
+
+def counter(name, description):
+    return _register(Counter, name, description)
+
+
+def gauge(name, description):
+    return _register(Gauge, name, description)
+
+
+def histogram(name, description, buckets=None):
+    return _register(Histogram, name, description, buckets=buckets)
+
+
+# --- Prometheus text exposition ---
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _series(name, labels, value):
+    if labels:
+        rendered = ",".join(f'{key}="{_escape(val)}"' for key, val in labels.items())
+        return f"{name}{{{rendered}}} {value}"
+    return f"{name} {value}"
+
+
+def render_prometheus():
+    """Renders every registered metric in the Prometheus text format (version 0.0.4)."""
+    lines = []
+    for name, metric in sorted(REGISTRY.items()):
+        lines.append(f"# HELP {name} {_escape(metric.description)}")
+        lines.append(f"# TYPE {name} {metric.kind}")
+        for labels, child in metric.samples():
+            if metric.kind != "histogram":
+                lines.append(_series(name, labels, child.value))
+                continue
+            cumulative = 0
+            for bound, bucket_count in zip(child.buckets, child.counts):
+                cumulative += bucket_count
+                lines.append(_series(f"{name}_bucket", {**labels, "le": bound}, cumulative))
+            lines.append(_series(f"{name}_bucket", {**labels, "le": "+Inf"}, child.count))
+            lines.append(_series(f"{name}_sum", labels, child.sum))
+            lines.append(_series(f"{name}_count", labels, child.count))
+    return "\n".join(lines) + "\n"
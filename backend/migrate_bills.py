@@ -0,0 +1,105 @@
+"""
+Moves legacy per-item documents from bill_items into bill documents in bills.
+
+Items written by one /process call share their header (store, date, total,
+input type) and were created within moments of each other, so consecutive
+items of a user with the same header are folded into one bill. Item ids are
+kept, and each bill reuses its first item's id, so re-running the migration
+skips bills that already exist.
+
+    python migrate_bills.py --dry-run
+    python migrate_bills.py [--user someone@example.com] [--delete-items]
+"""
+import argparse
+import asyncio
+import datetime
+from pymongo.errors import BulkWriteError
+from database import item_collection, bills_collection, ensure_indexes
+from bills import make_bill
+from rollups import rebuild
+
+# Items of one bill were inserted in the same request, well within this window
+SAME_BILL_WINDOW = datetime.timedelta(seconds=5)
+BATCH_SIZE = 500
+HEADER_KEY = ("user_id", "store_name", "bill_date", "total_amount", "input_type", "bill_hash")
+DUPLICATE_KEY_ERROR = 11000
+
+
+def same_bill(bill_items, item):
+    first, last = bill_items[0], bill_items[-1]
+    if any(first.get(field) != item.get(field) for field in HEADER_KEY):
+        return False
+    if last.get("created_at") and item.get("created_at"):
+        return item["created_at"] - last["created_at"] <= SAME_BILL_WINDOW
+    return True
+
+
+def to_bill(bill_items):
+    header = dict(bill_items[0])
+    header.setdefault("created_at", bill_items[0]["_id"].generation_time.replace(tzinfo=None))
+    return make_bill(header, bill_items)
+
+
+async def insert_bills(bills):
+    """Inserts a batch, treating bills that already exist as migrated. Returns the number inserted."""
+    try:
+        result = await bills_collection.insert_many(bills, ordered=False)
+        return len(result.inserted_ids)
+    except BulkWriteError as e:
+        other_errors = [err for err in e.details["writeErrors"] if err["code"] != DUPLICATE_KEY_ERROR]
+        if other_errors:
+            raise
+        return e.details["nInserted"]
+
+
+async def migrate(user=None, dry_run=False, delete_items=False):
+    query = {"user_id": user} if user else {}
+    cursor = item_collection.find(query).sort([("user_id", 1), ("created_at", 1), ("_id", 1)])
+
+    pending, current = [], []
+    stats = {"items": 0, "bills": 0, "inserted": 0}
+
+    async def flush():
+        if pending and not dry_run:
+            stats["inserted"] += await insert_bills(pending)
+        pending.clear()
+
+    async for item in cursor:
+        stats["items"] += 1
+        if current and not same_bill(current, item):
+            pending.append(to_bill(current))
+            current = []
+        current.append(item)
+        if len(pending) >= BATCH_SIZE:
+            stats["bills"] += len(pending)
+            await flush()
+    if current:
+        pending.append(to_bill(current))
+    stats["bills"] += len(pending)
+    await flush()
+
+    if not dry_run:
+        stats["rollups_repaired"] = len(await rebuild(user))
+    if delete_items and not dry_run:
+        result = await item_collection.delete_many(query)
+        stats["deleted_items"] = result.deleted_count
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--user", help="Only migrate this user's items")
+    parser.add_argument("--dry-run", action="store_true", help="Count the bills that would be written")
+    parser.add_argument("--delete-items", action="store_true", help="Delete the migrated bill_items afterwards")
+    args = parser.parse_args()
+
+    async def run():
+        await ensure_indexes()
+        return await migrate(args.user, args.dry_run, args.delete_items)
+
+    stats = asyncio.run(run())
+    print(", ".join(f"{key}={value}" for key, value in stats.items()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,306 @@
+import os
+import re
+import json
+import time
+import random
+import asyncio
+import datetime
+import google.generativeai as genai
+from dotenv import load_dotenv
+from metrics import histogram, gauge
+from structured_log import get_logger
+
+load_dotenv()
+
+# --- Configuration ---
+# MODEL_BACKEND picks the implementation for every role; EXTRACTION_BACKEND and
+# INSIGHT_BACKEND override it per role. "stub" needs no network or API key.
+GOOGLE_API_KEY = os.environ.get("GOOGLE_API_KEY")
+MODEL_BACKEND = os.environ.get("MODEL_BACKEND", "gemini")
+GEMINI_MODEL_NAME = os.environ.get("GEMINI_MODEL_NAME", "gemini-1.5-flash")
+
+STUB_LATENCY_SECONDS = float(os.environ.get("STUB_LATENCY_SECONDS", 0.5))
+STUB_LATENCY_JITTER_SECONDS = float(os.environ.get("STUB_LATENCY_JITTER_SECONDS", 0.0))
+STUB_ERROR_RATE = float(os.environ.get("STUB_ERROR_RATE", 0.0))
+STUB_SEED = int(os.environ.get("STUB_SEED", 0))
+# Delay between streamed chunks; the first chunk arrives after STUB_LATENCY_SECONDS
+STUB_STREAM_CHUNK_SECONDS = float(os.environ.get("STUB_STREAM_CHUNK_SECONDS", 0.02))
+
+ROLE_DEFAULTS = {
+    # role: (timeout seconds, max concurrent calls)
+    "extraction": (60.0, 8),
+    "insight": (30.0, 4),
+}
+
+model_call_seconds = histogram("model_call_seconds", "Latency of model backend calls")
+model_first_chunk_seconds = histogram("model_first_chunk_seconds", "Time to the first chunk of streamed model calls")
+model_calls_in_flight = gauge("model_calls_in_flight", "Model backend calls currently running")
+
+log = get_logger("model_backends")
+
+if GOOGLE_API_KEY:
+    try:
+        genai.configure(api_key=GOOGLE_API_KEY)
+    except Exception as e:
+        log.error("configuring Gemini API failed", extra={"error": str(e)})
+elif MODEL_BACKEND == "gemini":
+    log.warning("GOOGLE_API_KEY not found. The Gemini backend will not work; set MODEL_BACKEND=stub to run offline.")
+
+
+class ModelBackendError(Exception):
+    """The backend failed to produce a response."""
+
+
+class ModelTimeoutError(ModelBackendError):
+    """The backend did not answer within its timeout."""
+
+
+class ModelBackend:
+    """
+    Base class for model backends. Subclasses implement _generate(); generate()
+    wraps it with the per-backend timeout, concurrency limit and latency histogram.
+    Any failure of the underlying call is raised as ModelBackendError (or
+    ModelTimeoutError), with the provider's exception as its cause.
+    """
+    name = "base"
+
+    def __init__(self, role: str, timeout: float, max_concurrency: int):
+        self.role = role
+        self.timeout = timeout
+        self._slots = asyncio.Semaphore(max_concurrency)
+
+    @property
+    def available(self) -> bool:
+        return True
+
+    async def _generate(self, contents: list) -> str:
+        raise NotImplementedError
+
+    async def generate(self, contents: list) -> str:
+        started = time.perf_counter()
+        outcome = "ok"
+        async with self._slots:
+            in_flight = model_calls_in_flight.labels(backend=self.name, role=self.role)
+            in_flight.inc()
+            try:
+                return await asyncio.wait_for(self._generate(contents), self.timeout)
+            except asyncio.TimeoutError:
+                outcome = "timeout"
+                raise ModelTimeoutError(f"{self.name} {self.role} call timed out after {self.timeout}s")
+            except ModelBackendError:
+                outcome = "error"
+                raise
+            except Exception as e:
+                # Provider errors (rate limits, 5xx, network) surface as ModelBackendError so callers can retry them
+                outcome = "error"
+                raise ModelBackendError(f"{self.name} {self.role} call failed: {e}") from e
+            finally:
+                in_flight.dec()
+                model_call_seconds.labels(backend=self.name, role=self.role, outcome=outcome).observe(
+                    time.perf_counter() - started
+                )
+
+    async def _stream(self, contents: list):
+        # Backends without native streaming deliver the whole response as one chunk
+        yield await self._generate(contents)
+
+    async def stream(self, contents: list):
+        """
+        Yields response text chunks as the backend produces them, under the same
+        timeout (for the whole response) and concurrency limit as generate().
+        Closing this generator early, e.g. because the client went away, closes
+        the upstream call.
+        """
+        started = time.perf_counter()
+        deadline = started + self.timeout
+        outcome = "ok"
+        async with self._slots:
+            in_flight = model_calls_in_flight.labels(backend=self.name, role=self.role)
+            in_flight.inc()
+            chunks = self._stream(contents)
+            first = True
+            try:
+                while True:
+                    try:
+                        chunk = await asyncio.wait_for(chunks.__anext__(), max(0.0, deadline - time.perf_counter()))
+                    except StopAsyncIteration:
+                        break
+                    except asyncio.TimeoutError:
+                        outcome = "timeout"
+                        raise ModelTimeoutError(f"{self.name} {self.role} stream timed out after {self.timeout}s")
+                    except ModelBackendError:
+                        raise
+                    except Exception as e:
+                        raise ModelBackendError(f"{self.name} {self.role} stream failed: {e}") from e
+                    if first:
+                        first = False
+                        model_first_chunk_seconds.labels(backend=self.name, role=self.role).observe(
+                            time.perf_counter() - started
+                        )
+                    yield chunk
+            except (GeneratorExit, asyncio.CancelledError):
+                outcome = "cancelled"
+                raise
+            except Exception:
+                if outcome == "ok":
+                    outcome = "error"
+                raise
+            finally:
+                await chunks.aclose()
+                in_flight.dec()
+                model_call_seconds.labels(backend=self.name, role=self.role, outcome=outcome).observe(
+                    time.perf_counter() - started
+                )
+
+
+class ExtractionBackend(ModelBackend):
+    """Turns a prompt plus an optional receipt image into the bill JSON text."""
+
+    async def extract(self, prompt: str, image: dict = None) -> str:
+        contents = [prompt]
+        if image is not None:
+            contents.append(image)
+        return await self.generate(contents)
+
+
+class InsightBackend(ModelBackend):
+    """Turns a prompt describing the user's finances into insight text."""
+
+    async def generate_insights(self, prompt: str) -> str:
+        return await self.generate([prompt])
+
+    def stream_insights(self, prompt: str):
+        return self.stream([prompt])
+
+
+# --- Gemini ---
+_gemini_model = None
+
+
+def get_gemini_model():
+    """One GenerativeModel shared by every backend instead of one per request."""
+    global _gemini_model
+    if _gemini_model is None:
+        _gemini_model = genai.GenerativeModel(GEMINI_MODEL_NAME)
+    return _gemini_model
+
+
+class GeminiMixin:
+    name = "gemini"
+
+    @property
+    def available(self) -> bool:
+        return bool(GOOGLE_API_KEY)
+
+    async def _generate(self, contents: list) -> str:
+        response = await get_gemini_model().generate_content_async(contents)
+        return response.text
+
+    async def _stream(self, contents: list):
+        response = await get_gemini_model().generate_content_async(contents, stream=True)
+        async for chunk in response:
+            if chunk.text:
+                yield chunk.text
+
+
+class GeminiExtractionBackend(GeminiMixin, ExtractionBackend):
+    pass
+
+
+class GeminiInsightBackend(GeminiMixin, InsightBackend):
+    pass
+
+
+# --- Local stub ---
+STUB_BILL = {
+    "store_name": "Local Stub Mart",
+    "total_amount": 245.0,
+    "items": [
+        {"item_name": "Rice 1kg", "quantity": 2, "unit_price": 60.0, "category": "Food"},
+        {"item_name": "Milk 1L", "quantity": 1, "unit_price": 55.0, "category": "Food"},
+        {"item_name": "Bath Soap", "quantity": 2, "unit_price": 35.0, "category": "Retail"},
+    ],
+}
+
+STUB_INSIGHTS = """**Spending Patterns**
+- Food is your largest category this month; planning meals weekly can trim it by 10%.
+
+**Savings**
+- Buying staples like rice in larger packs lowers the unit price.
+
+**Encouragement**
+- You are on track; keep logging every bill to stay there."""
+
+
+class StubMixin:
+    """
+    Deterministic offline backend for load tests: canned responses after a
+    configurable delay, with seeded random failures when STUB_ERROR_RATE > 0.
+    """
+    name = "stub"
+
+    def __init__(self, *args, latency=None, jitter=None, error_rate=None, seed=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.latency = STUB_LATENCY_SECONDS if latency is None else latency
+        self.jitter = STUB_LATENCY_JITTER_SECONDS if jitter is None else jitter
+        self.error_rate = STUB_ERROR_RATE if error_rate is None else error_rate
+        self._random = random.Random(STUB_SEED if seed is None else seed)
+
+    async def _simulate_call(self):
+        await asyncio.sleep(max(0.0, self.latency + self._random.uniform(-self.jitter, self.jitter)))
+        if self._random.random() < self.error_rate:
+            raise ModelBackendError("Injected stub backend failure")
+
+
+class StubExtractionBackend(StubMixin, ExtractionBackend):
+    async def _generate(self, contents: list) -> str:
+        await self._simulate_call()
+        bill = dict(STUB_BILL, bill_date=datetime.date.today().isoformat())
+        return f"```json\n{json.dumps(bill)}\n```"
+
+
+class StubInsightBackend(StubMixin, InsightBackend):
+    async def _generate(self, contents: list) -> str:
+        await self._simulate_call()
+        return STUB_INSIGHTS
+
+    async def _stream(self, contents: list):
+        await self._simulate_call()
+        for index, word in enumerate(re.findall(r"\S+\s*", STUB_INSIGHTS)):
+            if index:
+                await asyncio.sleep(STUB_STREAM_CHUNK_SECONDS)
+            yield word
+
+
+BACKENDS = {
+    "extraction": {"gemini": GeminiExtractionBackend, "stub": StubExtractionBackend},
+    "insight": {"gemini": GeminiInsightBackend, "stub": StubInsightBackend},
+}
+
+_instances = {}
+
+
+def get_backend(role: str) -> ModelBackend:
+    """Returns the process-wide backend for a role, built from the environment on first use."""
+    if role not in _instances:
+        prefix = role.upper()
+        kind = os.environ.get(f"{prefix}_BACKEND", MODEL_BACKEND)
+        default_timeout, default_concurrency = ROLE_DEFAULTS[role]
+        try:
+            backend_cls = BACKENDS[role][kind]
+        except KeyError:
+            raise ValueError(f"Unknown {role} backend '{kind}', expected one of {sorted(BACKENDS[role])}")
+        _instances[role] = backend_cls(
+            role,
+            timeout=float(os.environ.get(f"{prefix}_TIMEOUT_SECONDS", default_timeout)),
+            max_concurrency=int(os.environ.get(f"{prefix}_MAX_CONCURRENCY", default_concurrency)),
+        )
+    return _instances[role]
+
+
+def get_extraction_backend() -> ExtractionBackend:
+    return get_backend("extraction")
+
+
+def get_insight_backend() -> InsightBackend:
+    return get_backend("insight")
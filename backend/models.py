@@ -1,6 +1,6 @@
 import datetime
-from pydantic import BaseModel, EmailStr, Field
-from typing import Dict, Any, Optional
+from pydantic import BaseModel, EmailStr, Field, field_validator
+from typing import Dict, Any, Optional, List, Union, Literal
 from bson import ObjectId
 import datetime
 
@@ -33,7 +33,9 @@ class TokenResponse(BaseModel):
     token_type: str = "bearer"
 
 class ProcessedItemInDB(BaseModel):
+    # One item of a stored bill, flattened together with the bill header
     id: str = Field(alias="_id")
+    bill_id: Optional[str] = None
     user_id: str
     store_name: Optional[str] = None
     bill_date: Optional[str] = None
@@ -68,10 +70,28 @@ class ExpenseItem(BaseModel):
     unit_price: Optional[float] = None
     category: Optional[str] = None
     id: Optional[str] = None
+    bill_id: Optional[str] = None
+
+class ExpenseBulkOperation(BaseModel):
+    op: Literal["update", "delete"]
+    id: str
+    # Fields to change for "update", as accepted by PUT /expenses/{id}
+    data: Dict[str, Any] = {}
+
+class ExpenseBulkRequest(BaseModel):
+    operations: List[ExpenseBulkOperation]
+
+class ExpenseBulkResponse(BaseModel):
+    updated: List[ExpenseItem] = []
+    deleted: List[str] = []
+    not_found: List[str] = []
 
 class InsightResponse(BaseModel):
     user_id: str
     insights: str
+    generated_at: Optional[datetime.datetime] = None
+    # True when served from cache while a refresh for changed data runs
+    stale: bool = False
 
 class UserUpdate(BaseModel):
     firstName: Optional[str] = None
@@ -81,4 +101,160 @@ class UserUpdate(BaseModel):
     phone: Optional[str] = None
     #password: Optional[str] = None  # Handle password updates carefully!
     financialDetails: Optional[FinancialDetails] = None
-    financialGoals: Optional[str] = None
\ No newline at end of file
+    financialGoals: Optional[str] = None
+
+class DailyTotal(BaseModel):
+    day: str
+    total: float
+    count: int
+
+class MonthlyTotal(BaseModel):
+    month: str
+    total: float
+    count: int
+
+class CategoryTotal(BaseModel):
+    category: Optional[str] = None
+    total: float
+    count: int
+
+class ExpenseSummary(BaseModel):
+    # Totals computed server-side with an aggregation pipeline
+    user_id: str
+    start_date: Optional[str] = None
+    end_date: Optional[str] = None
+    category: Optional[str] = None
+    total: float = 0.0
+    count: int = 0
+    daily: List[DailyTotal] = []
+    monthly: List[MonthlyTotal] = []
+    by_category: List[CategoryTotal] = []
+
+class ProcessJobStatus(BaseModel):
+    id: str = Field(alias="_id")
+    status: str
+    input_type: str
+    attempts: int = 0
+    error: Optional[str] = None
+    result: Optional[Union[List[Dict[str, Any]], Dict[str, Any]]] = None
+    created_at: datetime.datetime
+    updated_at: datetime.datetime
+    finished_at: Optional[datetime.datetime] = None
+
+class BatchItemResult(BaseModel):
+    index: int
+    input_type: Optional[str] = None
+    status: str  # created, duplicate, message or error
+    items: List[ProcessedItemInDB] = []
+    message: Optional[str] = None
+    error: Optional[str] = None
+
+class BatchProcessResponse(BaseModel):
+    results: List[BatchItemResult]
+    created_count: int
+    error_count: int
+
+class MonthlyRollup(BaseModel):
+    # Pre-aggregated from spending_rollups, maintained on every bill write
+    month: str
+    total: float
+    count: int
+    by_category: List[CategoryTotal] = []
+
+class ExpenseAlert(BaseModel):
+    # A suspicious expense flagged when its bill was stored, or a projected budget overshoot
+    id: str = Field(alias="_id")
+    bill_id: Optional[str] = None
+    item_id: Optional[str] = None
+    kind: str  # outlier, unit_price, spike, duplicate or overshoot
+    severity: str
+    score: float
+    message: str
+    store_name: Optional[str] = None
+    bill_date: Optional[str] = None
+    category: Optional[str] = None
+    item_name: Optional[str] = None
+    amount: Optional[float] = None
+    # The user's usual value the amount was compared with
+    expected: Optional[float] = None
+    created_at: datetime.datetime
+    dismissed: bool = False
+
+class CategoryForecast(BaseModel):
+    category: Optional[str] = None
+    month_to_date: float
+    # Blended spend per day used for the projection
+    daily_rate: float
+    projected: float
+
+class SpendingForecast(BaseModel):
+    user_id: str
+    month: str
+    days_elapsed: int
+    days_in_month: int
+    month_to_date: float
+    projected_total: float
+    # Monthly income plus pension from financialDetails; None (and so no budget figures) when not given
+    monthly_budget: Optional[float] = None
+    remaining_budget: Optional[float] = None
+    # What can still be spent per day, today included, to stay within the budget
+    daily_budget: Optional[float] = None
+    projected_overshoot: Optional[float] = None
+    on_track: Optional[bool] = None
+    by_category: List[CategoryForecast] = []
+
+class FamilyGrantRequest(BaseModel):
+    # The family member (caregiver) to give read access to your spending
+    email: str
+
+class FamilyMember(BaseModel):
+    email: str
+    firstName: Optional[str] = None
+    lastName: Optional[str] = None
+
+class FamilyGrants(BaseModel):
+    # Who can see my spending, and whose spending I can see
+    caregivers: List[str] = []
+    dependents: List[FamilyMember] = []
+
+class DependentOverview(FamilyMember):
+    forecast: SpendingForecast
+    open_alerts: int = 0
+    high_alerts: int = 0
+    latest_alert: Optional[str] = None
+
+class FamilyOverview(BaseModel):
+    caregiver: str
+    generated_at: datetime.datetime
+    dependents: List[DependentOverview] = []
+
+class ExpenseImportRow(BaseModel):
+    # One row of an imported file; the columns of /expenses/export, id and extra columns ignored
+    bill_id: Optional[str] = None
+    bill_date: Optional[str] = Field(None, pattern=r"^\d{4}-\d{2}-\d{2}$")
+    store_name: Optional[str] = None
+    total_amount: Optional[float] = None
+    item_name: Optional[str] = None
+    quantity: float = 1.0
+    unit_price: float
+    category: Optional[str] = None
+    input_type: Optional[str] = None
+    created_at: Optional[datetime.datetime] = None
+
+    @field_validator("quantity", mode="before")
+    @classmethod
+    def blank_quantity_is_one(cls, value):
+        # Empty CSV cells arrive as None, like Parquet/Arrow nulls
+        return 1.0 if value is None else value
+
+class ExpenseImportError(BaseModel):
+    row: int
+    error: str
+
+class ExpenseImportResponse(BaseModel):
+    imported_items: int
+    imported_bills: int
+    # Bills already in the history from an earlier import of the same data
+    skipped_bills: int
+    error_count: int
+    errors: List[ExpenseImportError] = []
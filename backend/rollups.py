@@ -0,0 +1,203 @@
+"""
+Per-user, per-month, per-category spending totals kept next to the bills.
+
+Every write to bills applies the change in spend to spending_rollups with $inc,
+so monthly totals are a single indexed read instead of a scan of the user's
+history. The rebuild/verify commands recompute the rollups from the bills:
+
+    python rollups.py verify [--user someone@example.com]
+    python rollups.py rebuild [--user someone@example.com]
+"""
+import argparse
+import asyncio
+from collections import defaultdict
+from pymongo import UpdateOne, DeleteMany, ReplaceOne
+from database import bills_collection, rollup_collection, ensure_indexes
+from structured_log import get_logger
+
+# Totals are floats; differences below this are rounding, not drift
+DRIFT_TOLERANCE = 0.005
+
+log = get_logger("rollups")
+
+
+def _number(value):
+    # Mirrors the $convert used by the aggregation pipelines: unparsable -> 0
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def month_of(bill):
+    return (bill.get("bill_date") or "")[:7]
+
+
+def bill_contributions(bill):
+    """Returns {(month, category): [total, count]} for one bill (None counts as empty)."""
+    contributions = defaultdict(lambda: [0.0, 0])
+    if not bill:
+        return contributions
+    month = month_of(bill)
+    for item in bill.get("items", []):
+        if item.get("unit_price") is None:
+            continue
+        entry = contributions[(month, item.get("category"))]
+        entry[0] += _number(item.get("quantity")) * _number(item.get("unit_price"))
+        entry[1] += 1
+    return contributions
+
+
+def rollup_delta(before, after):
+    """Change in contributions when a bill goes from before to after (either may be None)."""
+    delta = defaultdict(lambda: [0.0, 0])
+    for sign, bill in ((-1, before), (1, after)):
+        for key, (total, count) in bill_contributions(bill).items():
+            delta[key][0] += sign * total
+            delta[key][1] += sign * count
+    return {key: value for key, value in delta.items() if value[1] or abs(value[0]) > DRIFT_TOLERANCE}
+
+
+async def apply_delta(user_id, delta):
+    """$inc the rollups by a delta in one bulk write, dropping rows that reach zero items."""
+    if not delta:
+        return
+    operations = [
+        UpdateOne(
+            {"user_id": user_id, "month": month, "category": category},
+            {"$inc": {"total": total, "count": count}},
+            upsert=True,
+        )
+        for (month, category), (total, count) in delta.items()
+    ]
+    operations.append(DeleteMany({"user_id": user_id, "count": {"$lte": 0}}))
+    await rollup_collection.bulk_write(operations, ordered=True)
+
+
+async def record_bill_change(user_id, before, after):
+    try:
+        await apply_delta(user_id, rollup_delta(before, after))
+    except Exception as e:
+        # The bill write already succeeded; `python rollups.py rebuild` repairs the drift
+        log.warning("updating spending rollups failed", extra={"user_id": user_id, "error": str(e)})
+
+
+async def record_bill_changes(user_id, changes):
+    """Like record_bill_change for many (before, after) pairs, in one bulk write."""
+    delta = defaultdict(lambda: [0.0, 0])
+    for before, after in changes:
+        for key, (total, count) in rollup_delta(before, after).items():
+            delta[key][0] += total
+            delta[key][1] += count
+    try:
+        await apply_delta(user_id, delta)
+    except Exception as e:
+        log.warning("updating spending rollups failed", extra={"user_id": user_id, "error": str(e)})
+
+
+async def record_new_bills(bills):
+    by_user = defaultdict(lambda: defaultdict(lambda: [0.0, 0]))
+    for bill in bills:
+        for key, (total, count) in bill_contributions(bill).items():
+            by_user[bill["user_id"]][key][0] += total
+            by_user[bill["user_id"]][key][1] += count
+    for user_id, delta in by_user.items():
+        try:
+            await apply_delta(user_id, delta)
+        except Exception as e:
+            log.warning("updating spending rollups failed", extra={"user_id": user_id, "error": str(e)})
+
+
+async def get_monthly_rollups(user_id, month=None):
+    """Reads the stored rollups for a user, optionally for one month only."""
+    query = {"user_id": user_id}
+    if month:
+        query["month"] = month
+    return await rollup_collection.find(query, {"_id": 0}).sort([("month", 1), ("category", 1)]).to_list(length=None)
+
+
+# --- Rebuild / verify ---
+def rebuild_pipeline(user=None):
+    return [
+        {"$match": {"user_id": user} if user else {}},
+        {"$unwind": "$items"},
+        {"$match": {"items.unit_price": {"$ne": None}}},
+        {"$group": {
+            "_id": {
+                "user_id": "$user_id",
+                "month": {"$substrBytes": [{"$ifNull": ["$bill_date", ""]}, 0, 7]},
+                "category": "$items.category",
+            },
+            "total": {"$sum": {"$multiply": [
+                {"$convert": {"input": "$items.quantity", "to": "double", "onError": 0, "onNull": 0}},
+                {"$convert": {"input": "$items.unit_price", "to": "double", "onError": 0, "onNull": 0}},
+            ]}},
+            "count": {"$sum": 1},
+        }},
+    ]
+
+
+async def compute_drift(user=None):
+    """Compares stored rollups with totals recomputed from bills. Returns (expected, drift rows)."""
+    expected = {}
+    async for row in bills_collection.aggregate(rebuild_pipeline(user), allowDiskUse=True):
+        key = (row["_id"]["user_id"], row["_id"]["month"], row["_id"].get("category"))
+        expected[key] = (row["total"], row["count"])
+
+    stored = {}
+    async for row in rollup_collection.find({"user_id": user} if user else {}):
+        stored[(row["user_id"], row["month"], row.get("category"))] = (row.get("total", 0.0), row.get("count", 0))
+
+    drift = []
+    for key in sorted(set(expected) | set(stored), key=str):
+        want, have = expected.get(key, (0.0, 0)), stored.get(key, (0.0, 0))
+        if want[1] != have[1] or abs(want[0] - have[0]) > DRIFT_TOLERANCE:
+            drift.append({"key": key, "expected": want, "stored": have})
+    return expected, drift
+
+
+async def rebuild(user=None):
+    """Rewrites the rollups from the bills and returns the drift that was repaired."""
+    expected, drift = await compute_drift(user)
+    if not drift:
+        return drift
+    operations = [
+        ReplaceOne(
+            {"user_id": user_id, "month": month, "category": category},
+            {"user_id": user_id, "month": month, "category": category, "total": total, "count": count},
+            upsert=True,
+        )
+        for (user_id, month, category), (total, count) in expected.items()
+    ]
+    stale = [row["key"] for row in drift if row["key"] not in expected]
+    operations += [
+        DeleteMany({"user_id": user_id, "month": month, "category": category})
+        for user_id, month, category in stale
+    ]
+    await rollup_collection.bulk_write(operations, ordered=False)
+    return drift
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=["verify", "rebuild"])
+    parser.add_argument("--user", help="Only check this user's rollups")
+    args = parser.parse_args()
+
+    async def run():
+        await ensure_indexes()
+        if args.command == "rebuild":
+            return await rebuild(args.user)
+        return (await compute_drift(args.user))[1]
+
+    drift = asyncio.run(run())
+    for row in drift:
+        user_id, month, category = row["key"]
+        print(f"{user_id} {month or '-'} {category}: stored {row['stored']} expected {row['expected']}")
+    action = "repaired" if args.command == "rebuild" else "found"
+    print(f"{len(drift)} drifted rollup rows {action}")
+    raise SystemExit(1 if drift and args.command == "verify" else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,211 @@
+import os
+import re
+import datetime
+from typing import Optional
+
+# Deterministic parser for one-line expenses such as "spent 200 on groceries at
+# DMart yesterday" or "bought 2 kg rice for 120". It returns the same bill JSON
+# the model does, or None when the text is not simple enough to be sure, in
+# which case the caller falls back to the model.
+RULE_EXTRACTOR_ENABLED = os.environ.get("RULE_EXTRACTOR_ENABLED", "1") == "1"
+RULE_EXTRACTOR_MIN_CONFIDENCE = float(os.environ.get("RULE_EXTRACTOR_MIN_CONFIDENCE", 0.7))
+
+# The category list of the extraction prompt
+CATEGORY_KEYWORDS = {
+    "Food": (
+        "grocery", "groceries", "vegetables", "vegetable", "fruits", "fruit", "milk", "rice", "bread", "eggs",
+        "dal", "atta", "flour", "sugar", "oil", "tea", "coffee", "snacks", "lunch", "dinner", "breakfast",
+        "restaurant", "meal", "food", "sweets", "biscuits", "curd", "paneer", "chicken", "fish", "meat",
+    ),
+    "Clothing": ("clothes", "shirt", "shirts", "saree", "sari", "kurta", "trousers", "shoes", "slippers", "sweater"),
+    "Travel": (
+        "taxi", "cab", "auto", "rickshaw", "bus", "train", "metro", "flight", "ticket", "tickets", "petrol",
+        "diesel", "fuel", "uber", "ola", "parking", "toll",
+    ),
+    "Entertainment": ("movie", "movies", "cinema", "netflix", "concert", "show", "outing", "game", "games"),
+    "Utilities": (
+        "electricity", "water", "gas", "internet", "broadband", "wifi", "phone", "mobile", "recharge",
+        "bill", "rent", "cylinder",
+    ),
+    "Retail": ("soap", "shampoo", "toothpaste", "detergent", "household", "stationery", "utensils", "shopping"),
+    "Other": ("medicine", "medicines", "tablets", "doctor", "pharmacy", "donation", "gift"),
+}
+_KEYWORD_CATEGORY = {word: category for category, words in CATEGORY_KEYWORDS.items() for word in words}
+
+KNOWN_STORES = {
+    "dmart": "DMart", "d mart": "DMart", "big bazaar": "Big Bazaar", "reliance fresh": "Reliance Fresh",
+    "more": "More", "spencers": "Spencer's", "amazon": "Amazon", "flipkart": "Flipkart",
+    "swiggy": "Swiggy", "zomato": "Zomato", "blinkit": "Blinkit", "zepto": "Zepto", "bigbasket": "BigBasket",
+}
+# Store names that are also everyday words ("50 more on milk") only count after "at"/"from"
+_AMBIGUOUS_STORES = {"more"}
+_STORE_CATEGORY = {"Swiggy": "Food", "Zomato": "Food", "Blinkit": "Food", "Zepto": "Food", "BigBasket": "Food"}
+
+_SPEND_VERBS = {"spent", "spend", "paid", "pay", "bought", "buy", "purchased", "cost", "costs", "gave"}
+_CURRENCY = {"rs", "rs.", "inr", "rupee", "rupees", "₹"}
+_UNITS = {
+    "kg", "kgs", "kilo", "kilos", "g", "gm", "grams", "l", "litre", "litres", "liter", "liters", "ml",
+    "packet", "packets", "pack", "packs", "pcs", "piece", "pieces", "dozen", "x", "bottle", "bottles",
+}
+_STOP = {
+    "at", "from", "for", "on", "in", "of", "to", "and", "with", "each", "per", "today", "yesterday", "the",
+    "a", "an", "my", "some", "rs", "rupees", "rupee", "inr", "i", "was", "worth",
+} | _SPEND_VERBS
+_WEEKDAYS = ("monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday")
+
+_NUMBER_WORDS = {
+    "zero": 0, "one": 1, "two": 2, "three": 3, "four": 4, "five": 5, "six": 6, "seven": 7, "eight": 8,
+    "nine": 9, "ten": 10, "eleven": 11, "twelve": 12, "thirteen": 13, "fourteen": 14, "fifteen": 15,
+    "sixteen": 16, "seventeen": 17, "eighteen": 18, "nineteen": 19, "twenty": 20, "thirty": 30,
+    "forty": 40, "fifty": 50, "sixty": 60, "seventy": 70, "eighty": 80, "ninety": 90,
+}
+_SCALE_WORDS = {"hundred": 100, "thousand": 1000, "lakh": 100000}
+
+_TOKEN = re.compile(r"₹|\d+(?:\.\d+)?|[a-z]+(?:'[a-z]+)?|/-")
+
+
+def words_to_numbers(tokens: list) -> list:
+    """Replaces spoken numbers ("one hundred twenty") with digit tokens ("120")."""
+    out, current, total, in_number = [], 0, 0, False
+
+    def flush():
+        nonlocal current, total, in_number
+        if in_number:
+            out.append(str(total + current))
+        current, total, in_number = 0, 0, False
+
+    for index, token in enumerate(tokens):
+        following = tokens[index + 1] if index + 1 < len(tokens) else None
+        if token in _NUMBER_WORDS:
+            current += _NUMBER_WORDS[token]
+            in_number = True
+        elif token in _SCALE_WORDS and in_number:
+            if token == "hundred":
+                current = max(current, 1) * 100
+            else:
+                total += max(current, 1) * _SCALE_WORDS[token]
+                current = 0
+        elif token == "and" and in_number and (following in _NUMBER_WORDS):
+            continue
+        else:
+            flush()
+            out.append(token)
+    flush()
+    return out
+
+
+def resolve_date(tokens: list, today: datetime.date) -> Optional[datetime.date]:
+    """Relative dates only; returns None if the text names a date we do not understand."""
+    text = " ".join(tokens)
+    if "day before yesterday" in text:
+        return today - datetime.timedelta(days=2)
+    if "yesterday" in tokens:
+        return today - datetime.timedelta(days=1)
+    match = re.search(r"\b(\d+) days? ago\b", text)
+    if match:
+        return today - datetime.timedelta(days=int(match.group(1)))
+    for offset, name in enumerate(_WEEKDAYS):
+        if name in tokens:
+            days_back = (today.weekday() - offset) % 7 or 7
+            return today - datetime.timedelta(days=days_back)
+    if any(word in tokens for word in ("week", "month", "ago", "last")):
+        return None
+    return today
+
+
+def find_store(tokens: list) -> Optional[str]:
+    text = " ".join(tokens)
+    for key, name in KNOWN_STORES.items():
+        prefix = r"\b(?:at|from) " if key in _AMBIGUOUS_STORES else r"\b"
+        if re.search(rf"{prefix}{re.escape(key)}\b", text):
+            return name
+    for index, token in enumerate(tokens[:-1]):
+        if token in ("at", "from"):
+            words = []
+            for word in tokens[index + 1:]:
+                if word in _STOP or word[0].isdigit() or word in _CURRENCY or word in _KEYWORD_CATEGORY:
+                    break
+                words.append(word)
+            if words:
+                return " ".join(word.capitalize() for word in words)
+    return None
+
+
+def parse_expense(text: Optional[str], today: Optional[datetime.date] = None) -> Optional[dict]:
+    """
+    Returns bill JSON in the model's shape with a single item, or None when the
+    text is not a simple single expense (several amounts, no recognizable
+    category, an absolute date, ...) or confidence is below the threshold.
+    """
+    if not text or len(text) > 200 or re.search(r"\d+[/-]\d+", text):
+        return None
+    today = today or datetime.date.today()
+    tokens = words_to_numbers(_TOKEN.findall(text.lower().replace(",", "")))
+
+    amounts, quantity, quantity_index, certain_amount = [], 1.0, None, False
+    for index, token in enumerate(tokens):
+        if not token[0].isdigit():
+            continue
+        before = tokens[index - 1] if index else None
+        after = tokens[index + 1] if index + 1 < len(tokens) else None
+        if after in _UNITS:
+            quantity, quantity_index = float(token), index
+        elif before in _CURRENCY or after in _CURRENCY or after == "/-" or before in _SPEND_VERBS | {"for"}:
+            amounts.append(float(token))
+            certain_amount = True
+        elif after in ("days", "day"):
+            continue
+        else:
+            amounts.append(float(token))
+    if len(amounts) != 1:
+        return None
+    amount = amounts[0]
+    if amount <= 0:
+        return None
+
+    bill_date = resolve_date(tokens, today)
+    if bill_date is None:
+        return None
+    store_name = find_store(tokens)
+
+    # Item: the words after a quantity ("2 kg rice"), else a category keyword
+    item_name = None
+    if quantity_index is not None:
+        words = []
+        following = tokens[quantity_index + 2:]
+        if following[:1] == ["of"]:
+            following = following[1:]
+        for word in following:
+            if word in _STOP or word[0].isdigit() or word in _CURRENCY:
+                break
+            words.append(word)
+        item_name = " ".join(words) or None
+    keywords = [token for token in tokens if token in _KEYWORD_CATEGORY]
+    if not item_name and keywords:
+        item_name = keywords[0]
+    category = next((_KEYWORD_CATEGORY[word] for word in (item_name or "").split() if word in _KEYWORD_CATEGORY), None)
+    category = category or (_KEYWORD_CATEGORY[keywords[0]] if keywords else _STORE_CATEGORY.get(store_name))
+    if not item_name or not category:
+        return None
+
+    confidence = 0.4 if certain_amount else 0.25
+    confidence += 0.3 if keywords else 0.15
+    confidence += 0.15 if item_name else 0.0
+    confidence += 0.15 if any(token in _SPEND_VERBS for token in tokens) else 0.0
+    if confidence < RULE_EXTRACTOR_MIN_CONFIDENCE:
+        return None
+
+    # "each"/"per" price the unit; otherwise the amount is what was paid in total
+    per_unit = any(token in ("each", "per") for token in tokens)
+    unit_price = amount if per_unit else round(amount / quantity, 2)
+    return {
+        "store_name": store_name,
+        "bill_date": bill_date.isoformat(),
+        "total_amount": round(amount * quantity, 2) if per_unit else amount,
+        "items": [{
+            "item_name": item_name.title(),
+            "quantity": quantity,
+            "unit_price": unit_price,
+            "category": category,
+        }],
+    }
@@ -0,0 +1,107 @@
+import time
+from contextlib import asynccontextmanager
+from fastapi import FastAPI
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
+from database import ensure_indexes, close_client
+from metrics import histogram, gauge, render_prometheus
+from structured_log import get_logger
+
+log = get_logger("service")
+access_log = get_logger("access")
+
+http_request_seconds = histogram("http_request_seconds", "Request latency by route, until the last body byte is sent")
+http_requests_in_flight = gauge("http_requests_in_flight", "Requests currently being handled")
+
+
+async def create_indexes():
+    try:
+        await ensure_indexes()
+    except Exception as e:
+        log.warning("creating MongoDB indexes failed", extra={"error": str(e)})
+
+
+class MetricsMiddleware:
+    """
+    Records latency and status per route template (not per raw path, so ids do
+    not explode the label set) and writes a sampled access log line.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        started = time.perf_counter()
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        http_requests_in_flight.inc()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            http_requests_in_flight.dec()
+            seconds = time.perf_counter() - started
+            route = getattr(scope.get("route"), "path", "unmatched")
+            http_request_seconds.labels(method=scope["method"], route=route, status=str(status)).observe(seconds)
+            if route != "/metrics":
+                access_log.info("request", extra={
+                    "method": scope["method"], "route": route, "status": status, "ms": round(seconds * 1000, 1),
+                })
+
+
+async def metrics_endpoint():
+    """Prometheus scrape target; with several workers each one reports its own process."""
+    return PlainTextResponse(render_prometheus(), media_type="text/plain; version=0.0.4")
+
+
+def create_app(routers, startup=(), shutdown=(), expose_headers=(), **kwargs) -> FastAPI:
+    """
+    Builds a FastAPI app from service routers with the shared CORS setup and a
+    lifespan that runs each startup hook once, in order, and the shutdown hooks
+    in order on exit (sync or async). The Mongo client is closed last.
+    """
+    startup = list(dict.fromkeys(startup))
+    shutdown = list(dict.fromkeys(shutdown))
+
+    @asynccontextmanager
+    async def lifespan(app: FastAPI):
+        for hook in startup:
+            await hook()
+        try:
+            yield
+        finally:
+            for hook in shutdown:
+                try:
+                    result = hook()
+                    if result is not None:
+                        await result
+                except Exception as e:
+                    log.warning("shutdown hook failed", extra={"hook": getattr(hook, "__qualname__", str(hook)), "error": str(e)})
+            close_client()
+
+    app = FastAPI(lifespan=lifespan, **kwargs)
+
+    # --- CORS (Cross-Origin Resource Sharing) ---
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=["*"],
+        allow_credentials=True,
+        allow_methods=["*"],
+        allow_headers=["*"],
+        expose_headers=list(expose_headers),
+    )
+
+    app.add_middleware(MetricsMiddleware)
+
+    for router in routers:
+        app.include_router(router)
+    app.add_api_route("/metrics", metrics_endpoint, methods=["GET"], include_in_schema=False)
+    return app
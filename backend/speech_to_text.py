@@ -0,0 +1,210 @@
+import os
+import json
+import time
+import asyncio
+import threading
+from contextlib import aclosing
+from concurrent.futures import ThreadPoolExecutor
+from metrics import histogram
+from structured_log import get_logger
+
+# Voice expenses are transcribed on the server with a local engine. ffmpeg
+# decodes and resamples the upload to 16 kHz mono PCM, which is read and
+# recognized in fixed-size chunks, so memory stays flat however long the
+# recording is and transcript segments come out while decoding continues.
+STT_ENGINE = os.environ.get("STT_ENGINE", "vosk")  # "vosk" or "stub"
+VOSK_MODEL_PATH = os.environ.get("VOSK_MODEL_PATH", "models/vosk-model-small-en-in-0.4")
+FFMPEG_BINARY = os.environ.get("FFMPEG_BINARY", "ffmpeg")
+STT_SAMPLE_RATE = 16000
+STT_CHUNK_SECONDS = float(os.environ.get("STT_CHUNK_SECONDS", 2.0))
+# Concurrent ffmpeg decodes and recognizer threads per process
+AUDIO_DECODE_WORKERS = int(os.environ.get("AUDIO_DECODE_WORKERS", 2))
+STT_WORKERS = int(os.environ.get("STT_WORKERS", 2))
+STT_STUB_TRANSCRIPT = os.environ.get(
+    "STT_STUB_TRANSCRIPT",
+    "bought two kilos of rice for one hundred twenty rupees at fresh mart. "
+    "paid fifty five rupees for milk. "
+    "bought bath soap for seventy rupees",
+)
+
+speech_to_text_seconds = histogram("speech_to_text_seconds", "Wall time to decode and transcribe one recording")
+speech_to_text_first_segment_seconds = histogram(
+    "speech_to_text_first_segment_seconds", "Time until the first transcript segment of a recording"
+)
+
+log = get_logger("speech_to_text")
+_executor = None
+_decode_slots = None
+
+
+class SpeechToTextError(Exception):
+    """The recording could not be decoded or transcribed."""
+
+
+class SpeechToTextEngine:
+    """
+    Base class for local speech-to-text engines. new_stream() returns a
+    recognizer for one recording: accept(pcm) takes the next chunk of 16-bit
+    mono PCM and returns the transcript segments finished by it, finish()
+    returns whatever is left. Both run on the STT worker threads.
+    """
+    name = "base"
+
+    @property
+    def available(self) -> bool:
+        return True
+
+    def new_stream(self, sample_rate: int):
+        raise NotImplementedError
+
+
+class _VoskStream:
+    def __init__(self, recognizer):
+        self.recognizer = recognizer
+
+    def accept(self, pcm: bytes) -> list:
+        # True once Vosk detects the end of an utterance (a pause)
+        if self.recognizer.AcceptWaveform(pcm):
+            return _segments(self.recognizer.Result())
+        return []
+
+    def finish(self) -> list:
+        return _segments(self.recognizer.FinalResult())
+
+
+def _segments(result_json: str) -> list:
+    text = json.loads(result_json).get("text", "").strip()
+    return [text] if text else []
+
+
+class VoskEngine(SpeechToTextEngine):
+    """Offline Kaldi models via the optional `vosk` package; the model is loaded once per process."""
+    name = "vosk"
+
+    def __init__(self, model_path: str = VOSK_MODEL_PATH):
+        self.model_path = model_path
+        self._model = None
+        self._lock = threading.Lock()
+
+    @property
+    def available(self) -> bool:
+        try:
+            import vosk  # noqa: F401
+        except ImportError:
+            return False
+        return os.path.isdir(self.model_path)
+
+    def new_stream(self, sample_rate: int):
+        from vosk import Model, KaldiRecognizer
+
+        with self._lock:
+            if self._model is None:
+                self._model = Model(self.model_path)
+        return _VoskStream(KaldiRecognizer(self._model, sample_rate))
+
+
+class _StubStream:
+    def __init__(self, sentences):
+        self.sentences = list(sentences)
+
+    def accept(self, pcm: bytes) -> list:
+        return [self.sentences.pop(0)] if self.sentences else []
+
+    def finish(self) -> list:
+        remaining, self.sentences = self.sentences, []
+        return remaining
+
+
+class StubEngine(SpeechToTextEngine):
+    """Offline stand-in: one sentence of STT_STUB_TRANSCRIPT per audio chunk."""
+    name = "stub"
+
+    def new_stream(self, sample_rate: int):
+        return _StubStream(s.strip() for s in STT_STUB_TRANSCRIPT.split(".") if s.strip())
+
+
+ENGINES = {"vosk": VoskEngine, "stub": StubEngine}
+_engine = None
+
+
+def get_engine() -> SpeechToTextEngine:
+    global _engine
+    if _engine is None:
+        try:
+            _engine = ENGINES[STT_ENGINE]()
+        except KeyError:
+            raise ValueError(f"Unknown speech-to-text engine '{STT_ENGINE}', expected one of {sorted(ENGINES)}")
+    return _engine
+
+
+def _get_pools():
+    global _executor, _decode_slots
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=STT_WORKERS, thread_name_prefix="speech-to-text")
+        _decode_slots = asyncio.Semaphore(AUDIO_DECODE_WORKERS)
+    return _executor, _decode_slots
+
+
+def shutdown_speech_pool():
+    global _executor, _decode_slots
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = _decode_slots = None
+
+
+async def decode_pcm(path: str, sample_rate: int = STT_SAMPLE_RATE, chunk_seconds: float = STT_CHUNK_SECONDS):
+    """
+    Yields the recording as 16-bit mono PCM at sample_rate, chunk_seconds at a
+    time, from an ffmpeg process. Closing the generator early kills ffmpeg.
+    """
+    _, slots = _get_pools()
+    chunk_bytes = int(sample_rate * chunk_seconds) * 2
+    async with slots:
+        try:
+            process = await asyncio.create_subprocess_exec(
+                FFMPEG_BINARY, "-nostdin", "-v", "error", "-i", path,
+                "-ac", "1", "-ar", str(sample_rate), "-f", "s16le", "-",
+                stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE,
+            )
+        except FileNotFoundError:
+            raise SpeechToTextError(f"{FFMPEG_BINARY} not found; install ffmpeg to decode audio")
+        try:
+            while True:
+                try:
+                    chunk = await process.stdout.readexactly(chunk_bytes)
+                except asyncio.IncompleteReadError as e:
+                    if e.partial:
+                        yield e.partial
+                    break
+                yield chunk
+            stderr = await process.stderr.read()
+            if await process.wait() != 0:
+                raise SpeechToTextError(f"Could not decode audio: {stderr.decode(errors='replace').strip()}")
+        finally:
+            if process.returncode is None:
+                process.kill()
+                await process.wait()
+
+
+async def transcribe(path: str):
+    """Yields transcript segments of a recording as soon as the engine finalizes them."""
+    executor, _ = _get_pools()
+    loop = asyncio.get_running_loop()
+    engine = get_engine()
+    stream = await loop.run_in_executor(executor, engine.new_stream, STT_SAMPLE_RATE)
+
+    started = time.perf_counter()
+    segment_count = 0
+    async with aclosing(decode_pcm(path)) as chunks:
+        async for pcm in chunks:
+            for segment in await loop.run_in_executor(executor, stream.accept, pcm):
+                if not segment_count:
+                    speech_to_text_first_segment_seconds.labels(engine=engine.name).observe(time.perf_counter() - started)
+                segment_count += 1
+                yield segment
+    for segment in await loop.run_in_executor(executor, stream.finish):
+        segment_count += 1
+        yield segment
+    seconds = time.perf_counter() - started
+    speech_to_text_seconds.labels(engine=engine.name).observe(seconds)
+    log.info("recording transcribed", extra={"engine": engine.name, "segments": segment_count, "ms": round(seconds * 1000, 1)})
@@ -0,0 +1,84 @@
+import os
+import sys
+import json
+import queue
+import atexit
+import random
+import logging
+import datetime
+from logging.handlers import QueueHandler, QueueListener
+from metrics import counter
+
+# One JSON object per line on stdout. Records are queued by the request path
+# and written by a background thread, so a slow stdout never blocks the event
+# loop; when the queue is full records are dropped (and counted) instead.
+LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO").upper()
+# Fraction of DEBUG/INFO records kept; warnings and errors are always logged
+LOG_SAMPLE_RATE = float(os.environ.get("LOG_SAMPLE_RATE", 1.0))
+LOG_QUEUE_SIZE = int(os.environ.get("LOG_QUEUE_SIZE", 10000))
+
+log_records_dropped = counter("log_records_dropped", "Log records dropped by sampling or a full log queue")
+
+# Attributes every LogRecord has; anything else came in through `extra=` and is a field
+_RECORD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "taskName"}
+_listener = None
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "ts": datetime.datetime.utcfromtimestamp(record.created).isoformat(timespec="milliseconds") + "Z",
+            "level": record.levelname.lower(),
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        entry.update({key: value for key, value in vars(record).items() if key not in _RECORD_ATTRS})
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class SampleFilter(logging.Filter):
+    def __init__(self, rate):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING or self.rate >= 1.0 or random.random() < self.rate:
+            return True
+        log_records_dropped.labels(reason="sampled").inc()
+        return False
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    """Never waits on a full queue; prepare() renders the JSON line before it is queued."""
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            log_records_dropped.labels(reason="queue_full").inc()
+
+
+def setup_logging():
+    """Routes the service loggers through the JSON queue handler (idempotent)."""
+    global _listener
+    if _listener is not None:
+        return
+    records = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+    _listener = QueueListener(records, logging.StreamHandler(sys.stdout))
+    _listener.start()
+    atexit.register(_listener.stop)
+
+    handler = NonBlockingQueueHandler(records)
+    handler.setFormatter(JsonFormatter())
+    handler.addFilter(SampleFilter(LOG_SAMPLE_RATE))
+    root = logging.getLogger("budget")
+    root.setLevel(LOG_LEVEL)
+    root.addHandler(handler)
+    root.propagate = False
+
+
+def get_logger(name: str) -> logging.Logger:
+    setup_logging()
+    return logging.getLogger(f"budget.{name}")
@@ -0,0 +1,100 @@
+"""
+Backend tests. Run from backend/:
+
+    pip install -r requirements-dev.txt
+    python -m pytest -q
+
+By default the database is mongomock-motor (in memory). With TEST_MONGO_URL
+set (e.g. mongodb://localhost:27017) the tests use that server instead, in the
+scratch database "budget-planner-test", and the tests marked `mongod`
+(explain plans, pipelines mongomock cannot run) run as well.
+"""
+import os
+import sys
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+TEST_MONGO_URL = os.environ.get("TEST_MONGO_URL")
+
+os.environ["MODEL_BACKEND"] = "stub"
+os.environ["STUB_LATENCY_SECONDS"] = "0"
+os.environ["MONGO_DB_NAME"] = "budget-planner-test"
+os.environ["LOG_LEVEL"] = "WARNING"
+os.environ["MONGO_URL"] = TEST_MONGO_URL or "mongodb://localhost:27017"
+
+if not TEST_MONGO_URL:
+    import motor.motor_asyncio
+    import mongomock.collection
+    import mongomock_motor
+
+    motor.motor_asyncio.AsyncIOMotorClient = mongomock_motor.AsyncMongoMockClient
+
+    # pymongo 4.9+ passes sort= to bulk updates, which mongomock does not accept yet
+    def _without_sort(method):
+        def wrapper(self, *args, sort=None, **kwargs):
+            return method(self, *args, **kwargs)
+        return wrapper
+
+    for _name in ("add_update", "add_replace"):
+        setattr(mongomock.collection.BulkOperationBuilder, _name,
+                _without_sort(getattr(mongomock.collection.BulkOperationBuilder, _name)))
+
+    # mongomock has no $toDate (the /expenses pipeline uses it on bill ObjectIds) and no
+    # $convert (the forecast uses it, to "double" only, on quantities and prices)
+    import mongomock.aggregate
+    from bson import ObjectId
+
+    _convert = mongomock.aggregate._Parser._handle_type_convertion_operator
+
+    def _parse_or_none(parser, expression):
+        try:
+            return parser.parse(expression)
+        except KeyError:
+            return None
+
+    def _extra_conversions(self, operator, values):
+        if operator == "$toDate":
+            value = self.parse(values)
+            return value.generation_time.replace(tzinfo=None) if isinstance(value, ObjectId) else value
+        if operator == "$convert" and values.get("to") == "double":
+            value = _parse_or_none(self, values["input"])
+            if value is None:
+                return values.get("onNull")
+            try:
+                return float(value)
+            except (TypeError, ValueError):
+                return values.get("onError")
+        return _convert(self, operator, values)
+
+    mongomock.aggregate.type_convertion_operators.extend(["$toDate", "$convert"])
+    mongomock.aggregate._Parser._handle_type_convertion_operator = _extra_conversions
+
+
+def pytest_configure(config):
+    config.addinivalue_line("markers", "mongod: needs a real MongoDB server (set TEST_MONGO_URL)")
+
+
+def pytest_collection_modifyitems(config, items):
+    if TEST_MONGO_URL:
+        return
+    skip = pytest.mark.skip(reason="needs a real MongoDB server; set TEST_MONGO_URL")
+    for item in items:
+        if "mongod" in item.keywords:
+            item.add_marker(skip)
+
+
+@pytest.fixture(scope="session")
+def anyio_backend():
+    # One event loop for the whole run: the Motor client is created once, at import
+    return "asyncio"
+
+
+@pytest.fixture
+async def db():
+    """The scratch database, emptied before each test."""
+    from database import database
+
+    for name in await database.list_collection_names():
+        await database[name].delete_many({})
+    return database
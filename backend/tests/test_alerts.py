@@ -0,0 +1,114 @@
+import pytest
+from bson import ObjectId
+import alerts
+from alerts import empty_stats, score_and_fold
+
+pytestmark = pytest.mark.anyio
+
+USER = "scored@example.com"
+
+
+def bill(store, bill_date, *items, total=None):
+    return {
+        "_id": ObjectId(), "user_id": USER, "store_name": store, "bill_date": bill_date, "total_amount": total,
+        "items": [
+            {"_id": ObjectId(), "item_name": name, "quantity": quantity, "unit_price": unit_price, "category": category}
+            for name, quantity, unit_price, category in items
+        ],
+    }
+
+
+def kinds(raised):
+    return [(alert["kind"], alert["item_name"]) for alert in raised]
+
+
+def history(*bills):
+    stats = empty_stats(USER)
+    assert score_and_fold(stats, list(bills)) == []
+    return stats
+
+
+def test_outlier_in_a_category():
+    stats = history(*(
+        bill("Fresh Mart", f"2026-09-{day:02d}", ("Vegetables", 1, price, "Food"))
+        for day, price in enumerate((90.0, 100.0, 110.0, 100.0, 95.0, 105.0), start=1)
+    ))
+
+    # At a new store, so the bill total is not scored as well
+    raised = score_and_fold(stats, [bill("Spice House", "2026-10-01", ("Saffron", 1, 1000.0, "Food"))])
+
+    assert kinds(raised) == [("outlier", "Saffron")]
+    assert raised[0]["expected"] == 100.0
+
+
+def test_unit_price_of_an_item():
+    # Dairy spend varies widely, so only the price of milk itself stands out
+    stats = history(*(
+        bill("Fresh Mart", f"2026-09-{day:02d}", ("Milk", 1, 25.0, "Dairy"), ("Cheese", 1, 400.0, "Dairy"))
+        for day in range(1, 7)
+    ))
+
+    raised = score_and_fold(stats, [bill("Fresh Mart", "2026-10-01", ("Milk", 1, 100.0, "Dairy"))])
+
+    assert kinds(raised) == [("unit_price", "Milk")]
+    assert (raised[0]["amount"], raised[0]["expected"]) == (100.0, 25.0)
+
+
+def test_spike_in_a_store_total():
+    stats = history(*(
+        bill("Corner Shop", f"2026-09-{day:02d}", ("Bread", 1, 200.0 + day, "Food"))
+        for day in range(1, 7)
+    ))
+
+    # A category and item with no history: only the bill total can be scored
+    raised = score_and_fold(stats, [bill("Corner Shop", "2026-10-01", ("Television", 1, 2000.0, "Electronics"))])
+
+    assert kinds(raised) == [("spike", None)]
+
+
+def test_duplicate_bill():
+    stats = history(bill("Fresh Mart", "2026-10-01", ("Rice", 2, 60.0, "Food"), total=120.0))
+
+    raised = score_and_fold(stats, [bill("fresh mart", "2026-10-01", ("Rice", 2, 60.0, "Food"), total=120.0)])
+
+    assert kinds(raised) == [("duplicate", None)]
+    assert raised[0]["severity"] == "high"
+
+
+def test_ordinary_bill_raises_nothing():
+    stats = history(*(
+        bill("Fresh Mart", f"2026-09-{day:02d}", ("Rice", 1, 60.0 + day, "Food")) for day in range(1, 7)
+    ))
+    assert score_and_fold(stats, [bill("Fresh Mart", "2026-10-01", ("Rice", 1, 65.0, "Food"))]) == []
+
+
+class RacingStats:
+    """stats_collection whose first read is followed by another batch folding its bill first."""
+
+    def __init__(self, collection, concurrent_bill):
+        self.collection = collection
+        self.concurrent_bill = concurrent_bill
+
+    def __getattr__(self, name):
+        return getattr(self.collection, name)
+
+    async def find_one(self, *args, **kwargs):
+        doc = await self.collection.find_one(*args, **kwargs)
+        if self.concurrent_bill is not None:
+            concurrent, self.concurrent_bill = self.concurrent_bill, None
+            await alerts._score_user(USER, [concurrent])
+        return doc
+
+
+async def test_version_conflict_retries_the_fold(db, monkeypatch):
+    await alerts.score_new_bills([bill("Fresh Mart", "2026-10-01", ("Rice", 1, 60.0, "Food"))])
+    racing = RacingStats(alerts.stats_collection, bill("Fresh Mart", "2026-10-02", ("Milk", 1, 25.0, "Food")))
+    monkeypatch.setattr(alerts, "stats_collection", racing)
+
+    await alerts.score_new_bills([bill("Fresh Mart", "2026-10-03", ("Tea", 1, 50.0, "Food"))])
+
+    stats = await db["spending_stats"].find_one({"_id": USER})
+    # The first write lost the version race; the retry folded on top of the concurrent batch
+    assert stats["version"] == 3
+    assert stats["store"]["fresh mart"][0] == 3
+    assert sorted(stats["item"]) == ["milk", "rice", "tea"]
@@ -0,0 +1,15 @@
+import pytest
+from auth_utils import create_jwt_token, get_current_user, invalidate_cached_user
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_cached_user_is_not_shared_with_callers(db):
+    await db["users"].insert_one({"email": "someone@example.com", "financialDetails": {"income": "30000"}})
+    token = create_jwt_token({"sub": "someone@example.com"})
+
+    user = await get_current_user(token)
+    user["financialDetails"]["income"] = "0"
+
+    assert (await get_current_user(token))["financialDetails"]["income"] == "30000"
+    invalidate_cached_user("someone@example.com")
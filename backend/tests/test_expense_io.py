@@ -0,0 +1,52 @@
+import io
+import random
+import pytest
+from benchmark import synthetic_bills
+from expense_io import export_chunks, import_file
+
+pytestmark = pytest.mark.anyio
+
+OWNER = "owner@example.com"
+OTHER = "other@example.com"
+
+
+async def export(user_id, fmt):
+    data = io.BytesIO()
+    async for chunk in export_chunks(user_id, fmt):
+        data.write(chunk)
+    data.seek(0)
+    return data
+
+
+async def test_blank_quantity_defaults_to_one_and_bad_rows_are_reported(db):
+    csv = (
+        "store_name,bill_date,item_name,quantity,unit_price,category\n"
+        "Fresh Mart,2026-10-01,Milk,,25,Food\n"
+        "Fresh Mart,2026-10-01,Bread,x,30,Food\n"
+        "Corner Grocer,10/01/2026,Tea,1,50,Food\n"
+    )
+    result = await import_file(OWNER, io.BytesIO(csv.encode()), "csv")
+
+    assert result["imported_items"] == 1
+    assert [error["row"] for error in result["errors"]] == [2, 3]
+    bill = await db["bills"].find_one({"user_id": OWNER})
+    assert bill["items"][0]["quantity"] == 1.0
+
+
+@pytest.mark.parametrize("fmt", ["csv", "parquet", "arrow"])
+async def test_reimporting_own_export_is_a_no_op(db, fmt):
+    if fmt != "csv":
+        pytest.importorskip("pyarrow")
+    await db["bills"].insert_many(synthetic_bills(random.Random(0), OWNER, 300))
+    bills = await db["bills"].count_documents({"user_id": OWNER})
+
+    result = await import_file(OWNER, await export(OWNER, fmt), fmt)
+    assert result["imported_bills"] == 0
+    assert result["skipped_bills"] == bills
+    assert await db["bills"].count_documents({"user_id": OWNER}) == bills
+
+    # Into another account it is imported once, then skipped by its bill_hash
+    result = await import_file(OTHER, await export(OWNER, fmt), fmt)
+    assert (result["imported_bills"], result["imported_items"]) == (bills, 300)
+    result = await import_file(OTHER, await export(OWNER, fmt), fmt)
+    assert (result["imported_bills"], result["skipped_bills"]) == (0, bills)
@@ -0,0 +1,98 @@
+import datetime
+import httpx
+import pytest
+from bson import ObjectId
+import insights
+from auth_utils import get_current_user
+from bills import make_bill
+from database import bills_collection
+from rollups import record_new_bills, get_monthly_rollups
+
+pytestmark = pytest.mark.anyio
+
+USER = {"email": "editor@example.com"}
+OTHER = "someone-else@example.com"
+
+
+@pytest.fixture
+async def client(db):
+    insights.app.dependency_overrides[get_current_user] = lambda: USER
+    transport = httpx.ASGITransport(app=insights.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as http:
+        yield http
+    insights.app.dependency_overrides.clear()
+
+
+async def insert(user_id, *items, bill_date="2026-10-01"):
+    bill = make_bill({
+        "user_id": user_id, "store_name": "Fresh Mart", "bill_date": bill_date, "created_at": datetime.datetime.utcnow(),
+    }, [{"item_name": name, "quantity": 1, "unit_price": price, "category": "Food"} for name, price in items])
+    await bills_collection.insert_one(bill)
+    await record_new_bills([bill])
+    return bill
+
+
+def ids(bill):
+    return [str(item["_id"]) for item in bill["items"]]
+
+
+async def bulk(http, *operations):
+    response = await http.post("/expenses/bulk", json={"operations": list(operations)})
+    assert response.status_code == 200
+    return response.json()
+
+
+async def test_mixed_updates_and_deletes(client, db):
+    rice, milk, tea = ids(await insert(USER["email"], ("Rice", 100.0), ("Milk", 30.0), ("Tea", 50.0)))
+
+    result = await bulk(
+        client,
+        {"op": "update", "id": rice, "data": {"unit_price": 120.0}},
+        {"op": "update", "id": rice, "data": {"item_name": "Basmati"}},
+        {"op": "delete", "id": milk},
+        # Deleted as well, so not reported as updated
+        {"op": "update", "id": milk, "data": {"unit_price": 1.0}},
+        # No editable field: nothing to do, nothing reported
+        {"op": "update", "id": tea, "data": {"total_amount": 5}},
+    )
+
+    assert [(row["id"], row["item_name"], row["unit_price"]) for row in result["updated"]] == [(rice, "Basmati", 120.0)]
+    assert result["deleted"] == [milk]
+    assert result["not_found"] == []
+    bill = await db["bills"].find_one({"user_id": USER["email"]})
+    assert [item["item_name"] for item in bill["items"]] == ["Basmati", "Tea"]
+    rollups = await get_monthly_rollups(USER["email"])
+    assert [(row["total"], row["count"]) for row in rollups] == [(170.0, 2)]
+
+
+async def test_deleting_every_item_drops_the_bill(client, db):
+    first, second = ids(await insert(USER["email"], ("Rice", 100.0), ("Milk", 30.0)))
+    kept = ids(await insert(USER["email"], ("Soap", 40.0), bill_date="2026-11-02"))
+
+    result = await bulk(client, {"op": "delete", "id": first}, {"op": "delete", "id": second})
+
+    assert sorted(result["deleted"]) == sorted([first, second])
+    assert await db["bills"].count_documents({"user_id": USER["email"]}) == 1
+    assert [row["id"] for row in (await client.get("/expenses")).json()] == kept
+    # The October rollup reached zero items and is removed
+    assert [row["month"] for row in await get_monthly_rollups(USER["email"])] == ["2026-11"]
+
+
+async def test_other_users_and_unknown_ids_are_not_found(client, db):
+    mine = ids(await insert(USER["email"], ("Rice", 100.0)))[0]
+    theirs = ids(await insert(OTHER, ("Milk", 30.0)))[0]
+    unknown = str(ObjectId())
+
+    result = await bulk(
+        client,
+        {"op": "update", "id": theirs, "data": {"unit_price": 1.0}},
+        {"op": "delete", "id": unknown},
+        {"op": "delete", "id": "not-an-id"},
+        {"op": "update", "id": mine, "data": {"quantity": 2}},
+    )
+
+    assert [row["id"] for row in result["updated"]] == [mine]
+    assert result["deleted"] == []
+    assert result["not_found"] == ["not-an-id", theirs, unknown]
+    other_bill = await db["bills"].find_one({"user_id": OTHER})
+    assert other_bill["items"][0]["unit_price"] == 30.0
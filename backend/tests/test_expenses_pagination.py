@@ -0,0 +1,79 @@
+import json
+import datetime
+import httpx
+import pytest
+from bson import ObjectId
+import insights
+from auth_utils import get_current_user
+from bills import make_bill
+
+pytestmark = pytest.mark.anyio
+
+USER = {"email": "pager@example.com"}
+
+
+@pytest.fixture
+async def client(db):
+    insights.app.dependency_overrides[get_current_user] = lambda: USER
+    transport = httpx.ASGITransport(app=insights.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as http:
+        yield http
+    insights.app.dependency_overrides.clear()
+
+
+def bill(created_at, item_ids, quantity=1):
+    header = {"user_id": USER["email"], "store_name": "Fresh Mart", "bill_date": "2026-10-01", "input_type": "text"}
+    if created_at:
+        header["created_at"] = created_at
+    return make_bill(header, [
+        {"_id": item_id, "item_name": f"Item {n}", "quantity": quantity, "unit_price": 10.0, "category": "Food"}
+        for n, item_id in enumerate(item_ids)
+    ])
+
+
+async def all_pages(http, limit):
+    ids, after = [], None
+    while True:
+        params = {"limit": limit, **({"after": after} if after else {})}
+        response = await http.get("/expenses", params=params)
+        assert response.status_code == 200
+        ids += [row["id"] for row in response.json()]
+        after = response.headers.get("X-Next-Cursor")
+        if not after:
+            return ids
+
+
+async def test_pages_return_every_row_once_in_item_id_order(client, db):
+    created_at = datetime.datetime(2026, 10, 1, 9, 30)
+    # Items stored out of _id order, as bulk edits and re-inserted items leave them
+    items = [ObjectId() for _ in range(5)]
+    shuffled = bill(created_at, [items[3], items[0], items[4], items[1], items[2]])
+    # Same created_at, a later bill _id
+    sibling = bill(created_at, [ObjectId(), ObjectId()])
+    # No created_at: ordered by the time in its _id (now), so after the dated bills
+    undated = bill(None, [ObjectId(), ObjectId(), ObjectId()])
+    await db["bills"].insert_many([undated, sibling, shuffled])
+
+    expected = [str(i) for i in items] + [str(item["_id"]) for b in (sibling, undated) for item in b["items"]]
+    for limit in (1, 2, 3, 4, 100):
+        assert await all_pages(client, limit) == expected
+
+
+async def test_cursor_for_a_row_without_created_at(client, db):
+    undated = bill(None, [ObjectId(), ObjectId()])
+    await db["bills"].insert_one(undated)
+
+    response = await client.get("/expenses", params={"limit": 1})
+    assert [row["id"] for row in response.json()] == [str(undated["items"][0]["_id"])]
+
+    response = await client.get("/expenses", params={"limit": 1, "after": response.headers["X-Next-Cursor"]})
+    assert [row["id"] for row in response.json()] == [str(undated["items"][1]["_id"])]
+
+
+async def test_stream_coerces_numbers(client, db):
+    await db["bills"].insert_one(bill(datetime.datetime(2026, 10, 1), [ObjectId()], quantity="2"))
+
+    response = await client.get("/expenses", params={"stream": "true"})
+    rows = [json.loads(line) for line in response.text.splitlines()]
+    assert rows[0]["quantity"] == 2.0
+    assert rows[0]["unit_price"] == 10.0
@@ -0,0 +1,95 @@
+import datetime
+import httpx
+import pytest
+import family
+import insights
+import user
+from auth_utils import get_current_user
+from bills import make_bill
+from database import users_collection, bills_collection
+
+pytestmark = pytest.mark.anyio
+
+CAREGIVER = "caregiver@example.com"
+MOTHER = "mother@example.com"
+FATHER = "father@example.com"
+STRANGER = "stranger@example.com"
+
+
+@pytest.fixture
+async def clients(db, monkeypatch):
+    monkeypatch.setattr(family, "_overview_cache", family.TTLCache(maxsize=16, ttl=60))
+    for email, first_name in ((CAREGIVER, "Asha"), (MOTHER, "Lata"), (FATHER, "Ravi"), (STRANGER, "Sam")):
+        await users_collection.insert_one({"email": email, "firstName": first_name, "financialDetails": {"income": "30000"}})
+    await bills_collection.insert_one(make_bill({
+        "user_id": MOTHER, "store_name": "Fresh Mart", "bill_date": datetime.date.today().isoformat(),
+        "created_at": datetime.datetime.utcnow(),
+    }, [{"item_name": "Rice", "quantity": 2, "unit_price": 60.0, "category": "Food"}]))
+
+    signed_in = {}
+
+    async def current_user():
+        return await users_collection.find_one({"email": signed_in["email"]})
+
+    def as_user(email):
+        signed_in["email"] = email
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=user.app), base_url="http://test") as users_http, \
+            httpx.AsyncClient(transport=httpx.ASGITransport(app=insights.app), base_url="http://test") as insights_http:
+        for app in (user.app, insights.app):
+            app.dependency_overrides[get_current_user] = current_user
+        yield as_user, users_http, insights_http
+    for app in (user.app, insights.app):
+        app.dependency_overrides.clear()
+
+
+async def overview(as_user, insights_http, email):
+    as_user(email)
+    response = await insights_http.get("/family/overview")
+    assert response.status_code == 200
+    return response.json()["dependents"]
+
+
+async def test_caregiver_sees_only_dependents_who_granted_access(clients):
+    as_user, users_http, insights_http = clients
+    as_user(MOTHER)
+    assert (await users_http.post("/family/grants", json={"email": CAREGIVER})).status_code == 201
+    as_user(FATHER)
+    assert (await users_http.post("/family/grants", json={"email": STRANGER})).status_code == 201
+
+    dependents = await overview(as_user, insights_http, CAREGIVER)
+    assert [dependent["email"] for dependent in dependents] == [MOTHER]
+    assert dependents[0]["firstName"] == "Lata"
+    assert dependents[0]["forecast"]["month_to_date"] == 120.0
+
+
+async def test_revoke_takes_effect_despite_the_cached_overview(clients):
+    as_user, users_http, insights_http = clients
+    as_user(MOTHER)
+    await users_http.post("/family/grants", json={"email": CAREGIVER})
+    as_user(FATHER)
+    await users_http.post("/family/grants", json={"email": CAREGIVER})
+    assert [d["email"] for d in await overview(as_user, insights_http, CAREGIVER)] == [FATHER, MOTHER]
+
+    as_user(MOTHER)
+    assert (await users_http.delete(f"/family/grants/{CAREGIVER}")).status_code == 200
+
+    assert [d["email"] for d in await overview(as_user, insights_http, CAREGIVER)] == [FATHER]
+
+
+async def test_non_grantee_gets_an_empty_overview(clients):
+    as_user, users_http, insights_http = clients
+    as_user(MOTHER)
+    await users_http.post("/family/grants", json={"email": CAREGIVER})
+
+    assert await overview(as_user, insights_http, STRANGER) == []
+
+
+async def test_grant_does_not_reveal_whether_the_caregiver_is_registered(clients):
+    as_user, users_http, insights_http = clients
+    as_user(MOTHER)
+    registered = await users_http.post("/family/grants", json={"email": CAREGIVER})
+    unregistered = await users_http.post("/family/grants", json={"email": "nobody@example.com"})
+
+    assert (registered.status_code, unregistered.status_code) == (201, 201)
+    assert registered.json()["message"] == unregistered.json()["message"]
@@ -0,0 +1,73 @@
+import datetime
+import pytest
+from bills import make_bill
+from database import users_collection, bills_collection, alert_collection
+from forecast import forecast_all, forecast_user, record_overshoot_alerts
+
+pytestmark = pytest.mark.anyio
+
+# 10 days into a 31-day month: 22 days left, today included
+TODAY = datetime.date(2026, 10, 10)
+STEADY = "steady@example.com"
+SPENDER = "spender@example.com"
+
+
+def bill(user_id, bill_date, category, amount):
+    return make_bill({"user_id": user_id, "store_name": "Fresh Mart", "bill_date": bill_date}, [
+        {"item_name": category, "quantity": 2, "unit_price": amount / 2, "category": category},
+    ])
+
+
+@pytest.fixture
+async def spending(db):
+    await users_collection.insert_many([
+        {"email": STEADY, "financialDetails": {"income": "10000"}},
+        {"email": SPENDER, "financialDetails": {"income": "Rs 2,000"}},
+    ])
+    await bills_collection.insert_many([
+        bill(STEADY, "2026-09-10", "Food", 600.0),
+        bill(STEADY, "2026-10-02", "Food", 1000.0),
+        bill(STEADY, "2026-10-05", "Travel", 500.0),
+        bill(SPENDER, "2026-10-03", "Food", 1500.0),
+        # Outside the month and the 90-day window
+        bill(SPENDER, "2026-06-01", "Food", 9999.0),
+    ])
+
+
+async def test_projection_blends_this_month_with_history(spending):
+    forecast = await forecast_user({"email": STEADY, "financialDetails": {"income": "10000"}}, TODAY)
+
+    # Food: this month 1000 over 10 days, history 600 over the 21 days since the
+    # first bill; the month is 10/31 done, so rate = 10/31 * 100 + 21/31 * 600/21
+    food_rate = 10 / 31 * 100 + 21 / 31 * 600 / 21
+    # Travel has no history: rate = 10/31 * 50
+    travel_rate = 10 / 31 * 50
+    assert forecast["month_to_date"] == 1500.0
+    assert forecast["by_category"] == [
+        {"category": "Food", "month_to_date": 1000.0, "daily_rate": round(food_rate, 2),
+         "projected": round(1000 + food_rate * 21, 2)},
+        {"category": "Travel", "month_to_date": 500.0, "daily_rate": round(travel_rate, 2),
+         "projected": round(500 + travel_rate * 21, 2)},
+    ]
+    assert forecast["projected_total"] == round(1500 + (food_rate + travel_rate) * 21, 2) == 2922.58
+    assert forecast["remaining_budget"] == 8500.0
+    assert forecast["daily_budget"] == round(8500 / 22, 2)
+    assert forecast["on_track"] is True
+
+
+async def test_nightly_run_raises_one_overshoot_alert(spending):
+    for _ in range(2):
+        forecasts = await forecast_all(TODAY)
+        assert await record_overshoot_alerts(forecasts) == 1
+
+    by_user = {entry["user_id"]: entry for entry in forecasts}
+    # No history: 1500 in 10 days is 150 a day for the 21 days left
+    assert by_user[SPENDER]["projected_total"] == 4650.0
+    assert by_user[SPENDER]["projected_overshoot"] == 2650.0
+    assert by_user[SPENDER]["daily_budget"] == round(500 / 22, 2)
+
+    alerts = await alert_collection.find({}).to_list(length=None)
+    assert len(alerts) == 1
+    assert (alerts[0]["user_id"], alerts[0]["kind"], alerts[0]["month"]) == (SPENDER, "overshoot", "2026-10")
+    assert alerts[0]["severity"] == "high"
+    assert alerts[0]["dismissed"] is False
@@ -0,0 +1,139 @@
+import json
+import asyncio
+import datetime
+import httpx
+import pytest
+from starlette.requests import Request
+import model_backends
+import insight_cache
+import insights
+from auth_utils import get_current_user
+from model_backends import StubInsightBackend
+
+pytestmark = pytest.mark.anyio
+
+USER = {"email": "streamer@example.com", "financialGoals": "Save 5000", "financialDetails": {"income": "30000"}}
+# A fence split across chunks must not leak into the stream
+CHUNKS = ["``", "`json\n", "**Savings**\n", "- Buy rice in bulk.", "\n`", "``"]
+
+
+class CountingBackend(StubInsightBackend):
+    def __init__(self):
+        super().__init__("insight", timeout=5, max_concurrency=8, latency=0)
+        self.calls = 0
+        self.closed = 0
+
+    async def _stream(self, contents):
+        self.calls += 1
+        try:
+            for chunk in CHUNKS:
+                await asyncio.sleep(0.01)
+                yield chunk
+        finally:
+            self.closed += 1
+
+
+@pytest.fixture
+async def client(db, monkeypatch):
+    backend = CountingBackend()
+    monkeypatch.setitem(model_backends._instances, "insight", backend)
+    monkeypatch.setattr(insight_cache, "_memory_cache", {})
+    insights.app.dependency_overrides[get_current_user] = lambda: USER
+    transport = httpx.ASGITransport(app=insights.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as http:
+        yield http, backend
+    insights.app.dependency_overrides.clear()
+
+
+def parse_events(body):
+    events = []
+    for block in body.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in block.splitlines())
+        events.append((lines["event"], json.loads(lines["data"])))
+    return events
+
+
+def test_visible_text_holds_back_partial_fences():
+    assert insight_cache.visible_text("tips `") == "tips "
+    assert insight_cache.visible_text("tips ``") == "tips "
+    assert insight_cache.visible_text("```js") == ""
+    assert insight_cache.visible_text("```json\nA") == "\nA"
+    assert insight_cache.visible_text("A ``", final=True) == "A ``"
+
+
+async def test_concurrent_streams_share_one_generation(client):
+    http, backend = client
+    responses = await asyncio.gather(*(http.get("/insights/stream") for _ in range(5)))
+
+    assert backend.calls == 1
+    for response in responses:
+        events = parse_events(response.text)
+        text = "".join(data["text"] for name, data in events if name == "chunk")
+        assert "`" not in text
+        assert text.strip() == "**Savings**\n- Buy rice in bulk."
+        assert events[-1][0] == "done"
+    entry = await insight_cache.get(USER["email"])
+    assert entry["insights"] == "**Savings**\n- Buy rice in bulk."
+
+
+async def test_stale_entry_is_sent_first_then_replaced(client):
+    http, backend = client
+    await insight_cache.put(USER["email"], {
+        "_id": USER["email"], "digest": "old", "insights": "Old advice",
+        "generated_at": datetime.datetime.utcnow(),
+    })
+
+    events = parse_events((await http.get("/insights/stream")).text)
+
+    assert events[0] == ("chunk", {"text": "Old advice"})
+    assert ("replace", {"text": "**Savings**\n- Buy rice in bulk."}) in events
+    assert events[-1][0] == "done" and events[-1][1]["cached"] is False
+    assert backend.calls == 1
+
+    # The refreshed entry is fresh now: served from the cache without a model call
+    events = parse_events((await http.get("/insights/stream")).text)
+    assert events[0] == ("chunk", {"text": "**Savings**\n- Buy rice in bulk."})
+    assert backend.calls == 1
+
+
+async def disconnected_stream():
+    async def receive():
+        return {"type": "http.disconnect"}
+
+    request = Request({"type": "http", "method": "GET", "path": "/insights/stream", "headers": []}, receive)
+    return await insights.stream_financial_insights(request, current_user=USER)
+
+
+async def test_last_disconnect_cancels_the_model_call(client):
+    http, backend = client
+    cancelled = model_backends.model_call_seconds.labels(backend="stub", role="insight", outcome="cancelled")
+    cancelled_before = cancelled.count
+    response = await disconnected_stream()
+
+    # The stream leaves after the first chunk; nobody else follows the refresh
+    async for _ in response.body_iterator:
+        pass
+
+    for _ in range(100):
+        if backend.closed:
+            break
+        await asyncio.sleep(0.01)
+    assert backend.calls == 1 and backend.closed == 1
+    assert cancelled.count == cancelled_before + 1
+    assert await insight_cache.get(USER["email"]) is None
+    assert insight_cache._refreshing == {}
+
+
+async def test_disconnect_keeps_a_refresh_others_follow(client):
+    http, backend = client
+    leaving = await disconnected_stream()
+    staying = asyncio.create_task(http.get("/insights/stream"))
+    await asyncio.sleep(0)
+
+    async for _ in leaving.body_iterator:
+        pass
+
+    events = parse_events((await staying).text)
+    assert events[-1][0] == "done"
+    assert backend.calls == 1
+    assert (await insight_cache.get(USER["email"]))["insights"] == "**Savings**\n- Buy rice in bulk."
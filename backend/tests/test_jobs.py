@@ -0,0 +1,114 @@
+import datetime
+import pytest
+from google.api_core.exceptions import ResourceExhausted
+import jobs
+from jobs import JobQueue
+from model_backends import StubExtractionBackend, ModelBackendError
+
+pytestmark = pytest.mark.anyio
+
+
+class FlakyBackend(StubExtractionBackend):
+    """Fails with a raw provider error `failures` times, then answers."""
+
+    def __init__(self, failures):
+        super().__init__("extraction", timeout=5, max_concurrency=1, latency=0)
+        self.failures = failures
+
+    async def _generate(self, contents):
+        if self.failures:
+            self.failures -= 1
+            raise ResourceExhausted("Quota exceeded for generate_content")
+        return await super()._generate(contents)
+
+
+async def test_provider_errors_are_wrapped():
+    with pytest.raises(ModelBackendError) as raised:
+        await FlakyBackend(failures=1).extract("prompt")
+    assert isinstance(raised.value.__cause__, ResourceExhausted)
+
+
+async def test_raw_provider_error_is_retried(db, monkeypatch):
+    monkeypatch.setattr(jobs, "PROCESS_JOB_BACKOFF_SECONDS", 0)
+    backend = FlakyBackend(failures=1)
+
+    async def handler(job):
+        return {"text": await backend.extract(job["prompt"])}
+
+    queue = JobQueue(db["process_jobs"], handler, workers=0, max_attempts=3)
+    job_id = await queue.submit("someone@example.com", {"prompt": "bill"})
+
+    await queue._run(await queue._claim())
+    job = await queue.get(job_id, "someone@example.com")
+    assert job["status"] == "queued"
+    assert "Quota exceeded" in job["error"]
+
+    await queue._run(await queue._claim())
+    job = await queue.get(job_id, "someone@example.com")
+    assert job["status"] == "succeeded"
+    assert job["attempts"] == 2
+    assert "Local Stub Mart" in job["result"]["text"]
+
+
+async def test_retries_stop_after_max_attempts(db, monkeypatch):
+    monkeypatch.setattr(jobs, "PROCESS_JOB_BACKOFF_SECONDS", 0)
+    backend = FlakyBackend(failures=5)
+
+    async def handler(job):
+        return await backend.extract("bill")
+
+    queue = JobQueue(db["process_jobs"], handler, workers=0, max_attempts=2)
+    job_id = await queue.submit("someone@example.com", {})
+    for _ in range(2):
+        await queue._run(await queue._claim())
+
+    job = await queue.get(job_id, "someone@example.com")
+    assert job["status"] == "failed"
+    assert job["finished_at"] <= datetime.datetime.utcnow()
+    assert await queue._claim() is None
+
+
+async def test_expired_lease_is_claimed_again(db, monkeypatch):
+    monkeypatch.setattr(jobs, "PROCESS_JOB_LEASE_SECONDS", 60)
+
+    async def handler(job):
+        return {"text": "done"}
+
+    queue = JobQueue(db["process_jobs"], handler, workers=0, max_attempts=3)
+    now = datetime.datetime.utcnow()
+    # One worker died a while ago; another holds a live lease
+    abandoned = await db["process_jobs"].insert_one({
+        "user_id": "someone@example.com", "status": "running", "attempts": 1,
+        "run_at": now - datetime.timedelta(minutes=10), "locked_at": now - datetime.timedelta(minutes=5),
+    })
+    await db["process_jobs"].insert_one({
+        "user_id": "someone@example.com", "status": "running", "attempts": 1,
+        "run_at": now - datetime.timedelta(minutes=20), "locked_at": now - datetime.timedelta(seconds=10),
+    })
+
+    job = await queue._claim()
+    assert job["_id"] == abandoned.inserted_id
+    assert job["attempts"] == 2
+    assert await queue._claim() is None
+
+    await queue._run(job)
+    job = await queue.get(str(abandoned.inserted_id), "someone@example.com")
+    assert job["status"] == "succeeded"
+
+
+async def test_job_that_keeps_losing_its_lease_fails(db, monkeypatch):
+    monkeypatch.setattr(jobs, "PROCESS_JOB_LEASE_SECONDS", 60)
+
+    async def handler(job):
+        raise AssertionError("must not run again")
+
+    queue = JobQueue(db["process_jobs"], handler, workers=0, max_attempts=2)
+    stale = datetime.datetime.utcnow() - datetime.timedelta(minutes=5)
+    inserted = await db["process_jobs"].insert_one({
+        "user_id": "someone@example.com", "status": "running", "attempts": 2, "run_at": stale, "locked_at": stale,
+    })
+
+    await queue._run(await queue._claim())
+    job = await queue.get(str(inserted.inserted_id), "someone@example.com")
+    assert job["status"] == "failed"
+    assert job["error"] == "Job lease expired"
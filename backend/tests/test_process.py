@@ -0,0 +1,30 @@
+import asyncio
+import datetime
+import pytest
+from bills import make_bill
+from image_text_processor import store_bills
+from rollups import get_monthly_rollups
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_cancelled_store_still_records_rollups(db):
+    bill = make_bill({
+        "user_id": "someone@example.com", "store_name": "Fresh Mart", "bill_date": "2026-10-01",
+        "total_amount": 120.0, "input_type": "text", "created_at": datetime.datetime.utcnow(),
+    }, [{"item_name": "Rice", "quantity": 2, "unit_price": 60.0, "category": "Food"}])
+
+    task = asyncio.create_task(store_bills([bill]))
+    await asyncio.sleep(0)
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+
+    # The shielded write carries on to the rollup update
+    for _ in range(100):
+        rollups = await get_monthly_rollups("someone@example.com")
+        if rollups:
+            break
+        await asyncio.sleep(0.01)
+    assert await db["bills"].count_documents({"user_id": "someone@example.com"}) == 1
+    assert [(row["month"], row["category"], row["total"]) for row in rollups] == [("2026-10", "Food", 120.0)]
@@ -0,0 +1,15 @@
+import pytest
+from database import ensure_indexes, check_query_plans
+
+pytestmark = [pytest.mark.anyio, pytest.mark.mongod]
+
+
+async def test_hot_queries_use_indexes(db):
+    await ensure_indexes()
+
+    # Raises AssertionError naming any query that falls back to COLLSCAN
+    stages = await check_query_plans()
+
+    assert set(stages) >= {"bills.expenses", "bills.expenses_after", "bills.summary", "bills.forecast", "bills.forecast_all"}
+    for name, seen in stages.items():
+        assert "IXSCAN" in seen, f"{name} does not use an index: {seen}"
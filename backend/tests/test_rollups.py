@@ -0,0 +1,119 @@
+from collections import defaultdict
+import httpx
+import pytest
+import insights
+from auth_utils import get_current_user
+from bills import make_bill
+from database import bills_collection
+from rollups import (
+    rollup_delta, bill_contributions, record_bill_change, record_bill_changes, record_new_bills,
+    get_monthly_rollups, compute_drift,
+)
+
+pytestmark = pytest.mark.anyio
+
+USER = "roller@example.com"
+
+
+def bill(bill_date, *items):
+    return make_bill({"user_id": USER, "store_name": "Fresh Mart", "bill_date": bill_date}, [
+        {"item_name": name, "quantity": quantity, "unit_price": unit_price, "category": category}
+        for name, quantity, unit_price, category in items
+    ])
+
+
+async def rollups():
+    return [(row["month"], row["category"], row["total"], row["count"]) for row in await get_monthly_rollups(USER)]
+
+
+def test_delta_of_an_edit():
+    before = bill("2026-10-03", ("Rice", 2, 60.0, "Food"), ("Soap", 1, 40.0, "Household"))
+    after = dict(before, items=[dict(before["items"][0], quantity="3"), before["items"][1]])
+
+    assert rollup_delta(before, after) == {("2026-10", "Food"): [60.0, 0]}
+    assert rollup_delta(before, before) == {}
+    # Moving the bill to another month moves its contributions
+    moved = dict(before, bill_date="2026-11-01")
+    assert rollup_delta(before, moved) == {
+        ("2026-10", "Food"): [-120.0, -1], ("2026-10", "Household"): [-40.0, -1],
+        ("2026-11", "Food"): [120.0, 1], ("2026-11", "Household"): [40.0, 1],
+    }
+
+
+async def test_inserts_and_edits_increment_the_rollups(db):
+    first = bill("2026-10-03", ("Rice", 2, 60.0, "Food"), ("Milk", 1, 25.0, "Food"))
+    second = bill("2026-10-09", ("Soap", 1, 40.0, "Household"), ("Pen", 1, None, "Stationery"))
+    await record_new_bills([first, second])
+    assert await rollups() == [("2026-10", "Food", 145.0, 2), ("2026-10", "Household", 40.0, 1)]
+
+    edited = dict(first, items=[dict(first["items"][0], unit_price=70.0), first["items"][1]])
+    await record_bill_change(USER, first, edited)
+    assert await rollups() == [("2026-10", "Food", 165.0, 2), ("2026-10", "Household", 40.0, 1)]
+
+
+async def test_rows_reaching_zero_items_are_removed(db):
+    first = bill("2026-10-03", ("Rice", 2, 60.0, "Food"))
+    second = bill("2026-10-09", ("Soap", 1, 40.0, "Household"))
+    await record_new_bills([first, second])
+
+    # Deleting the only Household item drops that row instead of leaving a zero
+    await record_bill_changes(USER, [(second, None)])
+    assert await rollups() == [("2026-10", "Food", 120.0, 1)]
+
+    await record_bill_change(USER, first, dict(first, items=[]))
+    assert await rollups() == []
+    assert await db["spending_rollups"].count_documents({}) == 0
+
+
+@pytest.fixture
+async def client(db):
+    insights.app.dependency_overrides[get_current_user] = lambda: {"email": USER}
+    transport = httpx.ASGITransport(app=insights.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as http:
+        yield http
+    insights.app.dependency_overrides.clear()
+
+
+async def edit_through_the_api(http):
+    first = bill("2026-10-03", ("Rice", 2, 60.0, "Food"), ("Soap", 1, 40.0, "Household"))
+    second = bill("2026-10-09", ("Milk", 1, 25.0, "Food"))
+    await bills_collection.insert_many([first, second])
+    await record_new_bills([first, second])
+
+    rice, soap = (str(item["_id"]) for item in first["items"])
+    assert (await http.put(f"/expenses/{rice}", json={"quantity": 3, "category": "Groceries"})).status_code == 200
+    # Store and date belong to the bill: this moves both of its items to November
+    assert (await http.put(f"/expenses/{soap}", json={"bill_date": "2026-11-01"})).status_code == 200
+    milk = str(second["items"][0]["_id"])
+    assert (await http.delete(f"/expenses/{milk}")).status_code == 200
+    return (await http.get("/expenses/monthly")).json()
+
+
+def by_key(monthly):
+    return {
+        (USER, month["month"], row["category"]): (row["total"], row["count"])
+        for month in monthly for row in month["by_category"]
+    }
+
+
+async def test_api_edits_keep_monthly_totals_equal_to_the_bills(client):
+    monthly = await edit_through_the_api(client)
+
+    # The same totals recomputed from the stored bills
+    expected = defaultdict(lambda: [0.0, 0])
+    async for stored in bills_collection.find({"user_id": USER}):
+        for (month, category), (total, count) in bill_contributions(stored).items():
+            expected[(USER, month, category)][0] += total
+            expected[(USER, month, category)][1] += count
+    assert by_key(monthly) == {key: tuple(value) for key, value in expected.items()}
+    assert by_key(monthly) == {(USER, "2026-11", "Groceries"): (180.0, 1), (USER, "2026-11", "Household"): (40.0, 1)}
+
+
+@pytest.mark.mongod
+async def test_api_edits_match_rollups_verify(client):
+    monthly = await edit_through_the_api(client)
+
+    # What `python rollups.py verify --user ...` checks
+    expected, drift = await compute_drift(USER)
+    assert drift == []
+    assert by_key(monthly) == expected
@@ -0,0 +1,55 @@
+import datetime
+import pytest
+import rule_extractor
+from rule_extractor import parse_expense
+
+TODAY = datetime.date(2026, 10, 15)  # a Thursday
+
+
+def test_simple_expense():
+    assert parse_expense("spent 200 on groceries at DMart yesterday", TODAY) == {
+        "store_name": "DMart",
+        "bill_date": "2026-10-14",
+        "total_amount": 200.0,
+        "items": [{"item_name": "Groceries", "quantity": 1.0, "unit_price": 200.0, "category": "Food"}],
+    }
+
+
+def test_quantity_and_spoken_numbers():
+    bill = parse_expense("bought two kg rice for one hundred twenty rupees", TODAY)
+    assert bill["items"] == [{"item_name": "Rice", "quantity": 2.0, "unit_price": 60.0, "category": "Food"}]
+    assert bill["total_amount"] == 120.0 and bill["store_name"] is None
+
+
+@pytest.mark.parametrize("text", [
+    "spent 50 more on milk",
+    "paid 100 for medicines, need more tomorrow",
+])
+def test_more_as_a_word_is_not_a_store(text):
+    bill = parse_expense(text, TODAY)
+    assert bill is not None
+    assert bill["store_name"] is None
+
+
+@pytest.mark.parametrize("text", ["spent 300 on groceries at more", "bought milk for 50 from More"])
+def test_more_after_at_or_from_is_the_store(text):
+    assert parse_expense(text, TODAY)["store_name"] == "More"
+
+
+@pytest.mark.parametrize("text", [
+    "bought 2 kg rice for 120 and milk for 50",  # two amounts
+    "spent 200 on groceries on 12/10",           # absolute date
+    "spent 200 on groceries last week",          # relative date the rules do not resolve
+    "paid 500 to Ramesh",                         # no category
+    "",
+])
+def test_unsure_texts_fall_back_to_the_model(text):
+    assert parse_expense(text, TODAY) is None
+
+
+def test_low_confidence_falls_back(monkeypatch):
+    # No spend verb and no currency around the amount: 0.25 + 0.3 + 0.15
+    assert parse_expense("rice 120", TODAY) is not None
+    monkeypatch.setattr(rule_extractor, "RULE_EXTRACTOR_MIN_CONFIDENCE", 0.9)
+    assert parse_expense("rice 120", TODAY) is None
+    assert parse_expense("spent 120 on rice", TODAY) is not None
@@ -1,34 +1,27 @@
 from dotenv import load_dotenv
 load_dotenv()
-from fastapi import FastAPI, HTTPException, Depends
-from fastapi.middleware.cors import CORSMiddleware
-from auth_utils import hash_password, verify_password, create_jwt_token, get_current_user
-from models import SignUpRequest, SignInRequest, TokenResponse, UserUpdate
+from fastapi import APIRouter, HTTPException, Depends
+from auth_utils import hash_password_async, verify_password_async, create_jwt_token, get_current_user, invalidate_cached_user, shutdown_password_pool
+from models import SignUpRequest, SignInRequest, TokenResponse, UserUpdate, FamilyGrantRequest, FamilyGrants
 from fastapi.security import OAuth2PasswordBearer
 from database import users_collection
+from service import create_app, create_indexes
+from family import grant_access, revoke_access, list_dependents, FamilyGrantError
+from structured_log import get_logger
 
 
 # --- Configuration ---
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="signin")
+log = get_logger("user")
 
-# --- Initialize FastAPI App ---
-app = FastAPI(
-    title="Data Processing Service",
-    description="Accepts text and/or an image, extracts item data with categories, and stores each item individually.",
-    version="1.4.2" # Updated version
-)
+# --- Router ---
+router = APIRouter()
 
-# --- CORS (Cross-Origin Resource Sharing) ---
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
+STARTUP_HOOKS = [create_indexes]
+SHUTDOWN_HOOKS = [shutdown_password_pool]
 
 
-@app.get("/auth/validate-email")
+@router.get("/auth/validate-email")
 async def validate_email(email: str):
     user = await users_collection.find_one({"email": email})
     if user:
@@ -36,13 +29,16 @@ async def validate_email(email: str):
     return {"available": True}
 
 
-@app.post("/auth/signup")
+@router.post("/auth/signup")
 async def signup(payload: SignUpRequest):
-    print(payload.dict())
+    # Never log the payload itself: it carries the plain-text password
+    log.info("signup", extra={"email": payload.email})
     existing_user = await users_collection.find_one({"email": payload.email})
     if existing_user:
         raise HTTPException(status_code=400, detail="Email already registered")
     
+    password_hash = await hash_password_async(payload.password)
+
     financialDetails = {
         "additionalDetails": payload.financialDetails.additionalDetails,
         "income": payload.financialDetails.income,
@@ -58,59 +54,48 @@ async def signup(payload: SignUpRequest):
         "address": payload.address,
         "email": payload.email,
         "phone": payload.phone,
-        "password": hash_password(payload.password),
+        "password": password_hash,
         "financialDetails": financialDetails,
         "financialGoals": payload.financialGoals
     }
     await users_collection.insert_one(user)
     return {"message": "User created successfully"}
 
-@app.post("/auth/signin", response_model=TokenResponse)
+@router.post("/auth/signin", response_model=TokenResponse)
 async def signin(payload: SignInRequest):
     user = await users_collection.find_one({"email": payload.email})
-    if not user or not verify_password(payload.password, user["password"]):
+    if not user or not await verify_password_async(payload.password, user["password"]):
         raise HTTPException(status_code=401, detail="Invalid credentials")
     
     token = create_jwt_token({"sub": user["email"]})
     return {"access_token": token}
 
-@app.get("/home")
+@router.get("/home")
 async def get_profile(current_user: dict = Depends(get_current_user)):
     return {
         "email": current_user["email"]
     }
 
 
-@app.get("/getUserData")
+@router.get("/getUserData")
 async def get_user_data(current_user: dict = Depends(get_current_user)):
-    # Access user's email or ID from JWT
-    user_email = current_user["email"]
-    
-    # Get user data from DB
-    user_data = await users_collection.find_one({"email": user_email}, {"_id": 0})  # exclude _id if not needed
+    # get_current_user already loaded the user document (without the password hash)
+    current_user.pop("_id", None)
+    return current_user
 
-    if not user_data:
-        raise HTTPException(status_code=404, detail="User not found")
 
-    return user_data
-
-
-@app.put("/updateUserData")
+@router.put("/updateUserData")
 async def update_user_data(
     user_update: UserUpdate,
     current_user: dict = Depends(get_current_user)
 ):
     user_email = current_user.get("email")
 
-    existing_user = await users_collection.find_one({"email": user_email})
-    if not existing_user:
-        raise HTTPException(status_code=404, detail="User not found")
-
     update_data = user_update.dict(exclude_unset=True)
 
     # If updating password, hash it before saving (optional, depends on your auth flow)
     if "password" in update_data:
-        # example: update_data["password"] = hash_password(update_data["password"])
+        # example: update_data["password"] = await hash_password_async(update_data["password"])
         pass
 
     # Update nested financialDetails if present
@@ -127,8 +112,49 @@ async def update_user_data(
         {"email": user_email},
         {"$set": update_data}
     )
+    invalidate_cached_user(user_email)
 
     if result.modified_count == 0:
         return {"message": "No changes were made to the user data."}
 
     return {"message": "User data updated successfully", "updated_fields": update_data}
+
+
+# --- Family sharing ---
+@router.get("/family/grants", response_model=FamilyGrants)
+async def get_family_grants(current_user: dict = Depends(get_current_user)):
+    return {
+        "caregivers": [grant["email"] for grant in current_user.get("familyGrants", [])],
+        "dependents": await list_dependents(current_user["email"]),
+    }
+
+
+@router.post("/family/grants", status_code=201)
+async def add_family_grant(grant: FamilyGrantRequest, current_user: dict = Depends(get_current_user)):
+    """Gives a family member read access to your spending, forecast and alerts."""
+    try:
+        added = await grant_access(current_user["email"], grant.email)
+    except FamilyGrantError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    invalidate_cached_user(current_user["email"])
+    if not added:
+        return {"message": "This family member already has access."}
+    return {"message": "Access granted", "email": grant.email}
+
+
+@router.delete("/family/grants/{caregiver_email}")
+async def remove_family_grant(caregiver_email: str, current_user: dict = Depends(get_current_user)):
+    if not await revoke_access(current_user["email"], caregiver_email):
+        raise HTTPException(status_code=404, detail="This family member does not have access.")
+    invalidate_cached_user(current_user["email"])
+    return {"message": "Access revoked", "email": caregiver_email}
+
+
+# --- Standalone app (development); production serves this router from main.py ---
+app = create_app(
+    routers=[router],
+    startup=STARTUP_HOOKS,
+    shutdown=SHUTDOWN_HOOKS,
+    title="User Service",
+    description="Sign-up, sign-in and profile data for the budget planner.",
+)
@@ -3,14 +3,24 @@ cd ./backend/
 # Start venv
 venv/Scripts/activate.bat &
 
-# Start image_text_processor on port 8000
-uvicorn image_text_processor:app --reload --port 8000 &
+if [ "$1" = "prod" ]; then
+    # Production: every service in one app, WEB_CONCURRENCY worker processes supervised by uvicorn
+    # (build the frontend with VITE_API_URL=http://<host>:${PORT:-8000})
+    exec uvicorn main:app --host "${HOST:-0.0.0.0}" --port "${PORT:-8000}" \
+        --workers "${WEB_CONCURRENCY:-4}" --timeout-graceful-shutdown 30
+else
+    # Development (the default): each service on its own port with auto-reload
+    # (the frontend's default API URLs point at these ports)
 
-# Start insights on port 8090
-uvicorn insights:app --reload --port 8090 &
+    # Start image_text_processor on port 8000
+    uvicorn image_text_processor:app --reload --port 8000 &
 
-# Start user on port 8050
-uvicorn user:app --reload --port 8050 &
+    # Start insights on port 8090
+    uvicorn insights:app --reload --port 8090 &
 
-# Optional: wait for all background processes to finish
-wait
\ No newline at end of file
+    # Start user on port 8050
+    uvicorn user:app --reload --port 8050 &
+
+    # Optional: wait for all background processes to finish
+    wait
+fi
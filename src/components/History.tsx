@@ -33,6 +33,7 @@ import { MoreVertical } from "lucide-react";
 import { toast } from "sonner";
 import { ScrollDownButton } from "./ScrollDownButton";
 import { useNavigate } from 'react-router-dom';
+import { INSIGHTS_API } from "@/lib/api";
 
 const ExpenseSchema = z.object({
   id: z.string(),
@@ -46,6 +47,14 @@ const ExpenseSchema = z.object({
 
 type Expense = z.infer<typeof ExpenseSchema>;
 
+// Edits and deletes are kept here until "Save changes" sends them in one POST /expenses/bulk
+type PendingChange =
+  | { op: "update"; data: Omit<Expense, "id"> }
+  | { op: "delete" };
+
+// Rows per /expenses page; the next page's cursor comes back in X-Next-Cursor
+const PAGE_SIZE = 200;
+
 const getAuthHeaders = () => {
   const token = localStorage.getItem("token");
   return {
@@ -59,6 +68,9 @@ export const History = () => {
   const [editExpense, setEditExpense] = useState<Expense | null>(null);
   const [deleteId, setDeleteId] = useState<string | null>(null);
   const [isEditDialogOpen, setIsEditDialogOpen] = useState(false);
+  const [pending, setPending] = useState<Record<string, PendingChange>>({});
+  const [nextCursor, setNextCursor] = useState<string | null>(null);
+  const pendingCount = Object.keys(pending).length;
   const navigate = useNavigate();
 
   const {
@@ -70,9 +82,11 @@ export const History = () => {
     resolver: zodResolver(ExpenseSchema),
   });
 
-  const fetchExpenses = async () => {
+  const fetchExpenses = async (after: string | null = null) => {
     try {
-      const res = await fetch("http://localhost:8090/expenses", {
+      const params = new URLSearchParams({ limit: String(PAGE_SIZE) });
+      if (after) params.set("after", after);
+      const res = await fetch(`${INSIGHTS_API}/expenses?${params}`, {
         headers: getAuthHeaders(),
       })
       if(res.status==401){
@@ -111,7 +125,8 @@ export const History = () => {
             })
             .filter((item): item is Expense => item !== null);
     
-          setExpenses(cleanedData);
+          setExpenses((current) => (after ? [...current, ...cleanedData] : cleanedData));
+          setNextCursor(res.headers.get("X-Next-Cursor"));
       }
     } catch (err) {
       console.error("Fetch error:", err);
@@ -123,36 +138,39 @@ export const History = () => {
     fetchExpenses();
   }, []);
 
-  const onSubmit = async (values: Expense) => {
-    try {
-      const res = await fetch(`http://localhost:8090/expenses/${values.id}`, {
-        method: "PUT",
-        headers: getAuthHeaders(),
-        body: JSON.stringify(values),
-      });
-      if(res.status==401){
-        localStorage.removeItem('token')
-        navigate('/login')
-      }
-      else if (!res.ok) throw new Error();
-      else{
-          toast.success("Expense updated");
-          setEditExpense(null);
-          setIsEditDialogOpen(false);
-          fetchExpenses();
-      }
-    } catch (err) {
-      console.error(err);
-      toast.error("Update failed");
-    }
+  const onSubmit = (values: Expense) => {
+    const { id, ...data } = values;
+    setPending((current) => ({ ...current, [id]: { op: "update", data } }));
+    setExpenses((current) => current.map((expense) => (expense.id === id ? values : expense)));
+    setEditExpense(null);
+    setIsEditDialogOpen(false);
   };
 
-  const handleDelete = async () => {
+  const handleDelete = () => {
     if (!deleteId) return;
+    setPending((current) => ({ ...current, [deleteId]: { op: "delete" } }));
+    setDeleteId(null);
+  };
+
+  const restoreExpense = (id: string) => {
+    setPending(({ [id]: _, ...rest }) => rest);
+  };
+
+  const discardChanges = () => {
+    setPending({});
+    fetchExpenses();
+  };
+
+  const saveChanges = async () => {
+    const operations = Object.entries(pending).map(([id, change]) =>
+      change.op === "delete" ? { op: "delete", id } : { op: "update", id, data: change.data }
+    );
+    if (operations.length === 0) return;
     try {
-      const res = await fetch(`http://localhost:8090/expenses/${deleteId}`, {
-        method: "DELETE",
+      const res = await fetch(`${INSIGHTS_API}/expenses/bulk`, {
+        method: "POST",
         headers: getAuthHeaders(),
+        body: JSON.stringify({ operations }),
       });
       if(res.status==401){
         localStorage.removeItem('token')
@@ -160,19 +178,36 @@ export const History = () => {
       }
       else if (!res.ok) throw new Error();
       else{
-          toast.success("Expense deleted");
-          setDeleteId(null);
+          const result = await res.json();
+          if (result.not_found.length > 0) {
+            toast.warning(`${result.not_found.length} expense(s) no longer exist`);
+          }
+          toast.success(`Saved ${result.updated.length + result.deleted.length} change(s)`);
+          setPending({});
           fetchExpenses();
       }
     } catch (err) {
       console.error(err);
-      toast.error("Delete failed");
+      toast.error("Saving changes failed");
     }
   };
 
   return (
     <Card className="p-4">
       <h2 className="text-lg font-semibold mb-4">Expense History</h2>
+      {pendingCount > 0 && (
+        <div className="flex items-center justify-between gap-2 mb-4">
+          <span className="text-sm text-muted-foreground">
+            {pendingCount} unsaved change{pendingCount === 1 ? "" : "s"}
+          </span>
+          <div className="flex gap-2">
+            <Button variant="outline" onClick={discardChanges}>
+              Discard
+            </Button>
+            <Button onClick={saveChanges}>Save changes</Button>
+          </div>
+        </div>
+      )}
       <div className="overflow-auto">
         <Table className="min-w-full text-sm border-collapse table-fixed">
           <Thead className="bg-gray-100">
@@ -195,7 +230,10 @@ export const History = () => {
               </Tr>
             ) : (
               expenses.map((expense) => (
-                <Tr key={expense.id}>
+                <Tr
+                  key={expense.id}
+                  className={pending[expense.id]?.op === "delete" ? "line-through opacity-50" : undefined}
+                >
                   <Td className="px-2 py-2">{expense.bill_date}</Td>
                   <Td className="px-2 py-2">{expense.store_name}</Td>
                   <Td className="px-2 py-2">{expense.item_name}</Td>
@@ -212,20 +250,30 @@ export const History = () => {
                         </Button>
                       </DropdownMenuTrigger>
                       <DropdownMenuContent>
-                        <DropdownMenuItem
-                          onClick={() => {
-                            setEditExpense(expense);
-                            reset(expense);
-                            setIsEditDialogOpen(true);
-                          }}
-                        >
-                          Update
-                        </DropdownMenuItem>
-                        <DropdownMenuItem
-                          onClick={() => setDeleteId(expense.id)}
-                        >
-                          Delete
-                        </DropdownMenuItem>
+                        {pending[expense.id]?.op === "delete" ? (
+                          <DropdownMenuItem
+                            onClick={() => restoreExpense(expense.id)}
+                          >
+                            Restore
+                          </DropdownMenuItem>
+                        ) : (
+                          <>
+                            <DropdownMenuItem
+                              onClick={() => {
+                                setEditExpense(expense);
+                                reset(expense);
+                                setIsEditDialogOpen(true);
+                              }}
+                            >
+                              Update
+                            </DropdownMenuItem>
+                            <DropdownMenuItem
+                              onClick={() => setDeleteId(expense.id)}
+                            >
+                              Delete
+                            </DropdownMenuItem>
+                          </>
+                        )}
                       </DropdownMenuContent>
                     </DropdownMenu>
                   </Td>
@@ -235,6 +283,13 @@ export const History = () => {
           </Tbody>
         </Table>
       </div>
+      {nextCursor && (
+        <div className="flex justify-center mt-4">
+          <Button variant="outline" onClick={() => fetchExpenses(nextCursor)}>
+            Load more
+          </Button>
+        </div>
+      )}
 
       {/* Edit Dialog */}
       <Dialog open={isEditDialogOpen} onOpenChange={setIsEditDialogOpen}>
@@ -278,7 +333,7 @@ export const History = () => {
                 />
               </div>
               <div className="flex justify-end">
-                <Button type="submit">Save</Button>
+                <Button type="submit">Apply</Button>
               </div>
             </form>
           )}
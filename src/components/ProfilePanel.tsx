@@ -5,6 +5,7 @@ import { Input } from "@/components/ui/input";
 import { Label } from "@/components/ui/label";
 import { useNavigate } from "react-router-dom";
 import { User } from "lucide-react";
+import { USER_API } from "@/lib/api";
 
 type FinancialDetails = {
   income: string;
@@ -86,7 +87,7 @@ export function ProfilePanel({ isOpen, onClose, userData }: ProfilePanelProps) {
     };
 
     try {
-      const response = await fetch("http://localhost:8050/updateUserData", {
+      const response = await fetch(`${USER_API}/updateUserData`, {
         method: "PUT",
         headers: {
           "Content-Type": "application/json",
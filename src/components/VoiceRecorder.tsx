@@ -16,6 +16,7 @@ import {
 import { ScrollDownButton } from "@/components/ScrollDownButton";
 import { Card } from "./ui/card";
 import { useNavigate } from "react-router-dom";
+import { PROCESS_API } from "@/lib/api";
 
 interface Message {
   sender: "user" | "bot";
@@ -181,7 +182,7 @@ export function VoiceRecorder() {
       formData.append("user_explanation", trimmedInput);
     }
     try {
-      const response = await fetch("http://localhost:8000/process", {
+      const response = await fetch(`${PROCESS_API}/process`, {
         method: "POST",
         headers: {
           Authorization: `Bearer ${localStorage.getItem("token")}`,
@@ -5,14 +5,11 @@ import BarChart from './BarChart';
 import KpiCards from './KpiCards';
 import { Card } from '@/components/ui/card';
 import { useNavigate } from 'react-router-dom';
+import { INSIGHTS_API } from "@/lib/api";
 
-interface RawExpense {
-  store_name: string | null;
-  bill_date: string;
-  item_name: string;
-  quantity: number;
-  unit_price: number | null;
-  category: string;
+interface ExpenseSummary {
+  daily: { day: string; total: number; count: number }[];
+  by_category: { category: string; total: number; count: number }[];
 }
 
 interface DailyExpense {
@@ -33,7 +30,7 @@ const DashboardContainer = () => {
 
   useEffect(() => {
     const token = localStorage.getItem("token");
-    fetch('http://localhost:8090/expenses', {
+    fetch(`${INSIGHTS_API}/expenses/summary`, {
         method: 'GET',
         headers: {
           'Authorization': `Bearer ${token}`,
@@ -49,28 +46,14 @@ const DashboardContainer = () => {
           return res.json()
         }
       })
-      .then((rawData: RawExpense[])=>{
-        console.log(rawData)
-
-        const dailyMap = new Map<string, number>();
-        const categoryMap = new Map<string, number>();
-
-        rawData.forEach((item) => {
-          if (item.unit_price !== null) {
-            const cost = item.quantity * item.unit_price;
-
-            const day = item.bill_date;
-            dailyMap.set(day, (dailyMap.get(day) || 0) + cost);
-            categoryMap.set(item.category, (categoryMap.get(item.category) || 0) + cost);
-          }
-        });
-
-        const dailyExpensesArr: DailyExpense[] = Array.from(dailyMap.entries())
-          .map(([day, expense]) => ({ day, expense }))
-          .sort((a, b) => new Date(a.day).getTime() - new Date(b.day).getTime());
+      .then((summary: ExpenseSummary)=>{
+        // Totals are aggregated server-side; daily rows arrive sorted by day
+        const dailyExpensesArr: DailyExpense[] = summary.daily.map(
+          ({ day, total }) => ({ day, expense: total })
+        );
 
-        const categoryBreakdownArr: CategoryExpense[] = Array.from(categoryMap.entries()).map(
-          ([category, value]) => ({ category, value })
+        const categoryBreakdownArr: CategoryExpense[] = summary.by_category.map(
+          ({ category, total }) => ({ category, value: total })
         );
 
         setDailyExpenses(dailyExpensesArr);
@@ -1,36 +1,62 @@
 import React, { useEffect, useState } from "react";
+import { INSIGHTS_API } from "@/lib/api";
 
 const Insights = () => {
   const [insights, setInsights] = useState<string[]>([]);
   const [loading, setLoading] = useState(true);
 
   useEffect(() => {
+    const controller = new AbortController();
+
+    // Split the full insight block into each bullet point (preserving headers + body)
+    const splitInsights = (rawText: string) =>
+      rawText
+        .split(/\n\s*\*/g) // split on newline followed by a bullet
+        .map((item) => {
+          // Restore the lost bullet prefix
+          return item.trim().startsWith("*") ? item.trim() : `* ${item.trim()}`;
+        })
+        .filter(Boolean);
+
     const fetchInsights = async () => {
       try {
         const token = localStorage.getItem("token");
-        const res = await fetch("http://localhost:8090/insights", {
+        // Server-Sent Events: "chunk" events carry text as it is generated
+        const res = await fetch(`${INSIGHTS_API}/insights/stream`, {
           headers: {
             Authorization: `Bearer ${token}`,
           },
+          signal: controller.signal,
         });
   
-        if (!res.ok) throw new Error("Failed to fetch insights");
-  
-        const result = await res.json();
-  
-        // ✅ Split the full insight block into each bullet point (preserving headers + body)
-        const rawText = result.insights || "";
+        if (!res.ok || !res.body) throw new Error("Failed to fetch insights");
   
-        const splitInsights = rawText
-          .split(/\n\s*\*/g) // split on newline followed by a bullet
-          .map((item, idx) => {
-            // Restore the lost bullet prefix
-            return item.trim().startsWith("*") ? item.trim() : `* ${item.trim()}`;
-          })
-          .filter(Boolean);
-  
-        setInsights(splitInsights);
+        const reader = res.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = "";
+        let rawText = "";
+
+        while (true) {
+          const { done, value } = await reader.read();
+          if (done) break;
+          buffer += decoder.decode(value, { stream: true });
+
+          const events = buffer.split("\n\n");
+          buffer = events.pop() || "";
+          for (const event of events) {
+            const name = event.match(/^event: (.*)$/m)?.[1];
+            const data = JSON.parse(event.match(/^data: (.*)$/m)?.[1] || "{}");
+            if (name === "error") throw new Error(data.detail);
+            if (name === "chunk" || name === "replace") {
+              // Stale cached insights arrive at once; "replace" swaps in the refreshed ones
+              rawText = name === "replace" ? data.text : rawText + data.text;
+              setInsights(splitInsights(rawText));
+              setLoading(false);
+            }
+          }
+        }
       } catch (err) {
+        if (controller.signal.aborted) return;
         console.error("Error fetching insights:", err);
         setInsights(["Unable to load insights."]);
       } finally {
@@ -39,6 +65,8 @@ const Insights = () => {
     };
   
     fetchInsights();
+    // Leaving the page closes the stream; the server still finishes and caches the insights
+    return () => controller.abort();
   }, []);
 
   return (
@@ -0,0 +1,7 @@
+// Base URLs of the backend services. The single-service deployment
+// (backend/main.py) serves every route from one origin: set VITE_API_URL.
+const API_URL = import.meta.env.VITE_API_URL;
+
+export const USER_API = API_URL || "http://localhost:8050";
+export const PROCESS_API = API_URL || "http://localhost:8000";
+export const INSIGHTS_API = API_URL || "http://localhost:8090";
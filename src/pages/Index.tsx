@@ -11,6 +11,7 @@ import { HelpSection } from "@/components/HelpSection";
 import { X } from "lucide-react";
 import { History } from "@/components/History";
 import { useNavigate } from "react-router";
+import { USER_API } from "@/lib/api";
 
 // Types
 interface FinancialDetails {
@@ -49,7 +50,7 @@ const Index = () => {
       }
 
       try {
-        const res = await fetch("http://localhost:8050/getUserData", {
+        const res = await fetch(`${USER_API}/getUserData`, {
           headers: {
             Authorization: `Bearer ${token}`,
           },
@@ -4,6 +4,7 @@ import { Card } from "@/components/ui/card";
 import { Button } from "@/components/ui/button";
 import { DollarSign, Eye, EyeOff } from "lucide-react";
 import { useState } from "react";
+import { USER_API } from "@/lib/api";
 
 export default function Login() {
   const navigate = useNavigate();
@@ -19,7 +20,7 @@ export default function Login() {
   const onSubmit = async (data: any) => {
     setServerError("");
     try {
-      const res = await fetch("http://localhost:8050/auth/signin", {
+      const res = await fetch(`${USER_API}/auth/signin`, {
         method: "POST",
         headers: { "Content-Type": "application/json" },
         body: JSON.stringify(data),
@@ -5,6 +5,7 @@ import { Input } from "@/components/ui/input";
 import { Card } from "@/components/ui/card";
 import { DollarSign } from "lucide-react";
 import { useState } from "react";
+import { USER_API } from "@/lib/api";
 
 const SignUpFirstPage = () => {
   const { formData, setFormData } = useSignup();
@@ -48,7 +49,7 @@ const SignUpFirstPage = () => {
 
     if (formData.firstName && formData.lastName && formData.email && formData.password) {
 
-      const res = await fetch(`http://localhost:8050/auth/validate-email?email=${formData.email}`, {
+      const res = await fetch(`${USER_API}/auth/validate-email?email=${formData.email}`, {
         method: "GET"
       })
 
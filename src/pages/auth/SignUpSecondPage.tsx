@@ -6,6 +6,7 @@ import { Card } from "@/components/ui/card";
 import { Switch } from "@/components/ui/switch";
 import { useNavigate } from "react-router-dom";
 import { DollarSign } from "lucide-react";
+import { USER_API } from "@/lib/api";
 
 const SignUpSecondPage = () => {
   const { formData, setFormData } = useSignup();
@@ -76,7 +77,7 @@ const SignUpSecondPage = () => {
 
     try {
       console.log(formData);
-      const response = await fetch("http://localhost:8050/auth/signup", {
+      const response = await fetch(`${USER_API}/auth/signup`, {
         method: "POST",
         headers: { "Content-Type": "application/json" },
         body: JSON.stringify(formData),